@@ -0,0 +1,31 @@
+"""
+Microbenchmarks for the SDK hot path. Each benchmark module registers its
+benchmarks with the `benchmark` decorator; a benchmark is a function that
+does any (untimed) setup and returns a zero argument callable, which is the
+code that gets timed.
+
+Run the suite with:
+
+    $ python -m benchmarks.run
+
+Import time is measured separately, in fresh interpreters, which also
+checks the modules import_budget.json forbids:
+
+    $ python -m benchmarks.import_time
+"""
+from collections import OrderedDict
+
+# Registered benchmarks, in registration order, keyed by name.
+REGISTRY = OrderedDict()
+
+
+def benchmark(name):
+    """
+    Registers the decorated setup function as the benchmark `name`.
+    """
+    def decorator(setup):
+        if name in REGISTRY:
+            raise ValueError('Duplicate benchmark name {}'.format(name))
+        REGISTRY[name] = setup
+        return setup
+    return decorator
@@ -0,0 +1,96 @@
+"""
+Schemas, simulators and messages shared by the benchmarks.
+"""
+from bonsai.connections import SimulatorConnection
+from bonsai.drivers import SimulatorDriverForTraining
+from bonsai.inkling_types import Luminance
+from bonsai.mock_brain_server import MockBrainScript, MockBrainSession
+from bonsai.mock_brain_server import make_schema
+from bonsai.proto.generator_simulator_api_pb2 import ServerToSimulator
+from bonsai.simulator import Simulator, SimState
+
+LUMINANCE_SIZE = 84
+
+
+def small_schema():
+    return make_schema('SmallState', [
+        ('current_sum', 'int32'),
+        ('dealer_card', 'int32'),
+        ('usable_ace', 'bool'),
+        ('score', 'float'),
+    ])
+
+
+def small_state():
+    return {'current_sum': 14, 'dealer_card': 7, 'usable_ace': False,
+            'score': 0.25}
+
+
+def luminance_schema():
+    return make_schema('LuminanceState', [
+        ('frame', 'luminance'),
+        ('depth', 'luminance'),
+        ('x', 'float'),
+        ('y', 'float'),
+    ])
+
+
+def luminance_pixels():
+    count = LUMINANCE_SIZE * LUMINANCE_SIZE
+    return [float(i % 256) / 255 for i in range(count)]
+
+
+def luminance_state():
+    pixels = luminance_pixels()
+    return {
+        'frame': Luminance(LUMINANCE_SIZE, LUMINANCE_SIZE, pixels),
+        'depth': Luminance(LUMINANCE_SIZE, LUMINANCE_SIZE, pixels),
+        'x': 0.5,
+        'y': -0.5,
+    }
+
+
+class StaticSimulator(Simulator):
+    """A simulator that costs nothing, so only the SDK is measured."""
+    def __init__(self, state):
+        super(StaticSimulator, self).__init__()
+        self._state = SimState(state=state, is_terminal=False)
+
+    def advance(self, actions):
+        pass
+
+    def get_state(self):
+        return self._state
+
+    def mock_reward(self):
+        return 1.0
+
+
+def active_driver(output_schema, state, **connection_kwargs):
+    """
+    Returns a training driver that has been registered and started against
+    a mock BRAIN session, along with that session. The driver is ready to
+    handle any runtime message. connection_kwargs are passed on to the
+    SimulatorConnection.
+    """
+    script = MockBrainScript(output_schema=output_schema, episodes=0,
+                             steps_per_episode=0, seed=0)
+    session = MockBrainSession(1, script)
+    connection = SimulatorConnection(simulator_name='benchmark',
+                                     simulator=StaticSimulator(state),
+                                     **connection_kwargs)
+    driver = SimulatorDriverForTraining(connection=connection,
+                                        simulator_connection=connection)
+    messages = {}
+    message = None
+    # Walk through register, set properties, reset and start, keeping one
+    # instance of every runtime message the session sends.
+    while ServerToSimulator.PREDICTION not in messages:
+        reply = driver.next(message)
+        message = ServerToSimulator()
+        message.ParseFromString(session.handle(reply.SerializeToString()))
+        messages[message.message_type] = message
+    driver.next(message)
+    messages[ServerToSimulator.STOP] = ServerToSimulator(
+        message_type=ServerToSimulator.STOP)
+    return driver, connection, messages
@@ -0,0 +1,61 @@
+from bonsai.proto.generator_simulator_api_pb2 import ServerToSimulator
+from bonsai.proto.generator_simulator_api_pb2 import SimulatorToServer
+
+from benchmarks import benchmark
+from benchmarks import _fixtures
+
+
+@benchmark('connection.prediction_decode')
+def prediction_decode():
+    _, connection, messages = _fixtures.active_driver(
+        _fixtures.small_schema(), _fixtures.small_state())
+    prediction = messages[ServerToSimulator.PREDICTION].prediction_data[0]
+
+    def run():
+        connection.handle_prediction_message(prediction)
+    return run
+
+
+@benchmark('connection.prediction_decode.memoized')
+def prediction_decode_memoized():
+    _, connection, messages = _fixtures.active_driver(
+        _fixtures.small_schema(), _fixtures.small_state(),
+        codec_cache_size=64)
+    prediction = messages[ServerToSimulator.PREDICTION].prediction_data[0]
+
+    def run():
+        connection.handle_prediction_message(prediction)
+    return run
+
+
+@benchmark('connection.state_message.small')
+def state_message_small():
+    _, connection, _ = _fixtures.active_driver(
+        _fixtures.small_schema(), _fixtures.small_state())
+
+    def run():
+        connection.generate_state_message(SimulatorToServer())
+    return run
+
+
+@benchmark('connection.state_message.small.memoized')
+def state_message_small_memoized():
+    _, connection, messages = _fixtures.active_driver(
+        _fixtures.small_schema(), _fixtures.small_state(),
+        codec_cache_size=64)
+    connection.handle_prediction_message(
+        messages[ServerToSimulator.PREDICTION].prediction_data[0])
+
+    def run():
+        connection.generate_state_message(SimulatorToServer())
+    return run
+
+
+@benchmark('connection.state_message.luminance')
+def state_message_luminance():
+    _, connection, _ = _fixtures.active_driver(
+        _fixtures.luminance_schema(), _fixtures.luminance_state())
+
+    def run():
+        connection.generate_state_message(SimulatorToServer())
+    return run
@@ -0,0 +1,44 @@
+from tornado.ioloop import IOLoop
+
+from bonsai.brain_server_connection import create_async_tasks
+from bonsai.mock_brain_server import MockBrainScript
+from bonsai.proto.generator_simulator_api_pb2 import ServerToSimulator
+
+from benchmarks import benchmark
+from benchmarks import _fixtures
+
+
+def _driver_next(message_type):
+    def setup():
+        driver, _, messages = _fixtures.active_driver(
+            _fixtures.small_schema(), _fixtures.small_state())
+        message = messages[message_type]
+
+        def run():
+            driver.next(message)
+        return run
+    return setup
+
+
+for _name, _message_type in [
+        ('set_properties', ServerToSimulator.SET_PROPERTIES),
+        ('reset', ServerToSimulator.RESET),
+        ('start', ServerToSimulator.START),
+        ('prediction', ServerToSimulator.PREDICTION),
+        ('stop', ServerToSimulator.STOP)]:
+    benchmark('driver.next.' + _name)(_driver_next(_message_type))
+
+
+@benchmark('inproc.training_episode')
+def inproc_training_episode():
+    """A 100 step training episode over the in-process event loop."""
+    script = MockBrainScript(output_schema=_fixtures.small_schema(),
+                             episodes=1, steps_per_episode=100, seed=0)
+
+    def run():
+        simulator = _fixtures.StaticSimulator(_fixtures.small_state())
+        run_sim, _ = create_async_tasks(
+            'benchmark', simulator, 'inproc://benchmark/sims/ws', 'key',
+            event_loop='inproc', event_loop_kwargs={'script': script})
+        IOLoop.current().run_sync(run_sim)
+    return run
@@ -0,0 +1,24 @@
+from bonsai.inkling_types import Luminance
+
+from benchmarks import benchmark
+from benchmarks import _fixtures
+
+
+@benchmark('luminance.from_list')
+def luminance_from_list():
+    size = _fixtures.LUMINANCE_SIZE
+    pixels = _fixtures.luminance_pixels()
+
+    def run():
+        Luminance(size, size, pixels)
+    return run
+
+
+@benchmark('luminance.from_bytes')
+def luminance_from_bytes():
+    size = _fixtures.LUMINANCE_SIZE
+    pixels = Luminance(size, size, _fixtures.luminance_pixels()).pixels
+
+    def run():
+        Luminance(size, size, pixels)
+    return run
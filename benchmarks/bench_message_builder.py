@@ -0,0 +1,22 @@
+from bonsai.common.message_builder import reconstitute
+
+from benchmarks import benchmark
+from benchmarks import _fixtures
+
+
+@benchmark('reconstitute.small')
+def reconstitute_small():
+    schema = _fixtures.small_schema()
+
+    def run():
+        reconstitute(schema)
+    return run
+
+
+@benchmark('reconstitute.luminance')
+def reconstitute_luminance():
+    schema = _fixtures.luminance_schema()
+
+    def run():
+        reconstitute(schema)
+    return run
@@ -0,0 +1,60 @@
+from bonsai.common.message_builder import reconstitute
+from bonsai.common.state_to_proto import compile_state_converter
+from bonsai.common.state_to_proto import convert_state_to_proto
+
+from benchmarks import benchmark
+from benchmarks import _fixtures
+
+
+@benchmark('convert_state_to_proto.small')
+def convert_small():
+    state_class = reconstitute(_fixtures.small_schema())
+    state = _fixtures.small_state()
+
+    def run():
+        convert_state_to_proto(state_class(), state)
+    return run
+
+
+@benchmark('convert_state_to_proto.luminance')
+def convert_luminance():
+    state_class = reconstitute(_fixtures.luminance_schema())
+    state = _fixtures.luminance_state()
+
+    def run():
+        convert_state_to_proto(state_class(), state)
+    return run
+
+
+@benchmark('convert_state_to_proto.small_serialized')
+def convert_small_serialized():
+    state_class = reconstitute(_fixtures.small_schema())
+    state = _fixtures.small_state()
+
+    def run():
+        message = state_class()
+        convert_state_to_proto(message, state)
+        message.SerializeToString()
+    return run
+
+
+@benchmark('convert_state_to_proto.small.compiled')
+def convert_small_compiled():
+    state_class = reconstitute(_fixtures.small_schema())
+    state = _fixtures.small_state()
+    convert = compile_state_converter(state_class.DESCRIPTOR)
+
+    def run():
+        convert(state_class(), state)
+    return run
+
+
+@benchmark('convert_state_to_proto.luminance.compiled')
+def convert_luminance_compiled():
+    state_class = reconstitute(_fixtures.luminance_schema())
+    state = _fixtures.luminance_state()
+    convert = compile_state_converter(state_class.DESCRIPTOR)
+
+    def run():
+        convert(state_class(), state)
+    return run
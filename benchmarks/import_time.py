@@ -0,0 +1,186 @@
+"""
+Measures how long `import bonsai` takes in a fresh interpreter, using
+`python -X importtime`, and checks that it doesn't pull in the modules
+import_budget.json forbids, such as the event loop dependencies, which are
+only imported when an event loop is selected.
+
+    $ python -m benchmarks.import_time
+    $ python -m benchmarks.import_time --top 20
+
+Import time only compares between runs on the same machine, so no time
+budget is kept in the repository. Write one from the commit to compare
+with, then check a change against it:
+
+    $ git stash && python -m benchmarks.import_time \
+          --update-budget times.json && git stash pop
+    $ python -m benchmarks.import_time --time-budget times.json
+
+The exit status is 1 if an import is over its time budget or imports a
+forbidden module.
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+
+DEFAULT_BUDGET = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                              'import_budget.json')
+
+# Headroom given to the measured time by --update-budget, since import time
+# varies from run to run more than the microbenchmarks do.
+BUDGET_HEADROOM = 1.5
+
+
+def parse_importtime(output):
+    """
+    Parses the stderr of `python -X importtime`.
+    :return: List of (module, self microseconds, cumulative microseconds,
+             nesting depth) in the order the imports finished.
+    """
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        name = fields[2].rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2
+        imports.append((name.strip(), int(fields[0]), int(fields[1]), depth))
+    return imports
+
+
+def measure_import(module, repeat=5):
+    """
+    Imports module in `repeat` fresh interpreters.
+    :return: Tuple of the best cumulative import time in seconds and the
+             parsed imports made by module in that run.
+    """
+    best = None
+    for _ in range(repeat):
+        process = subprocess.Popen(
+            [sys.executable, '-X', 'importtime', '-c',
+             'import {}'.format(module)],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        _, err = process.communicate()
+        if process.returncode:
+            raise RuntimeError('import {} failed:\n{}'.format(
+                module, err.decode('utf-8', 'replace')))
+        imports = _subtree(parse_importtime(err.decode('utf-8', 'replace')),
+                           module)
+        if best is None or imports[-1][2] < best[0]:
+            best = (imports[-1][2], imports)
+    return best[0] * 1e-6, best[1]
+
+
+def _subtree(imports, module):
+    """
+    Returns the imports made while importing module, ending with module
+    itself, leaving out those done by interpreter startup.
+    """
+    for end, (name, _, _, depth) in enumerate(imports):
+        if name == module and depth == 0:
+            start = end
+            while start > 0 and imports[start - 1][3] > 0:
+                start -= 1
+            return imports[start:end + 1]
+    raise RuntimeError('No import time reported for ' + module)
+
+
+def check(module, seconds, imports, budget, limit=None):
+    """
+    Checks one measurement against its budget entry and time limit.
+    :return: List of problems found, empty when within budget.
+    """
+    problems = []
+    if limit is not None and seconds > limit:
+        problems.append('import {} took {:.1f} ms, over its budget of '
+                        '{:.1f} ms'.format(module, seconds * 1e3, limit * 1e3))
+    imported = set(name for name, _, _, _ in imports)
+    for forbidden in budget.get('forbidden', []):
+        pulled_in = sorted(name for name in imported
+                           if name == forbidden or
+                           name.startswith(forbidden + '.'))
+        if pulled_in:
+            problems.append('import {} imports {}'.format(
+                module, ', '.join(pulled_in)))
+    return problems
+
+
+def _environment():
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Check the import time of the bonsai package.')
+    parser.add_argument('--budget', default=DEFAULT_BUDGET,
+                        help='File listing the modules each import must '
+                             'not pull in.')
+    parser.add_argument('--time-budget', default=None,
+                        help='Check import times against a file written by '
+                             '--update-budget on this machine.')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Fresh interpreters to measure; the best wins.')
+    parser.add_argument('--top', type=int, default=10,
+                        help='Number of slowest imports to list.')
+    parser.add_argument('--update-budget', default=None, metavar='FILE',
+                        help='Write time budgets from this measurement to '
+                             'FILE, for --time-budget.')
+    args = parser.parse_args(argv)
+
+    with open(args.budget) as infile:
+        budgets = json.load(infile)
+    limits = {}
+    if args.time_budget:
+        with open(args.time_budget) as infile:
+            time_budget = json.load(infile)
+        current = _environment()
+        for key in sorted(current):
+            if time_budget.get(key) != current[key]:
+                print('warning: the time budget was measured with {} {}, '
+                      'not {}; times may not be comparable.'.format(
+                          key, time_budget.get(key), current[key]))
+        limits = time_budget['seconds']
+
+    problems = []
+    measured = {}
+    for module in sorted(budgets):
+        seconds, imports = measure_import(module, args.repeat)
+        measured[module] = seconds
+        limit = limits.get(module)
+        print('import {:30s} {:8.1f} ms{}'.format(
+            module, seconds * 1e3,
+            '  (budget {:.1f} ms)'.format(limit * 1e3) if limit else ''))
+        slowest = sorted(imports, key=lambda i: -i[1])[:args.top]
+        for name, self_us, cumulative_us, _ in slowest:
+            print('    {:40s} {:8.1f} ms self {:8.1f} ms total'.format(
+                name, self_us * 1e-3, cumulative_us * 1e-3))
+        problems.extend(check(module, seconds, imports, budgets[module],
+                              limit))
+
+    if args.update_budget:
+        document = _environment()
+        document['seconds'] = {
+            module: round(seconds * BUDGET_HEADROOM, 4)
+            for module, seconds in measured.items()}
+        with open(args.update_budget, 'w') as out:
+            json.dump(document, out, indent=2, sort_keys=True)
+            out.write('\n')
+        print('Wrote time budget {}'.format(args.update_budget))
+
+    for problem in problems:
+        print(problem)
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
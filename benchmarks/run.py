@@ -0,0 +1,166 @@
+"""
+Runs the SDK microbenchmarks, optionally saving the results as JSON and
+comparing them against a baseline saved earlier.
+
+    $ python -m benchmarks.run
+    $ python -m benchmarks.run --filter driver.next --save results.json
+
+Timings only compare between runs on the same machine, so no baseline is
+kept in the repository. Save one from the commit to compare with, then
+compare a change against it:
+
+    $ git stash && python -m benchmarks.run --save base.json && git stash pop
+    $ python -m benchmarks.run --compare base.json
+
+When comparing, the exit status is 1 if any benchmark is slower than its
+baseline by more than the regression threshold.
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import platform
+import sys
+import time
+import timeit
+
+from benchmarks import REGISTRY
+from benchmarks import bench_connections  # noqa: F401
+from benchmarks import bench_drivers  # noqa: F401
+from benchmarks import bench_inkling_types  # noqa: F401
+from benchmarks import bench_message_builder  # noqa: F401
+from benchmarks import bench_state_to_proto  # noqa: F401
+
+
+def _calibrate(timer, min_time):
+    """
+    Returns the number of loops needed for one timing run to last at least
+    min_time seconds.
+    """
+    number = 1
+    while True:
+        if timer.timeit(number) >= min_time:
+            return number
+        number *= 10
+
+
+def measure(setup, repeat=5, min_time=0.2):
+    """
+    Times one benchmark.
+    :param setup: The registered benchmark setup function.
+    :return: Dictionary with the best and mean seconds per call.
+    """
+    timer = timeit.Timer(setup())
+    number = _calibrate(timer, min_time)
+    runs = [t / number for t in timer.repeat(repeat, number)]
+    return {
+        'best': min(runs),
+        'mean': sum(runs) / len(runs),
+        'loops': number,
+        'repeat': repeat,
+    }
+
+
+def run_benchmarks(names, repeat, min_time):
+    results = {}
+    for name in names:
+        results[name] = measure(REGISTRY[name], repeat, min_time)
+        print('{:45s} {:>12s}'.format(
+            name, _format_seconds(results[name]['best'])))
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    Compares results with baseline results.
+    :return: List of (name, baseline seconds, current seconds) for every
+             benchmark that regressed by more than threshold.
+    """
+    regressions = []
+    for name, result in sorted(results.items()):
+        if name not in baseline:
+            print('{:45s} {:>12s}'.format(name, 'no baseline'))
+            continue
+        before = baseline[name]['best']
+        after = result['best']
+        change = (after - before) / before if before else 0.0
+        status = 'REGRESSED' if change > threshold else 'ok'
+        print('{:45s} {:>12s} {:>12s} {:>+8.1%}  {}'.format(
+            name, _format_seconds(before), _format_seconds(after), change,
+            status))
+        if change > threshold:
+            regressions.append((name, before, after))
+    return regressions
+
+
+def _format_seconds(seconds):
+    for unit, scale in (('s', 1.0), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            return '{:.2f} {}'.format(seconds / scale, unit)
+    return '{:.0f} ns'.format(seconds / 1e-9)
+
+
+def _document(results):
+    return {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+
+
+def _parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Runs the bonsai SDK microbenchmarks.')
+    parser.add_argument('--filter', default=None,
+                        help='Only run benchmarks whose name contains this.')
+    parser.add_argument('--list', action='store_true',
+                        help='List the benchmarks and exit.')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--min-time', type=float, default=0.2,
+                        help='Minimum seconds for each timing run.')
+    parser.add_argument('--save', default=None,
+                        help='Write the results to this JSON file.')
+    parser.add_argument('--compare', default=None,
+                        help='Compare with a JSON file written by --save on '
+                             'this machine.')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='Fractional slowdown counted as a regression.')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = _parse_arguments(argv)
+    names = [name for name in REGISTRY
+             if not args.filter or args.filter in name]
+    if args.list:
+        for name in names:
+            print(name)
+        return 0
+
+    results = run_benchmarks(names, args.repeat, args.min_time)
+
+    if args.save:
+        with open(args.save, 'w') as out:
+            json.dump(_document(results), out, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare, 'r') as infile:
+            baseline = json.load(infile)
+        current = _document(results)
+        for key in ('platform', 'python', 'implementation'):
+            if baseline.get(key) != current[key]:
+                print('warning: the baseline was measured with {} {}, not '
+                      '{}; timings may not be comparable.'.format(
+                          key, baseline.get(key), current[key]))
+        print()
+        regressions = compare(results, baseline['results'], args.threshold)
+        if regressions:
+            print('\n{} benchmark(s) regressed by more than {:.0%}'.format(
+                len(regressions), args.threshold))
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
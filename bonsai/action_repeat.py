@@ -0,0 +1,87 @@
+"""
+A simulator wrapper that applies every action from the BRAIN for several
+simulator steps, so that a round trip to the BRAIN covers more simulated
+time:
+
+    simulator = ActionRepeat(MySimulator(), repeat=4)
+    run_for_training_or_prediction('my_simulator', simulator)
+
+Rewards are summed over the repeated steps, and the BRAIN only sees the
+state after the last one. The repeat stops early at a terminal state. When
+the properties schema declares an `action_repeat` property, its value
+replaces `repeat` for the episodes that follow; the property isn't passed on
+to the wrapped simulator.
+"""
+from bonsai.simulator import SimulatorWrapper
+
+
+class ActionRepeat(SimulatorWrapper):
+    """
+    Wraps a simulator, advancing it `repeat` times for every action.
+    """
+
+    def __init__(self, simulator, repeat=4, property_name='action_repeat'):
+        """
+        :param simulator: The Simulator to wrap.
+        :param repeat: Number of steps each action is applied for.
+        :param property_name: Name of the property that sets repeat. Zero,
+                              the value of a property the BRAIN doesn't set,
+                              keeps the current repeat.
+        """
+        super(ActionRepeat, self).__init__(simulator)
+        self.repeat = self._check_repeat(repeat)
+        self.property_name = property_name
+        # Steps the wrapped simulator was advanced for the last action.
+        self.last_repeat = 0
+        # Names of the rewards to sum, and their sums over the steps before
+        # the last one.
+        self._reward_names = set()
+        self._rewards = {}
+
+    @staticmethod
+    def _check_repeat(repeat):
+        repeat = int(repeat)
+        if repeat < 1:
+            raise ValueError('repeat must be at least 1, got {}'.format(
+                repeat))
+        return repeat
+
+    def set_properties(self, **kwargs):
+        repeat = kwargs.pop(self.property_name, None)
+        if repeat:
+            self.repeat = self._check_repeat(repeat)
+        super(ActionRepeat, self).set_properties(**kwargs)
+
+    def notify_reward_name(self, reward_name):
+        # Known before the first advance, so no repeated step is missed.
+        self._reward_names.add(reward_name)
+        super(ActionRepeat, self).notify_reward_name(reward_name)
+
+    def reset(self):
+        self._rewards = {}
+        self.last_repeat = 0
+        super(ActionRepeat, self).reset()
+
+    def restore(self, token):
+        self._rewards = {}
+        self.last_repeat = 0
+        super(ActionRepeat, self).restore(token)
+
+    def advance(self, actions):
+        self._rewards = rewards = {}
+        steps = 0
+        while True:
+            self.simulator.advance(actions)
+            steps += 1
+            if steps >= self.repeat or \
+                    self.simulator.get_state().is_terminal:
+                break
+            for name in self._reward_names:
+                rewards[name] = rewards.get(name, 0.0) + \
+                    self.simulator.reward_for(name)
+        self.last_repeat = steps
+
+    def reward_for(self, reward_name):
+        self._reward_names.add(reward_name)
+        return self._rewards.get(reward_name, 0.0) + \
+            self.simulator.reward_for(reward_name)
@@ -5,19 +5,28 @@ import websockets
 from datetime import datetime
 
 from bonsai.drivers import DriverState
+from bonsai import instrumentation
+from bonsai.reconnect import get_policy
+from bonsai.transport import get_options
 from bonsai.proto.generator_simulator_api_pb2 import ServerToSimulator
 
 log = logging.getLogger(__name__)
 
 
 class _Runner(object):
-    def __init__(self, access_key, brain_api_url, driver, recording_file):
+    def __init__(self, access_key, brain_api_url, driver, recording_file,
+                 reconnect=None, transport=None):
         self.access_key = access_key
         self.brain_api_url = brain_api_url
         self.driver = driver
         self.recording_file = recording_file
+        self.reconnect = get_policy(reconnect)
+        self.transport = get_options(transport)
         if self.recording_file:
             self.recording_queue = asyncio.queues.Queue()
+            instrumentation.watch_recording_queue(self.recording_queue)
+        self._timers = instrumentation.transport_timers()
+        self._messages = instrumentation.MessageCounters()
 
     async def record_to_file(self):
         if not self.recording_file:
@@ -42,11 +51,49 @@ class _Runner(object):
         if not self.access_key:
             raise RuntimeError("Access Key was not set.")
 
+        try:
+            while True:
+                await self._run_connection()
+                if self.driver.state == DriverState.FINISHED or \
+                        self.reconnect is None:
+                    break
+                delay = self.reconnect.disconnected()
+                if delay is None:
+                    break
+                log.info("Reconnecting to %s in %.1f seconds",
+                         self.brain_api_url, delay)
+                await asyncio.sleep(delay)
+                self.driver.restart()
+        finally:
+            if self.recording_file:
+                await self.recording_queue.put(None)
+
+    async def _run_connection(self):
         log.info("About to connect to %s", self.brain_api_url)
-        async with websockets.connect(uri=self.brain_api_url,
-                                      extra_headers={
-                                          'Authorization': self.access_key
-                                      }) as websocket:
+        options = self.transport
+        connect_kwargs = {}
+        if options.compression is not None:
+            connect_kwargs['compression'] = \
+                'deflate' if options.compression else None
+        if options.max_message_size is not None:
+            connect_kwargs['max_size'] = options.max_message_size
+        if options.connect_timeout is not None:
+            connect_kwargs['open_timeout'] = options.connect_timeout
+        try:
+            websocket = await websockets.connect(
+                uri=self.brain_api_url,
+                extra_headers={'Authorization': self.access_key},
+                **connect_kwargs)
+        except (OSError, websockets.exceptions.InvalidHandshake) as e:
+            if self.reconnect is None or not self.reconnect.has_connected:
+                raise
+            log.error("Unable to connect to '%s': %s", self.brain_api_url, e)
+            return
+        if self.reconnect is not None:
+            self.reconnect.connected()
+        options.apply_to_socket(websocket.transport.get_extra_info('socket'))
+
+        try:
             log.debug('Connection to %s established.', self.brain_api_url)
             input_message = None
             last_check = datetime.utcnow()
@@ -66,22 +113,37 @@ class _Runner(object):
                         await self._record('RECV', input_message)
 
                     # This is where the state-machine magic happens
+                    start = self._timers.driver_next.start()
                     output_message = self.driver.next(input_message)
+                    self._timers.driver_next.stop(start)
 
                     if self.recording_file:
                         await self._record('SEND', output_message)
 
                     if output_message:
+                        start = self._timers.serialize.start()
                         output_bytes = output_message.SerializeToString()
+                        self._timers.serialize.stop(start)
+                        self._messages.record('sent', output_message,
+                                              len(output_bytes))
+
+                        start = self._timers.send.start()
                         await websocket.send(output_bytes)
+                        self._timers.send.stop(start)
 
                     if self.driver.state != DriverState.FINISHED:
                         # Only do this part if the driver isn't in a FINISHED
                         # state.
+                        start = self._timers.recv.start()
                         input_bytes = await websocket.recv()
+                        self._timers.recv.stop(start)
                         if input_bytes:
+                            start = self._timers.parse.start()
                             input_message = ServerToSimulator()
                             input_message.ParseFromString(input_bytes)
+                            self._timers.parse.stop(start)
+                            self._messages.record('received', input_message,
+                                                  len(input_bytes))
                         else:
                             input_message = None
 
@@ -92,21 +154,26 @@ class _Runner(object):
             finally:
                 log.debug('Execution loop complete for %s!',
                           self.brain_api_url)
-                if self.recording_file:
-                    await self.recording_queue.put(None)
+        finally:
+            await websocket.close()
 
 
-def run(access_key, brain_api_url, driver, recording_file):
+def run(access_key, brain_api_url, driver, recording_file, reconnect=None,
+        transport=None):
     loop = asyncio.get_event_loop()
     run_sim, record = create_tasks(access_key,
                                    brain_api_url,
                                    driver,
-                                   recording_file)
+                                   recording_file,
+                                   reconnect,
+                                   transport)
     loop.run_until_complete(asyncio.gather([run_sim, record], loop))
 
 
-def create_tasks(access_key, brain_api_url, driver, recording_file):
-    server = _Runner(access_key, brain_api_url, driver, recording_file)
+def create_tasks(access_key, brain_api_url, driver, recording_file,
+                 reconnect=None, transport=None):
+    server = _Runner(access_key, brain_api_url, driver, recording_file,
+                     reconnect, transport)
 
     return (asyncio.ensure_future(server.run()),
             asyncio.ensure_future(server.record_to_file()))
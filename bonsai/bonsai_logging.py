@@ -2,10 +2,78 @@
 This file contains functionality related to logging.
 """
 
+import atexit
+import json
 import logging
+import threading
+from timeit import default_timer as _clock
 
+_FORMAT = "[%(asctime)s][%(levelname)s][%(name)s]%(message)s"
+_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
 
-def logging_basic_config(level=logging.INFO):
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats records as one JSON object per line.
+    """
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record, self.datefmt),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, sort_keys=True)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Limits each logger to `rate` records per second, allowing bursts of up
+    to `burst` records. Records over the limit are dropped and counted in
+    `suppressed`, by logger name. Warnings and errors are never dropped.
+    """
+
+    def __init__(self, rate, burst=None):
+        super(RateLimitFilter, self).__init__()
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(rate, 1))
+        self.suppressed = {}
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        now = _clock()
+        with self._lock:
+            tokens, last = self._buckets.get(record.name, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            if tokens < 1:
+                self._buckets[record.name] = (tokens, now)
+                self.suppressed[record.name] = \
+                    self.suppressed.get(record.name, 0) + 1
+                return False
+            self._buckets[record.name] = (tokens - 1, now)
+        return True
+
+
+def _make_stream_handler(stream, json_format):
+    handler = logging.StreamHandler(stream)
+    if json_format:
+        handler.setFormatter(JsonFormatter(datefmt=_DATE_FORMAT))
+    else:
+        handler.setFormatter(logging.Formatter(_FORMAT, _DATE_FORMAT))
+    return handler
+
+
+def logging_basic_config(level=logging.INFO, non_blocking=False,
+                         queue_size=10000, overflow='drop_new',
+                         json_format=False, rate_limit=None, stream=None):
     """
     This function sets up a very simple root logger with the intention
     of making it simple for most simulators to setup logging. Simulators
@@ -13,8 +81,51 @@ def logging_basic_config(level=logging.INFO):
     calling bonsai.run_for_training_or_prediction(). If you are an
     advanced user who wants to configure their own logging, you do not
     need to use this function.
+
+    :param level: Level of the root logger.
+    :param non_blocking: When set, log calls put records on a bounded queue
+                         and a background thread writes them, so logging
+                         doesn't block the simulator on I/O. Messages are
+                         still formatted by the thread that logs them.
+    :param queue_size: Number of records the queue holds when non_blocking.
+    :param overflow: What to do when the queue is full: 'drop_new',
+                     'drop_old' or 'block'.
+    :param json_format: Whether to write each record as a JSON object.
+    :param rate_limit: Maximum number of records per second per logger below
+                       WARNING level. Defaults to no limit.
+    :param stream: Stream to write to. Defaults to sys.stderr.
+    :return: The LogListener writing records when non_blocking is set,
+             which is stopped at exit, otherwise None.
     """
-    logging.basicConfig(
-        level=level,
-        format="[%(asctime)s][%(levelname)s][%(name)s]%(message)s",
-        datefmt="%Y-%m-%d %H:%M:%S")
+    if not (non_blocking or json_format or rate_limit or stream):
+        logging.basicConfig(level=level, format=_FORMAT,
+                            datefmt=_DATE_FORMAT)
+        return None
+
+    root = logging.getLogger()
+    if root.handlers:
+        # Like logging.basicConfig, leave configured logging alone.
+        return None
+
+    if non_blocking:
+        # Imported here, since logging.handlers is slow to import.
+        try:
+            from bonsai.logging_queue import BoundedQueueHandler, LogListener
+        except ImportError:
+            raise RuntimeError(
+                'non_blocking logging requires logging.handlers.'
+                'QueueHandler, which was added in Python 3.2.')
+    root.setLevel(level)
+    stream_handler = _make_stream_handler(stream, json_format)
+    listener = None
+    if non_blocking:
+        handler = BoundedQueueHandler(queue_size, overflow)
+        listener = LogListener(handler.queue, stream_handler)
+        listener.start()
+        atexit.register(listener.stop)
+    else:
+        handler = stream_handler
+    if rate_limit:
+        handler.addFilter(RateLimitFilter(rate_limit))
+    root.addHandler(handler)
+    return listener
@@ -2,10 +2,15 @@
 from __future__ import print_function
 import time
 import requests
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
 import json
 import urllib
 import logging
 import re
+import hashlib
+import shutil
+import threading
 
 import configparser
 import os
@@ -13,6 +18,9 @@ import os
 import sys
 import types
 import random
+from collections import namedtuple, OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
 
 # import asyncio
 # import websockets
@@ -59,10 +67,19 @@ class BonsaiConfig:
 			apikey=self.apikey,
 			server=self.server )
 
-	def __init__(self, apikey=None, user=None, server=None, profile=None):
+	def __init__(self, apikey=None, user=None, server=None, profile=None, pool_size=10, retries=3,
+			cache_ttls=None, cache_dir=None):
 		self.user = None
 		self.apikey = None
 		self.server = None
+
+		# http connection pooling, see session
+		self.pool_size = pool_size
+		self.retries = retries
+		self._session = None
+
+		# cached GET responses, see ResponseCache
+		self.cache = ResponseCache(cache_ttls, cache_dir)
 		
 		# internal
 		if apikey is not None: self.apikey = apikey
@@ -104,6 +121,26 @@ class BonsaiConfig:
 	def request_header(self):
 		return {'Authorization': self.apikey}
 
+	# a requests.Session shared by all the REST calls made with this config, so
+	# connections to the server are kept alive and reused instead of paying for
+	# a new TCP+TLS handshake on every call.
+	@property
+	def session(self):
+		if self._session is None:
+			self._session = _create_session(self.pool_size, self.retries)
+		return self._session
+
+	def close(self):
+		if self._session is not None:
+			self._session.close()
+			self._session = None
+
+	# forget cached responses about a brain, and the brain list, after
+	# changing it on the server
+	def invalidate(self, name):
+		self.cache.invalidate(self.brain_url(name))
+		self.cache.invalidate("{server}/v1/{user}".format(server=self.server, user=self.user), children=False)
+
 	# return the URL for a given brain for a given config
 	def brain_url(self, name):
 		return "{server}/v1/{user}/{name}".format(
@@ -113,10 +150,181 @@ class BonsaiConfig:
 			)
 
 
+def _retry_policy(retries):
+	# only retry requests that are safe to repeat; a retried PUT /train or POST
+	# could start training or compile twice.
+	methods = frozenset(['HEAD', 'GET', 'OPTIONS'])
+	kwargs = dict(total=retries, backoff_factor=0.5, status_forcelist=(502, 503, 504), raise_on_status=False)
+	try:
+		return Retry(allowed_methods=methods, **kwargs)
+	except TypeError:
+		# urllib3 < 1.26
+		return Retry(method_whitelist=methods, **kwargs)
+
+def _create_session(pool_size, retries):
+	session = requests.Session()
+	adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=_retry_policy(retries))
+	session.mount('http://', adapter)
+	session.mount('https://', adapter)
+	return session
+
+
+# seconds a cached GET response is served without asking the server again,
+# per endpoint. once expired, the entry is revalidated with If-None-Match /
+# If-Modified-Since so an unchanged response costs a 304 and no body.
+DEFAULT_CACHE_TTLS = {
+	'brains': 5.0,
+	'info': 5.0,
+	'status': 0.0,
+	'inkling': 30.0,
+	'sims': 0.0,
+}
+
+_CacheEntry = namedtuple('_CacheEntry', ['expires', 'etag', 'last_modified', 'body'])
+
+# a cache of GET responses shared by the REST helpers using a config. the
+# inkling of a trained brain version never changes, so it is also kept on
+# disk under directory and survives between runs. pass directory=False to
+# keep everything in memory.
+class ResponseCache:
+	def __init__(self, ttls=None, directory=None):
+		self.ttls = dict(DEFAULT_CACHE_TTLS)
+		if ttls is not None:
+			self.ttls.update(ttls)
+
+		if directory is None:
+			directory = os.path.join(
+				os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')), 'bonsai')
+		self.directory = directory
+
+		self._lock = threading.Lock()
+		self._entries = {}
+
+	def get(self, url):
+		with self._lock:
+			return self._entries.get(url)
+
+	def fresh(self, entry):
+		return entry is not None and entry.expires > time.time()
+
+	# remember a 200 response; responses without a validator are only kept
+	# while their TTL lasts
+	def store(self, url, endpoint, response):
+		ttl = self.ttls.get(endpoint, 0.0)
+		etag = response.headers.get('ETag')
+		last_modified = response.headers.get('Last-Modified')
+		if ttl <= 0 and etag is None and last_modified is None:
+			return
+		with self._lock:
+			self._entries[url] = _CacheEntry(time.time() + ttl, etag, last_modified, response.text)
+
+	# the server answered 304 for entry; serve it for another TTL
+	def revalidated(self, url, endpoint, entry):
+		with self._lock:
+			self._entries[url] = entry._replace(expires=time.time() + self.ttls.get(endpoint, 0.0))
+
+	# make the next GET of url ask the server, still revalidating the entry
+	# so an unchanged response costs a 304 and no body
+	def expire(self, url):
+		with self._lock:
+			entry = self._entries.get(url)
+			if entry is not None:
+				self._entries[url] = entry._replace(expires=0.0)
+
+	# drop url and, with children, everything beneath it
+	def invalidate(self, url, children=True):
+		with self._lock:
+			for key in list(self._entries):
+				if key == url or (children and key.startswith(url + '/')):
+					del self._entries[key]
+
+	def clear(self):
+		with self._lock:
+			self._entries.clear()
+
+	def _brain_dir(self, config, name):
+		server = hashlib.sha1('{}/{}'.format(config.server, config.user).encode('utf-8')).hexdigest()
+		return os.path.join(self.directory, server, urllib.parse.quote(name, safe=''))
+
+	def _inkling_path(self, config, name, version):
+		return os.path.join(self._brain_dir(config, name), '{version}.json'.format(version=version))
+
+	def load_inkling(self, config, name, version):
+		if not self.directory:
+			return None
+		try:
+			with open(self._inkling_path(config, name, version), 'r') as f:
+				return json.load(f)
+		except (IOError, OSError, ValueError):
+			return None
+
+	def save_inkling(self, config, name, version, body):
+		self._save(self._inkling_path(config, name, version), body)
+
+	# forget everything on disk about a brain, for when it is deleted or
+	# created anew under the same name
+	def forget_brain(self, config, name):
+		if self.directory:
+			shutil.rmtree(self._brain_dir(config, name), ignore_errors=True)
+
+	def _save(self, path, body):
+		if not self.directory:
+			return
+		try:
+			if not os.path.isdir(os.path.dirname(path)):
+				os.makedirs(os.path.dirname(path))
+
+			# write then rename, so concurrent runs never read half a file
+			temp_path = '{path}.{pid}.tmp'.format(path=path, pid=os.getpid())
+			with open(temp_path, 'w') as f:
+				json.dump(body, f)
+			os.rename(temp_path, path)
+		except (IOError, OSError) as err:
+			logger.debug('Unable to cache {path}: {err}'.format(path=path, err=err))
+
+
+# a cached response body, answering the parts of requests.Response the REST
+# helpers use
+class _CachedResponse:
+	ok = True
+	status_code = 200
+
+	def __init__(self, text):
+		self.text = text
+
+	def json(self):
+		return json.loads(self.text)
+
+
+# GET url through the config's response cache
+def _cached_get(config, url, endpoint):
+	cache = config.cache
+	entry = cache.get(url)
+	if cache.fresh(entry):
+		logger.debug("url: GET {url} (cached)".format(url=url))
+		return _CachedResponse(entry.body)
+
+	headers = config.request_header()
+	if entry is not None:
+		if entry.etag is not None:
+			headers['If-None-Match'] = entry.etag
+		if entry.last_modified is not None:
+			headers['If-Modified-Since'] = entry.last_modified
+
+	r = config.session.get(url, headers=headers)
+	log_response(r)
+
+	if r.status_code == 304 and entry is not None:
+		cache.revalidated(url, endpoint, entry)
+		return _CachedResponse(entry.body)
+	if r.ok:
+		cache.store(url, endpoint, r)
+	return r
+
+
 def get_brains(config):
 	url = "{server}/v1/{user}".format(server=config.server, user=config.user)
-	r = requests.get(url, headers=config.request_header())
-	log_response(r)
+	r = _cached_get(config, url, 'brains')
 
 	if r.ok:
 		"""
@@ -165,8 +373,7 @@ def get_brains(config):
 def get_info(address):
 	name, config = address
 	# request brain
-	r = requests.get(url=config.brain_url(name), headers=config.request_header())
-	log_response(r)
+	r = _cached_get(config, config.brain_url(name), 'info')
 
 	# parse on success
 	if r.ok:
@@ -198,8 +405,7 @@ def get_status(address):
 	name, config = address
 
 	# request brain
-	r = requests.get(url=config.brain_url(name) + "/status", headers=config.request_header())
-	log_response(r)
+	r = _cached_get(config, config.brain_url(name) + "/status", 'status')
 
 	# parse on success
 	if r.ok:
@@ -241,8 +447,9 @@ def set_inkling(address, inkling=None):
 
 	params = { 'ink_content': inkling }
 	url = config.brain_url(name) + "/ink"
-	r = requests.post(url, json=params, headers=config.request_header())
+	r = config.session.post(url, json=params, headers=config.request_header())
 	log_response(r)
+	config.invalidate(name)
 
 	if r.ok:
 		"""
@@ -271,13 +478,37 @@ def set_inkling(address, inkling=None):
 		r.raise_for_status()
 	return
 
+# upload inkling unless the same text is already compiled on the brain.
+# returns the compilation results, or None when skipped.
+def set_inkling_if_changed(address, inkling):
+	name, config = address
+
+	# the inkling may have been changed from another machine or the web UI,
+	# so always compare with the server's copy rather than a cached one
+	config.cache.expire(config.brain_url(name) + "/0/ink")
+	try:
+		loaded = get_inkling(address, 0).get('inkling')
+	except requests.HTTPError:
+		loaded = None
+	if loaded == inkling:
+		logger.debug('Inkling for {name} is already loaded, not uploading'.format(name=name))
+		return None
+
+	return set_inkling(address, inkling)
+
 # download the currently loaded inkling, no version means download latest
 def get_inkling(address, version):
 	name, config = address
 
+	# the inkling of a trained version is immutable, so it may be on disk
+	# already. version 0 is whatever is loaded now and can change.
+	if version:
+		cached = config.cache.load_inkling(config, name, version)
+		if cached is not None:
+			return cached
+
 	url = config.brain_url(name) + "/{version}/ink".format(version=version)
-	r = requests.get(url, headers=config.request_header())
-	log_response(r)
+	r = _cached_get(config, url, 'inkling')
 
 	if r.ok:
 		"""
@@ -286,7 +517,10 @@ def get_inkling(address, version):
 			u'inkling': u'schema GameState\n Float32 cos_theta0,\n Float32 sin_theta0,\n...etc'
 		}
 		"""
-		return r.json()
+		body = r.json()
+		if version:
+			config.cache.save_inkling(config, name, version, body)
+		return body
 	else:
 		r.raise_for_status()
 	return
@@ -296,8 +530,7 @@ def get_sims(address):
 	name, config = address
 
 	url = config.brain_url(name) + "/sims"
-	r = requests.get(url, headers=config.request_header())
-	log_response(r)
+	r = _cached_get(config, url, 'sims')
 
 	if r.ok:
 		"""
@@ -317,8 +550,9 @@ def start_training(address):
 	name, config = address
 
 	# request brain
-	r = requests.put(url=config.brain_url(name) + "/train", headers=config.request_header())
+	r = config.session.put(url=config.brain_url(name) + "/train", headers=config.request_header())
 	log_response(r)
+	config.invalidate(name)
 	if r.ok:
 		"""
 		{
@@ -341,8 +575,9 @@ def stop_training(address):
 	name, config = address
 
 	# request brain
-	r = requests.put(url=config.brain_url(name) + "/stop", headers=config.request_header())
+	r = config.session.put(url=config.brain_url(name) + "/stop", headers=config.request_header())
 	log_response(r)
+	config.invalidate(name)
 	if r.ok:
 		"""
 		"""
@@ -371,8 +606,10 @@ def edit(address, description):
 def delete(address):
 	name, config = address
 
-	r = requests.delete(config.brain_url(name), headers=config.request_header())
+	r = config.session.delete(config.brain_url(name), headers=config.request_header())
 	log_response(r)
+	config.invalidate(name)
+	config.cache.forget_brain(config, name)
 
 	if r.ok:
 		"""
@@ -390,8 +627,10 @@ def create(address, description=None):
 
 	url = "{server}/v1/{user}/brains".format(server=config.server, user=config.user)
 	params = { 'name':name, 'description':description }
-	r = requests.post(url, json=params, headers=config.request_header())
+	r = config.session.post(url, json=params, headers=config.request_header())
 	log_response(r)
+	config.invalidate(name)
+	config.cache.forget_brain(config, name)
 
 	if r.ok:
 		"""
@@ -409,6 +648,173 @@ def create(address, description=None):
 	return
 
 
+# a single background thread that polls the status of every watched brain and
+# resolves the futures of whoever is waiting on them. all waiters on a brain
+# share one status request per poll. a brain's poll interval starts at
+# min_interval and doubles (with jitter) each time its state comes back
+# unchanged, up to max_interval; a change in state resets it.
+#
+#	watcher = status_watcher()
+#	future = watcher.wait_for_state(brain, IN_PROGRESS, timeout=60)
+#	future.add_done_callback(lambda f: print(f.result()))
+class StatusWatcher:
+	def __init__(self, min_interval=0.5, max_interval=10.0, jitter=0.2, max_failures=5):
+		self.min_interval = min_interval
+		self.max_interval = max_interval
+		self.jitter = jitter
+		self.max_failures = max_failures
+
+		self._lock = threading.Condition()
+		self._watches = {}
+		self._thread = None
+		self._random = random.Random()
+
+	# return a Future that resolves to the brain's state once it is one of
+	# states (a single state or a list of them). the future fails with a
+	# concurrent.futures.TimeoutError if that hasn't happened after timeout
+	# seconds, or with the request's error if status polls keep failing.
+	def wait_for_state(self, brain, states, timeout=None, callback=None):
+		if isinstance(states, str):
+			states = [states]
+
+		future = Future()
+		if callback is not None:
+			future.add_done_callback(callback)
+
+		now = time.time()
+		deadline = now + timeout if timeout is not None else None
+		key = (brain.name, id(brain.config))
+
+		with self._lock:
+			watch = self._watches.get(key)
+			if watch is None:
+				watch = _Watch(brain, now)
+				self._watches[key] = watch
+			else:
+				# poll soon so a new waiter doesn't sit out a long backoff
+				watch.next_poll = min(watch.next_poll, now + self.min_interval)
+			watch.waiters.append((frozenset(states), future, deadline))
+
+			if self._thread is None:
+				self._thread = threading.Thread(target=self._run, name='bonsai-status-watcher')
+				self._thread.daemon = True
+				self._thread.start()
+			self._lock.notify()
+		return future
+
+	def _run(self):
+		while True:
+			with self._lock:
+				self._expire(time.time())
+				if not self._watches:
+					self._thread = None
+					return
+
+				now = time.time()
+				wake = min(self._wake_time(watch) for watch in self._watches.values())
+				if wake > now:
+					self._lock.wait(wake - now)
+					continue
+
+				due = [watch for watch in self._watches.values() if watch.next_poll <= now]
+
+			# poll outside the lock so new waiters aren't held up by requests
+			for watch in due:
+				self._poll(watch)
+
+	# the earliest time the watch needs attention: its next poll or the first
+	# waiter deadline
+	def _wake_time(self, watch):
+		deadlines = [deadline for _, _, deadline in watch.waiters if deadline is not None]
+		return min([watch.next_poll] + deadlines)
+
+	def _poll(self, watch):
+		brain = watch.brain
+		try:
+			status = get_status(brain.address)
+			error = None
+		except Exception as err:
+			status = None
+			error = err
+
+		with self._lock:
+			now = time.time()
+			if error is not None:
+				watch.failures += 1
+				logger.debug('Status poll of {brain} failed: {err}'.format(brain=brain.name, err=error))
+				if watch.failures >= self.max_failures:
+					self._resolve(watch, lambda states: True, error=error)
+				watch.interval = min(watch.interval * 2, self.max_interval)
+			else:
+				watch.failures = 0
+				changed = status['state'] != brain.state
+				brain.state = status['state']
+				brain.objective_name = status['objective_name']
+				self._resolve(watch, lambda states: brain.state in states, result=brain.state)
+				if changed:
+					watch.interval = self.min_interval
+				else:
+					watch.interval = min(max(watch.interval, self.min_interval) * 2, self.max_interval)
+
+			# _expire may have dropped this watch and a new waiter registered
+			# another under the same key; leave that one alone
+			key = (brain.name, id(brain.config))
+			if not watch.waiters and self._watches.get(key) is watch:
+				del self._watches[key]
+			watch.next_poll = now + watch.interval * self._random.uniform(1 - self.jitter, 1 + self.jitter)
+
+	# complete every waiter of watch whose states match; called with the lock held
+	def _resolve(self, watch, matches, result=None, error=None):
+		waiting = []
+		for states, future, deadline in watch.waiters:
+			if future.done():
+				continue
+			if not matches(states):
+				waiting.append((states, future, deadline))
+			elif error is not None:
+				future.set_exception(error)
+			else:
+				future.set_result(result)
+		watch.waiters = waiting
+
+	# fail the waiters whose deadline has passed; called with the lock held
+	def _expire(self, now):
+		for key, watch in list(self._watches.items()):
+			waiting = []
+			for states, future, deadline in watch.waiters:
+				if future.done():
+					continue
+				if deadline is not None and deadline <= now:
+					future.set_exception(FutureTimeoutError(
+						'{brain} did not reach {states}'.format(brain=watch.brain.name, states=sorted(states))))
+				else:
+					waiting.append((states, future, deadline))
+			watch.waiters = waiting
+			if not waiting:
+				del self._watches[key]
+
+
+class _Watch:
+	def __init__(self, brain, now):
+		self.brain = brain
+		self.waiters = []
+		self.next_poll = now
+		self.interval = 0
+		self.failures = 0
+
+
+_status_watcher = None
+_status_watcher_lock = threading.Lock()
+
+# the StatusWatcher shared by every Brain in the process
+def status_watcher():
+	global _status_watcher
+	with _status_watcher_lock:
+		if _status_watcher is None:
+			_status_watcher = StatusWatcher()
+		return _status_watcher
+
+
 class Brain:
 	def __init__(self, address, inkling=None, file=None):
 		self.name, self.config = address
@@ -448,7 +854,8 @@ class Brain:
 			# upload inkling text
 			if self.state == NOT_STARTED and self.inkling is not None:
 				print('Loading inkling...')
-				set_inkling(self.address, self.inkling)
+				if set_inkling_if_changed(self.address, self.inkling) is None:
+					print('...already loaded, skipped compiling.')
 		
 		else:
 			self.inkling = get_inkling(self.address, self.latest_version)['inkling']
@@ -481,68 +888,146 @@ class Brain:
 		pass
 
 
-	def stop_training(self):
-		# try to stop training for 20 seconds
-		delay = 0.5
-		while delay < 20:
-			self.refresh_status()
-
-			# already stopped
-			if self.state == COMPLETED:
-				break
+	# stop training and return once the brain reports COMPLETED
+	def stop_training(self, timeout=20, watcher=None):
+		self.refresh_status()
 
-			# stop if running
+		if self.state != COMPLETED:
 			if self.state == IN_PROGRESS:
 				stop_training(self.address)
 
-			# stopping...
-			if delay < 1:
-				print("Brain is " + self.state, end='')
-			else:
-				print('.', end='')
-
-			# wait a little bit before polling status again...
-			time.sleep(delay)
-			delay += 2
-
-		print('\n')
+			print("Brain is " + self.state, end='', flush=True)
+			self._wait_for_state(COMPLETED, timeout, watcher)
+			print('\n')
 
 		# if we couldn't stop, raise
-		if self.state == COMPLETED:
+		if self.state != COMPLETED:
 			raise Exception('Failed to stop brain ' + self.name + ' for training')
 
 	# start up training and return when the server is read to connect a simulator
-	def start_training(self):
-
-		# try to connect for 20 seconds
+	def start_training(self, timeout=20, watcher=None):
 		print('Starting training', end='', flush=True)
-		delay = 0.5
-		while delay < 20:
-			self.refresh_status()
-
-			# already started
-			if self.state == IN_PROGRESS:
-				break
+		self.refresh_status()
 
+		if self.state != IN_PROGRESS:
 			# not started? start...
-			if self.state != IN_PROGRESS and self.state != STARTING:
+			if self.state != STARTING:
 				print('!', end='', flush=True)
 				start_training(self.address)
-
-			# wait a little bit before polling status again...
-			time.sleep(delay)
-			delay += 2
-
-			# mark the end of this loop...
-			print('.', end='', flush=True)
+			self._wait_for_state(IN_PROGRESS, timeout, watcher)
 
 		# if we couldn't connect, raise
 		if self.state != IN_PROGRESS:
 			raise Exception('failed to start up brain ' + self.name + ' for training')
 		else:
+			# pick up the version created by starting training
+			self.refresh_status()
 			print('\nIn Progress.')
-		pass
 
+	# block until the status watcher sees the brain in state, or timeout
+	def _wait_for_state(self, state, timeout, watcher=None):
+		watcher = watcher or status_watcher()
+		try:
+			# the watch may belong to another Brain for the same name, which
+			# is the one the watcher updates
+			self.state = watcher.wait_for_state(self, state, timeout).result()
+		except FutureTimeoutError:
+			pass
+
+
+
+# the outcome of one BrainSet operation on one brain; value is set on success
+# and error holds the exception on failure.
+class BrainResult(namedtuple('BrainResult', ['name', 'value', 'error'])):
+	@property
+	def ok(self):
+		return self.error is None
+
+
+# runs brain lifecycle operations across many brains at once on a bounded
+# thread pool, collecting a BrainResult per brain instead of stopping at the
+# first failure.
+#
+#	brains = BrainSet(config, max_workers=32)
+#	results = brains.load(['sweep_{}'.format(i) for i in range(200)], file='my.ink')
+#	failed = [r for r in results.values() if not r.ok]
+#	brains.start_training()
+class BrainSet:
+	def __init__(self, config, max_workers=16):
+		self.config = config
+		self.brains = OrderedDict()
+
+		# make sure there are enough pooled connections for every worker
+		if config._session is None and config.pool_size < max_workers:
+			config.pool_size = max_workers
+
+		self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+	def close(self):
+		self._executor.shutdown(wait=True)
+
+	# run func(name) for every name concurrently, returning an ordered dict of
+	# name -> BrainResult
+	def map(self, func, names):
+		futures = OrderedDict((name, self._executor.submit(func, name)) for name in names)
+		results = OrderedDict()
+		for name, future in futures.items():
+			try:
+				results[name] = BrainResult(name, future.result(), None)
+			except Exception as err:
+				logger.debug('{name} failed: {err}'.format(name=name, err=err))
+				results[name] = BrainResult(name, None, err)
+		return results
+
+	# the names to operate on, defaulting to every loaded brain
+	def _names(self, names):
+		return list(self.brains.keys()) if names is None else list(names)
+
+	# create and/or load brains by name, uploading inkling where given. inklings
+	# may map names to per-brain inkling text, overriding inkling and file.
+	def load(self, names, inkling=None, file=None, inklings=None):
+		if file is not None:
+			with open(file, 'r') as f:
+				inkling = f.read()
+
+		def load_one(name):
+			text = inklings.get(name, inkling) if inklings else inkling
+			return Brain((name, self.config), inkling=text)
+
+		results = self.map(load_one, names)
+		for name, result in results.items():
+			if result.ok:
+				self.brains[name] = result.value
+		return results
+
+	def create(self, names, description=None):
+		return self.map(lambda name: create((name, self.config), description), names)
+
+	def refresh_status(self, names=None):
+		def refresh(name):
+			self.brains[name].refresh_status()
+			return self.brains[name].state
+		return self.map(refresh, self._names(names))
+
+	def start_training(self, names=None):
+		return self.map(lambda name: self.brains[name].start_training(), self._names(names))
+
+	def stop_training(self, names=None):
+		return self.map(lambda name: self.brains[name].stop_training(), self._names(names))
+
+	def delete(self, names=None):
+		names = self._names(names)
+		results = self.map(lambda name: delete((name, self.config)), names)
+		for name, result in results.items():
+			if result.ok:
+				self.brains.pop(name, None)
+		return results
 
 
 class Simulation(simulator.Simulator):
@@ -584,7 +1069,8 @@ class Simulation(simulator.Simulator):
 		else:
 			print('No objective defined...')
 
-		run_for_training_or_prediction(name=self.brain.simulator_name, simulator_or_generator=self)
+		run_for_training_or_prediction(name=self.brain.simulator_name, simulator_or_generator=self,
+			connection_class_kwargs={'inkling': self.brain.inkling})
 		return
 
 	def start_prediction(self):
@@ -610,7 +1096,8 @@ class Simulation(simulator.Simulator):
 
 		self.brain.stop_training()
 
-		run_for_training_or_prediction(name=self.brain.simulator_name, simulator_or_generator=self)
+		run_for_training_or_prediction(name=self.brain.simulator_name, simulator_or_generator=self,
+			connection_class_kwargs={'inkling': self.brain.inkling})
 		return
 
 	def start(self):
@@ -632,7 +1119,7 @@ class Simulation(simulator.Simulator):
 		return
 
 	def advance(self, actions):
-		logger.debug('advance' + str(actions))
+		logger.debug('advance %s', actions)
 
 		# according to @rstory if our last get_state returned is_terminal=True we should reset tht sim
 		# and ignore the passed in actions for this advance.
@@ -643,7 +1130,7 @@ class Simulation(simulator.Simulator):
 		return
 
 	def set_properties(self, **kwargs):
-		logger.debug('set_properties' + str(kwargs))
+		logger.debug('set_properties %s', kwargs)
 		self.properties = kwargs
 		return
 
@@ -4,11 +4,12 @@ the BRAIN backend. It is designed to be relatively modular and compatible with
 both Python2 and Python3, using pluggable event loops.
 """
 import argparse
+import importlib
 import logging
 import os
 from collections import namedtuple
 
-from bonsai_config import BonsaiConfig
+from bonsai import instrumentation
 from bonsai.simulator import Simulator
 from bonsai.generator import Generator
 from bonsai.connections import SimulatorConnection, GeneratorConnection
@@ -16,19 +17,21 @@ from bonsai.drivers import SimulatorDriverForTraining
 from bonsai.drivers import SimulatorDriverForPrediction
 from bonsai.drivers import GeneratorDriverForTraining
 from bonsai.drivers import GeneratorDriverForPrediction
-from bonsai import tornado_event_loop
-from bonsai import websocket_event_loop
 
 log = logging.getLogger(__name__)
 
 
-# Mapping of event loop names to their implementation tuple.
+# Mapping of event loop names to their implementation.
 #
-# The first element of the tuple is the event loop run function, and the
-# second element is the create_tasks function.
+# The implementation is the name of a module with `run` and `create_tasks`
+# functions, imported only when the event loop is selected so that importing
+# bonsai doesn't pay for tornado, websocket-client and the mock BRAIN. It may
+# also be a tuple whose first element is the event loop run function and
+# whose second element is the create_tasks function.
 _EVENT_LOOPS = {
-    'tornado': (tornado_event_loop.run, tornado_event_loop.create_tasks),
-    'websocket': (websocket_event_loop.run, websocket_event_loop.create_tasks),
+    'tornado': 'bonsai.tornado_event_loop',
+    'websocket': 'bonsai.websocket_event_loop',
+    'inproc': 'bonsai.inproc_event_loop',
 }
 
 
@@ -36,6 +39,7 @@ def _read_bonsai_config():
     """ Helper function to read the information that brain server
     connection needs from BonsaiConfig.
     """
+    from bonsai_config import BonsaiConfig
     config = BonsaiConfig()
     return (
         config.access_key(), config.brain_websocket_url(), config.username())
@@ -79,6 +83,15 @@ def parse_base_arguments(argv=None):
         "stored in a bonsai config file. "
         "This may be set as BONSAI_ACCESS_KEY in the environment.")
 
+    metrics_port_help = (
+        "If specified, serve Prometheus metrics for this simulator over "
+        "HTTP on this port at /metrics. "
+        "This may be set as BONSAI_METRICS_PORT in the environment.")
+    metrics_textfile_help = (
+        "If specified, periodically write Prometheus metrics for this "
+        "simulator to this file, for use with a textfile collector. "
+        "This may be set as BONSAI_METRICS_TEXTFILE in the environment.")
+
     brain_group = parser.add_mutually_exclusive_group(required=False)
     brain_group.add_argument("--train-brain", help=train_brain_help,
                              default=_env('BONSAI_TRAIN_BRAIN'))
@@ -92,11 +105,19 @@ def parse_base_arguments(argv=None):
                         default=None)
     parser.add_argument("--access-key", help=access_key_help,
                         default=_env('BONSAI_ACCESS_KEY'))
+    parser.add_argument("--metrics-port", help=metrics_port_help, type=int,
+                        default=_env('BONSAI_METRICS_PORT'))
+    parser.add_argument("--metrics-textfile", help=metrics_textfile_help,
+                        default=_env('BONSAI_METRICS_TEXTFILE'))
 
     args, unknown = parser.parse_known_args(argv)
 
-    # Read some information from the bonsai config
-    access_key, base_url, username = _read_bonsai_config()
+    # Read some information from the bonsai config, unless the command line
+    # already has everything it would provide.
+    if args.access_key and args.brain_url:
+        access_key, base_url, username = None, None, None
+    else:
+        access_key, base_url, username = _read_bonsai_config()
 
     # If the access key was not specified on the command line, read
     # it from bonsai config.
@@ -178,7 +199,13 @@ _RuntimeConfig = namedtuple('RuntimeConfig', [
     'recording_file',
     'simulator_connection_class',
     'generator_connection_class',
-    'connection_class_kwargs'
+    'connection_class_kwargs',
+    'event_loop_kwargs',
+    'instrumentation_log_interval',
+    'metrics_port',
+    'metrics_textfile',
+    'reconnect',
+    'transport'
 ])
 
 
@@ -190,24 +217,62 @@ def _get_runtime_config(**kwargs):
     generator_connection_class = kwargs.pop('generator_connection_class',
                                             GeneratorConnection)
     connection_class_kwargs = kwargs.pop('connection_class_kwargs', None)
+    event_loop_kwargs = kwargs.pop('event_loop_kwargs', None) or {}
+    instrumentation_log_interval = kwargs.pop('instrumentation_log_interval',
+                                              None)
+    metrics_port = kwargs.pop('metrics_port', None)
+    metrics_textfile = kwargs.pop('metrics_textfile', None)
+    reconnect = kwargs.pop('reconnect', None)
+    transport = kwargs.pop('transport', None)
+    # The event loops that don't support reconnecting or transport options
+    # don't accept these arguments at all.
+    if reconnect:
+        event_loop_kwargs = dict(event_loop_kwargs, reconnect=reconnect)
+    if transport is not None:
+        event_loop_kwargs = dict(event_loop_kwargs, transport=transport)
 
     return _RuntimeConfig(
         event_loop=event_loop,
         recording_file=recording_file,
         simulator_connection_class=simulator_connection_class,
         generator_connection_class=generator_connection_class,
-        connection_class_kwargs=connection_class_kwargs
+        connection_class_kwargs=connection_class_kwargs,
+        event_loop_kwargs=event_loop_kwargs,
+        instrumentation_log_interval=instrumentation_log_interval,
+        metrics_port=metrics_port,
+        metrics_textfile=metrics_textfile,
+        reconnect=reconnect,
+        transport=transport
     )
 
 
+def _start_instrumentation(rcfg):
+    if rcfg.instrumentation_log_interval:
+        instrumentation.start_periodic_log(rcfg.instrumentation_log_interval)
+
+
+def _start_metrics_exporters(port, textfile):
+    if port is None and not textfile:
+        return
+    from bonsai import metrics_exporter
+    if port is not None:
+        metrics_exporter.start_http_server(int(port))
+    if textfile:
+        metrics_exporter.start_textfile_exporter(textfile)
+
+
 def _get_event_loop_functions(event_loop):
     try:
-        return _EVENT_LOOPS[event_loop]
+        implementation = _EVENT_LOOPS[event_loop]
     except KeyError:
         raise ValueError(
             'Invalid event loop {} provided; '
             'only supported event loops are {}'.format(
                 event_loop, list(_EVENT_LOOPS.keys())))
+    if isinstance(implementation, tuple):
+        return implementation
+    module = importlib.import_module(implementation)
+    return module.run, module.create_tasks
 
 
 def create_async_tasks(name,
@@ -227,7 +292,10 @@ def create_async_tasks(name,
                    include:
                    - event_loop = Specifies which event loop to use to drive
                                   the simulator or generator. May be one of the
-                                  following: ['tornado']. Defaults to tornado.
+                                  following: ['tornado', 'websocket',
+                                  'inproc']. Defaults to tornado. The
+                                  'inproc' loop runs against an in-process
+                                  mock BRAIN and is meant for benchmarks.
                    - recording_file = If defined, records a text file detailing
                                       all the messages communicated among the
                                       simulator/generator and the BRAIN backend
@@ -244,8 +312,31 @@ def create_async_tasks(name,
                                                passed to the simulator or
                                                generator connection class at
                                                construction. Defaults to None.
+                   - event_loop_kwargs = Dictionary of extra parameters passed
+                                         to the event loop, such as the
+                                         MockBrainScript used by the 'inproc'
+                                         event loop as `script`. Defaults to
+                                         None.
+                   - instrumentation_log_interval = If set, enables the
+                                         per-step timings in
+                                         bonsai.instrumentation and logs a
+                                         summary of them every this many
+                                         seconds. Defaults to None.
+                   - reconnect = A bonsai.reconnect.ReconnectPolicy, or
+                                 True for the default policy. When set, the
+                                 'tornado' and 'websocket' event loops
+                                 reconnect with backoff when the connection
+                                 closes before the driver has finished.
+                                 Defaults to None.
+                   - transport = A bonsai.transport.TransportOptions setting
+                                 TCP_NODELAY, compression, socket buffer
+                                 sizes, the connect timeout and the maximum
+                                 message size, applied by the 'tornado'
+                                 and 'websocket' event loops. Defaults to
+                                 None.
     """
     rcfg = _get_runtime_config(**kwargs)
+    _start_instrumentation(rcfg)
     driver = _create_driver(name, simulator_or_generator, brain_url,
                             rcfg.simulator_connection_class,
                             rcfg.generator_connection_class,
@@ -253,7 +344,8 @@ def create_async_tasks(name,
 
     _, create_tasks_function = _get_event_loop_functions(rcfg.event_loop)
     return create_tasks_function(
-        access_key, brain_url, driver, rcfg.recording_file)
+        access_key, brain_url, driver, rcfg.recording_file,
+        **rcfg.event_loop_kwargs)
 
 
 def run_for_training_or_prediction(name,
@@ -265,12 +357,17 @@ def run_for_training_or_prediction(name,
     appropriate command line arguments necessary for running a
     simulator with BrainServerConnection for training or prediction.
     :param name: The name to assign to the simulator or generator.
-    :param simulator_or_generator: Instance of the simulator or generator.
+    :param simulator_or_generator: Instance of the simulator or generator,
+                                   or a SimulatorPool to lease a simulator
+                                   from for the run.
     :param kwargs: Additional optional keyword arguments. Valid arguments
                    include:
                    - event_loop = Specifies which event loop to use to drive
                                   the simulator or generator. May be one of the
-                                  following: ['tornado']. Defaults to tornado.
+                                  following: ['tornado', 'websocket',
+                                  'inproc']. Defaults to tornado. The
+                                  'inproc' loop runs against an in-process
+                                  mock BRAIN and is meant for benchmarks.
                    - recording_file = If defined, records a text file detailing
                                       all the messages communicated among the
                                       simulator/generator and the BRAIN backend
@@ -283,12 +380,47 @@ def run_for_training_or_prediction(name,
                    - generator_connection_class = Class to be used for hooking
                                                   into the generator. Defaults
                                                   to GeneratorConnection.
+                   - event_loop_kwargs = Dictionary of extra parameters passed
+                                         to the event loop. Defaults to None.
+                   - instrumentation_log_interval = If set, enables the
+                                         per-step timings in
+                                         bonsai.instrumentation and logs a
+                                         summary of them every this many
+                                         seconds. Defaults to None.
+                   - metrics_port = If set, serves Prometheus metrics on
+                                    this port. Overrides --metrics-port.
+                   - metrics_textfile = If set, periodically writes
+                                        Prometheus metrics to this file.
+                                        Overrides --metrics-textfile.
+                   - reconnect = A bonsai.reconnect.ReconnectPolicy, or
+                                 True for the default policy. When set, the
+                                 'tornado' and 'websocket' event loops
+                                 reconnect with backoff when the connection
+                                 closes before the driver has finished.
+                                 Defaults to None.
+                   - transport = A bonsai.transport.TransportOptions setting
+                                 TCP_NODELAY, compression, socket buffer
+                                 sizes, the connect timeout and the maximum
+                                 message size, applied by the 'tornado'
+                                 and 'websocket' event loops. Defaults to
+                                 None.
     """
+    # Imported here, since most simulators aren't pooled.
+    from bonsai.simulator_pool import SimulatorPool
+    if isinstance(simulator_or_generator, SimulatorPool):
+        with simulator_or_generator.lease() as simulator:
+            return run_for_training_or_prediction(name, simulator,
+                                                  *args, **kwargs)
+
     base_arguments = parse_base_arguments(
         argv=(args if args else None))
     if base_arguments:
         rcfg = _get_runtime_config(**kwargs)
         recording_file = rcfg.recording_file or base_arguments.recording_file
+        _start_instrumentation(rcfg)
+        _start_metrics_exporters(
+            rcfg.metrics_port or base_arguments.metrics_port,
+            rcfg.metrics_textfile or base_arguments.metrics_textfile)
 
         driver = _create_driver(name, simulator_or_generator,
                                 base_arguments.brain_url,
@@ -299,4 +431,4 @@ def run_for_training_or_prediction(name,
         run_loop_function, _ = _get_event_loop_functions(rcfg.event_loop)
         run_loop_function(
             base_arguments.access_key, base_arguments.brain_url,
-            driver, recording_file)
+            driver, recording_file, **rcfg.event_loop_kwargs)
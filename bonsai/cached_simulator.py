@@ -0,0 +1,257 @@
+"""
+A simulator wrapper that memoizes the transitions of a deterministic
+simulator, so a transition that has been seen before is served from a table
+instead of being simulated again.
+
+    simulator = CachedSimulator(MySimulator(), maxsize=100000)
+    run_for_training_or_prediction('my_simulator', simulator)
+
+A transition is keyed on the simulator's properties, its current state and
+the action taken, and records the next state, its terminal flag and the
+rewards computed for it. This is only correct when those fully determine
+what happens next: a simulator with hidden or random state must not be
+cached.
+
+Cache hits don't advance the wrapped simulator. When a later transition
+misses, the wrapped simulator is caught up by advancing it through the
+actions it skipped, which requires it to repeat an episode exactly given
+the same actions.
+"""
+import logging
+from collections import namedtuple
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+from bonsai import instrumentation
+from bonsai.common.lru_cache import LRUCache
+from bonsai.simulator import SimState, SimulatorWrapper
+
+log = logging.getLogger(__name__)
+
+
+# The outcome of taking an action: the next state (a SimState), its key, and
+# a dictionary of the rewards computed for it by objective name.
+_Transition = namedtuple('_Transition', ['state', 'key', 'rewards'])
+
+
+def freeze(value):
+    """
+    Returns a hashable equivalent of a state, action or properties value,
+    converting dictionaries and lists recursively. Raises TypeError for
+    values that can't be made hashable.
+    """
+    if isinstance(value, Mapping):
+        return tuple(sorted((k, freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    hash(value)
+    return value
+
+
+class CachedSimulator(SimulatorWrapper):
+    """
+    Wraps a deterministic simulator, serving repeated transitions from a
+    bounded table of recent transitions.
+    """
+
+    def __init__(self, simulator, maxsize=10000, **kwargs):
+        """
+        :param simulator: The Simulator to wrap.
+        :param maxsize: Number of transitions kept in memory.
+        :param kwargs: Additional optional keyword arguments. Valid
+                       arguments include:
+                       - spill_path = Path of a shelve file that transitions
+                                      evicted from memory are written to,
+                                      and looked up in on a miss. Defaults
+                                      to None, which discards them.
+                       - state_key = Callable returning a hashable key for a
+                                     state dictionary. Defaults to freeze.
+                       - action_key = Callable returning a hashable key for
+                                      an action dictionary. Defaults to
+                                      freeze.
+                       - metrics_label = Value of the `simulator` label on
+                                         this cache's hit ratio gauge.
+                                         Defaults to the class name of the
+                                         wrapped simulator.
+        """
+        super(CachedSimulator, self).__init__(simulator)
+        self.state_key = kwargs.pop('state_key', freeze)
+        self.action_key = kwargs.pop('action_key', freeze)
+        spill_path = kwargs.pop('spill_path', None)
+        label = kwargs.pop('metrics_label', type(simulator).__name__)
+        if kwargs:
+            raise TypeError('Unexpected keyword arguments: {}'.format(
+                ', '.join(sorted(kwargs))))
+
+        self._spill = None
+        if spill_path is not None:
+            import shelve
+            self._spill = shelve.open(spill_path)
+        self._table = LRUCache(
+            maxsize, on_evict=self._evict if self._spill is not None else None)
+        self.spill_hits = 0
+        self.uncacheable = 0
+
+        self._properties_key = freeze({})
+        self._state_fields = None
+        self._reset_episode()
+        table = self._table
+        instrumentation.get_registry().gauge(
+            'transition_cache_hit_ratio', lambda: table.hit_rate,
+            simulator=label)
+
+    def _reset_episode(self):
+        # Actions taken this episode, and how many of them the wrapped
+        # simulator has been advanced through.
+        self._actions = []
+        self._advanced = 0
+        # The current state and the transition that led to it, if known.
+        self._state = None
+        self._state_key = None
+        self._transition = None
+
+    @staticmethod
+    def _key(function, value):
+        """
+        Returns function(value), or None when it fails or isn't hashable.
+        """
+        try:
+            key = function(value)
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def _evict(self, key, transition):
+        self._spill[repr(key)] = transition
+
+    def _lookup(self, key):
+        transition = self._table.get(key)
+        if transition is None and self._spill is not None:
+            transition = self._spill.get(repr(key))
+            if transition is not None:
+                self.spill_hits += 1
+                self._table.put(key, transition)
+        return transition
+
+    def _catch_up(self):
+        """
+        Advances the wrapped simulator through the actions that cache hits
+        skipped.
+        """
+        if self._advanced < len(self._actions):
+            log.debug('Replaying %d cached steps',
+                      len(self._actions) - self._advanced)
+        while self._advanced < len(self._actions):
+            actions = self._actions[self._advanced]
+            self.simulator.notify_prediction_received(actions)
+            self.simulator.advance(actions)
+            self._advanced += 1
+
+    def set_properties(self, **kwargs):
+        self._properties_key = self._key(freeze, kwargs)
+        super(CachedSimulator, self).set_properties(**kwargs)
+
+    def reset(self):
+        self._reset_episode()
+        super(CachedSimulator, self).reset()
+
+    def restore(self, token):
+        self._reset_episode()
+        super(CachedSimulator, self).restore(token)
+
+    def notify_state_fields(self, fields):
+        # Cached states may lack fields that the new output schema reads.
+        if self._state_fields is not None and fields != self._state_fields:
+            self.clear()
+            self._state = None
+        self._state_fields = fields
+        super(CachedSimulator, self).notify_state_fields(fields)
+
+    def _copy(self, state):
+        """
+        Copies a state dictionary, keeping only the fields of the output
+        schema once they are known, so that the other fields of a LazyState
+        are never computed.
+        """
+        if self._state_fields is None:
+            return dict(state)
+        return {name: state[name] for name in self._state_fields
+                if name in state}
+
+    def advance(self, actions):
+        key = None
+        if self._state_key is not None and self._properties_key is not None:
+            action_key = self._key(self.action_key, actions)
+            if action_key is not None:
+                key = (self._properties_key, self._state_key, action_key)
+
+        transition = self._lookup(key) if key is not None else None
+        self._actions.append(actions)
+        if transition is None:
+            self._catch_up()
+            state = self.simulator.get_state()
+            # Copy the state, in case the simulator updates it in place.
+            state = SimState(self._copy(state.state), state.is_terminal)
+            transition = _Transition(
+                state, self._key(self.state_key, state.state), {})
+            if key is None:
+                self.uncacheable += 1
+            else:
+                self._table.put(key, transition)
+
+        self._transition = transition
+        self._state = transition.state
+        self._state_key = transition.key
+
+    def get_state(self):
+        if self._state is None:
+            self._catch_up()
+            self._state = self.simulator.get_state()
+            self._state_key = self._key(self.state_key,
+                                        self._copy(self._state.state))
+        return self._state
+
+    def reward_for(self, reward_name):
+        transition = self._transition
+        if transition is not None and reward_name in transition.rewards:
+            return transition.rewards[reward_name]
+        self._catch_up()
+        reward = self.simulator.reward_for(reward_name)
+        if transition is not None:
+            transition.rewards[reward_name] = reward
+        return reward
+
+    def stop(self):
+        super(CachedSimulator, self).stop()
+        if self._spill is not None:
+            self._spill.sync()
+
+    def close(self):
+        """Closes the spill file, if any."""
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+
+    def clear(self):
+        """Discards every cached transition."""
+        self._table.clear()
+        if self._spill is not None:
+            self._spill.clear()
+
+    @property
+    def hit_rate(self):
+        return self._table.hit_rate
+
+    def stats(self):
+        """
+        Returns the hit and miss counts of the transition table, with the
+        number of hits served from the spill file and of transitions that
+        couldn't be cached because their state or action isn't hashable.
+        """
+        stats = self._table.stats()
+        stats['spill_hits'] = self.spill_hits
+        stats['uncacheable'] = self.uncacheable
+        return stats
@@ -0,0 +1,173 @@
+"""
+Builds DescriptorProtos for the schemas declared in inkling, so the schema
+classes a simulator needs can be reconstituted before the server sends them
+in its registration acknowledgement.
+
+Only the parts of inkling that describe messages are read: `schema`
+declarations and the `simulator` clause naming the configuration, action
+and state schemas. Type constraints such as `Int8{0, 1}` don't change the
+wire format and are ignored. The schemas the server acknowledges with
+remain authoritative; compare them with same_fields().
+"""
+import re
+from collections import OrderedDict, namedtuple
+
+from google.protobuf.descriptor_pb2 import DescriptorProto
+from google.protobuf.descriptor_pb2 import FieldDescriptorProto
+
+
+class InklingSchemaError(ValueError):
+    """Raised for inkling this module can't build schemas from."""
+    pass
+
+
+# Mapping of inkling primitive types to protobuf field types.
+_INKLING_TYPES = {
+    'Bool': FieldDescriptorProto.TYPE_BOOL,
+    'Int8': FieldDescriptorProto.TYPE_INT32,
+    'Int16': FieldDescriptorProto.TYPE_INT32,
+    'Int32': FieldDescriptorProto.TYPE_INT32,
+    'Int64': FieldDescriptorProto.TYPE_INT64,
+    'UInt8': FieldDescriptorProto.TYPE_UINT32,
+    'UInt16': FieldDescriptorProto.TYPE_UINT32,
+    'UInt32': FieldDescriptorProto.TYPE_UINT32,
+    'UInt64': FieldDescriptorProto.TYPE_UINT64,
+    'Float32': FieldDescriptorProto.TYPE_FLOAT,
+    'Float64': FieldDescriptorProto.TYPE_DOUBLE,
+    'String': FieldDescriptorProto.TYPE_STRING,
+}
+
+# Mapping of inkling built in structured types to their message type names.
+_INKLING_MESSAGE_TYPES = {
+    'Luminance': 'bonsai.inkling_types.proto.Luminance',
+}
+
+_SCHEMA_RE = re.compile(r'\bschema\s+(\w+)(.*?)\bend\b', re.DOTALL)
+_SIMULATOR_RE = re.compile(
+    r'\bsimulator\s+(\w+)\s*\(([^)]*)\)(.*?)\bend\b', re.DOTALL)
+_CLAUSE_RE = re.compile(r'\b(action|control|state)\s*\(([^)]*)\)')
+_FIELD_RE = re.compile(r'^(\w+)\s*(\{.*\}|\(.*\))?\s*(\w+)$', re.DOTALL)
+_COMMENT_RE = re.compile(r'#[^\n]*')
+
+# The properties, output (state) and prediction (action) schemas of a
+# simulator. Any of them may be None when the inkling doesn't declare it.
+SimulatorSchemas = namedtuple('SimulatorSchemas',
+                              ['properties', 'output', 'prediction'])
+
+
+def _split_fields(text):
+    """
+    Splits a field list on the commas that aren't inside a constraint.
+    """
+    fields = []
+    depth = 0
+    current = []
+    for char in text:
+        if char in '{(':
+            depth += 1
+        elif char in '})':
+            depth -= 1
+        if char == ',' and depth == 0:
+            fields.append(''.join(current))
+            current = []
+        else:
+            current.append(char)
+    fields.append(''.join(current))
+    return [' '.join(field.split()) for field in fields if field.strip()]
+
+
+def build_schema(name, field_list):
+    """
+    Builds a DescriptorProto from an inkling field list.
+    :param name: Name for the message; may be empty for anonymous schemas.
+    :param field_list: Text of comma separated inkling fields, such as
+                       "Float32 x, Int8{0, 1} command".
+    :return: The schema, with fields numbered from 1 in declaration order.
+    :rtype: DescriptorProto
+    """
+    schema = DescriptorProto()
+    schema.name = name
+    for number, text in enumerate(_split_fields(field_list), 1):
+        match = _FIELD_RE.match(text)
+        if not match:
+            raise InklingSchemaError(
+                'Unable to parse field "{}" of schema {}'.format(text, name))
+        type_name, _, field_name = match.groups()
+        field = schema.field.add()
+        field.name = field_name
+        field.number = number
+        field.label = FieldDescriptorProto.LABEL_OPTIONAL
+        if type_name in _INKLING_TYPES:
+            field.type = _INKLING_TYPES[type_name]
+        elif type_name in _INKLING_MESSAGE_TYPES:
+            field.type = FieldDescriptorProto.TYPE_MESSAGE
+            field.type_name = _INKLING_MESSAGE_TYPES[type_name]
+        else:
+            raise InklingSchemaError(
+                'Unsupported type {} for field {} of schema {}'.format(
+                    type_name, field_name, name))
+    return schema
+
+
+def parse_schemas(inkling):
+    """
+    Builds the schemas declared in inkling.
+    :return: OrderedDict of schema name to DescriptorProto.
+    """
+    inkling = _COMMENT_RE.sub('', inkling)
+    return OrderedDict(
+        (name, build_schema(name, body))
+        for name, body in _SCHEMA_RE.findall(inkling))
+
+
+def _resolve(reference, schemas):
+    """
+    Resolves the contents of a simulator clause's parentheses, which are
+    either the name of a declared schema or an anonymous field list.
+    """
+    reference = reference.strip()
+    if not reference:
+        return DescriptorProto()
+    if re.match(r'^\w+$', reference):
+        if reference not in schemas:
+            raise InklingSchemaError(
+                'Schema {} is not declared'.format(reference))
+        return schemas[reference]
+    return build_schema('', reference)
+
+
+def simulator_schemas(inkling, simulator_name):
+    """
+    Builds the schemas a simulator declared in inkling is acknowledged with.
+    :param inkling: The inkling text.
+    :param simulator_name: Name of the simulator in inkling.
+    :return: SimulatorSchemas of DescriptorProtos.
+    """
+    schemas = parse_schemas(inkling)
+    inkling = _COMMENT_RE.sub('', inkling)
+    for name, config, body in _SIMULATOR_RE.findall(inkling):
+        if name != simulator_name:
+            continue
+        clauses = dict(_CLAUSE_RE.findall(body))
+        action = clauses.get('action', clauses.get('control'))
+        state = clauses.get('state')
+        return SimulatorSchemas(
+            properties=_resolve(config, schemas),
+            output=_resolve(state, schemas) if state is not None else None,
+            prediction=(_resolve(action, schemas)
+                        if action is not None else None))
+    raise InklingSchemaError(
+        'Simulator {} is not declared'.format(simulator_name))
+
+
+def _field_signature(schema):
+    return tuple((f.name, f.number, f.label, f.type, f.type_name.lstrip('.'))
+                 for f in schema.field)
+
+
+def same_fields(schema, other):
+    """
+    Whether two DescriptorProtos describe the same wire format, regardless
+    of their message names.
+    """
+    return _field_signature(schema) == _field_signature(other)
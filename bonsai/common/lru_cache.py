@@ -0,0 +1,76 @@
+"""
+A small bounded mapping that evicts its least recently used entries, and
+counts its hits and misses.
+"""
+from collections import OrderedDict
+
+
+class LRUCache(object):
+    """
+    Least recently used cache holding at most `maxsize` entries. Not
+    thread-safe; each user is expected to own its cache.
+    """
+
+    def __init__(self, maxsize, on_evict=None):
+        """
+        :param maxsize: Maximum number of entries; must be positive.
+        :param on_evict: Optional callable taking (key, value) of every
+                         entry evicted to make room.
+        """
+        if maxsize <= 0:
+            raise ValueError('maxsize must be positive, got {}'.format(
+                maxsize))
+        self.maxsize = maxsize
+        self.on_evict = on_evict
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+
+    def get(self, key, default=None):
+        """
+        Returns the value for key, marking it most recently used, or default
+        when key isn't cached.
+        """
+        try:
+            value = self._entries.pop(key)
+        except KeyError:
+            self.misses += 1
+            return default
+        self._entries[key] = value
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self._entries.pop(key, None)
+        self._entries[key] = value
+        while len(self._entries) > self.maxsize:
+            evicted = self._entries.popitem(last=False)
+            self.evictions += 1
+            if self.on_evict is not None:
+                self.on_evict(*evicted)
+
+    def clear(self):
+        self._entries.clear()
+
+    @property
+    def hit_rate(self):
+        """The fraction of lookups that were hits, or 0 before any lookup."""
+        lookups = self.hits + self.misses
+        return float(self.hits) / lookups if lookups else 0.0
+
+    def stats(self):
+        return {
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hit_rate,
+        }
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
@@ -2,6 +2,7 @@
 """
 import uuid
 import os
+import threading
 
 from google.protobuf.descriptor_pb2 import FileDescriptorProto
 from google.protobuf.descriptor_pb2 import DescriptorProto
@@ -9,15 +10,31 @@ from google.protobuf.message_factory import MessageFactory
 
 from bonsai.proto import inkling_types_pb2
 
-# The message factory
-_message_factory = MessageFactory()
+# The message factory, created by _get_message_factory() on first use.
+_message_factory = None
+_message_factory_lock = threading.Lock()
 
-# (Relying on Python module implementation being thread-safe here...)
-# Add our custom inkling types into the message factory pool so
-# they are available to the message factory.
-_inkling_file_descriptor = FileDescriptorProto()
-inkling_types_pb2.DESCRIPTOR.CopyToProto(_inkling_file_descriptor)
-_message_factory.pool.Add(_inkling_file_descriptor)
+
+def _get_message_factory():
+    """
+    Returns the message factory, creating it on the first call. Building it
+    copies the inkling types into a new descriptor pool, which is left out of
+    import time for processes that never reconstitute a schema.
+    """
+    global _message_factory
+    if _message_factory is None:
+        with _message_factory_lock:
+            if _message_factory is None:
+                factory = MessageFactory()
+
+                # Add our custom inkling types into the message factory pool
+                # so they are available to the message factory.
+                inkling_file_descriptor = FileDescriptorProto()
+                inkling_types_pb2.DESCRIPTOR.CopyToProto(
+                    inkling_file_descriptor)
+                factory.pool.Add(inkling_file_descriptor)
+                _message_factory = factory
+    return _message_factory
 
 
 def _create_package_from_fields(descriptor_proto):
@@ -66,7 +83,7 @@ def _make_descriptor(descriptor_proto, package, full_name):
     """
 
     # The descriptor may already exist... look for it first.
-    pool = _message_factory.pool
+    pool = _get_message_factory().pool
     try:
         return pool.FindMessageTypeByName(full_name)
     except KeyError:
@@ -108,7 +125,7 @@ def reconstitute(descriptor_proto):
 
     # Must be brand new. Rebuild it.
     descriptor = _make_descriptor(descriptor_proto, package, full_name)
-    cls = _message_factory.GetPrototype(descriptor)
+    cls = _get_message_factory().GetPrototype(descriptor)
     return cls
 
 
@@ -131,3 +131,33 @@ def convert_state_to_proto(state_msg, state):
                     'Expected the field "{}" to be a string, but got {} '
                     'instead.'.format(field.name, repr(value)))
             setattr(state_msg, field.name, value)
+
+
+def compile_state_converter(descriptor):
+    """ This function returns a function that converts states like
+    convert_state_to_proto, for messages of the given descriptor, but without
+    its checks. A missing field or a value of the wrong type raises whatever
+    Python raises rather than SimStateException. Luminance fields are still
+    checked to be Luminance. It is meant for states known to match the schema.
+    """
+    scalars = []
+    messages = []
+    for field in descriptor.fields:
+        if is_proto_type_embedded_message(field):
+            messages.append((field.name, inkling_type_proto_handler[
+                field.message_type.full_name]))
+        elif is_proto_type_float(field):
+            scalars.append((field.name, float))
+        elif is_proto_type_integer(field):
+            scalars.append((field.name, int))
+        elif is_proto_type_boolean(field):
+            scalars.append((field.name, bool))
+        elif is_proto_type_string(field):
+            scalars.append((field.name, str))
+
+    def convert(state_msg, state):
+        for name, coerce in scalars:
+            setattr(state_msg, name, coerce(state[name]))
+        for name, handler in messages:
+            handler(name, state_msg, state[name])
+    return convert
@@ -0,0 +1,89 @@
+import unittest
+
+from google.protobuf.descriptor_pb2 import FieldDescriptorProto
+
+from bonsai.common.inkling_schema import InklingSchemaError
+from bonsai.common.inkling_schema import build_schema, parse_schemas
+from bonsai.common.inkling_schema import same_fields, simulator_schemas
+
+
+_INKLING = '''
+schema GameState  # what the simulator reports
+    Float32 x,
+    Float64{0:0.5:10} y,
+    Luminance(84, 84) pixels
+end
+
+schema Action
+    Int8{0, 1} command,
+    Bool fire
+end
+
+schema Config
+    UInt16 episode_length,
+    String level
+end
+
+simulator my_simulator(Config)
+    action (Action)
+    state (GameState)
+end
+
+simulator old_style()
+    state (Int64 count)
+    control (Action)
+end
+'''
+
+
+def _fields(schema):
+    return [(f.name, f.number, f.type) for f in schema.field]
+
+
+class InklingSchemaTests(unittest.TestCase):
+
+    def test_parse_schemas(self):
+        schemas = parse_schemas(_INKLING)
+        self.assertEqual(['GameState', 'Action', 'Config'], list(schemas))
+        self.assertEqual(
+            [('x', 1, FieldDescriptorProto.TYPE_FLOAT),
+             ('y', 2, FieldDescriptorProto.TYPE_DOUBLE),
+             ('pixels', 3, FieldDescriptorProto.TYPE_MESSAGE)],
+            _fields(schemas['GameState']))
+        self.assertEqual('bonsai.inkling_types.proto.Luminance',
+                         schemas['GameState'].field[2].type_name)
+        self.assertEqual(
+            [('command', 1, FieldDescriptorProto.TYPE_INT32),
+             ('fire', 2, FieldDescriptorProto.TYPE_BOOL)],
+            _fields(schemas['Action']))
+
+    def test_simulator_schemas(self):
+        schemas = simulator_schemas(_INKLING, 'my_simulator')
+        self.assertEqual('Config', schemas.properties.name)
+        self.assertEqual('GameState', schemas.output.name)
+        self.assertEqual('Action', schemas.prediction.name)
+
+    def test_anonymous_and_empty_schemas(self):
+        schemas = simulator_schemas(_INKLING, 'old_style')
+        self.assertEqual([], _fields(schemas.properties))
+        self.assertEqual([('count', 1, FieldDescriptorProto.TYPE_INT64)],
+                         _fields(schemas.output))
+        self.assertEqual('Action', schemas.prediction.name)
+
+    def test_errors(self):
+        with self.assertRaises(InklingSchemaError):
+            simulator_schemas(_INKLING, 'missing')
+        with self.assertRaises(InklingSchemaError):
+            build_schema('Bad', 'Matrix(2, 2) m')
+        with self.assertRaises(InklingSchemaError):
+            simulator_schemas('simulator s(Nope)\nend', 's')
+
+    def test_same_fields_ignores_names(self):
+        schema = build_schema('A', 'Float32 x, Int8 y')
+        other = build_schema('B', 'Float32 x, Int16 y')
+        self.assertTrue(same_fields(schema, other))
+        self.assertFalse(same_fields(schema, build_schema('A', 'Float32 x')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,38 @@
+import unittest
+
+from bonsai.common.lru_cache import LRUCache
+
+
+class LRUCacheTests(unittest.TestCase):
+
+    def test_evicts_least_recently_used(self):
+        evicted = []
+        cache = LRUCache(2, on_evict=lambda k, v: evicted.append(k))
+        cache.put('a', 1)
+        cache.put('b', 2)
+        self.assertEqual(1, cache.get('a'))
+        cache.put('c', 3)
+
+        self.assertEqual(['b'], evicted)
+        self.assertIn('a', cache)
+        self.assertNotIn('b', cache)
+        self.assertEqual(2, len(cache))
+
+    def test_hit_rate(self):
+        cache = LRUCache(4)
+        self.assertEqual(0.0, cache.hit_rate)
+        cache.put('a', 1)
+        cache.get('a')
+        cache.get('a')
+        cache.get('b')
+        self.assertEqual(2, cache.hits)
+        self.assertEqual(1, cache.misses)
+        self.assertAlmostEqual(2.0 / 3, cache.stats()['hit_rate'])
+
+    def test_size_must_be_positive(self):
+        with self.assertRaises(ValueError):
+            LRUCache(0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,7 +2,12 @@ import sys
 import unittest
 from collections import namedtuple
 from bonsai.inkling_types import Luminance
+from bonsai.common.message_builder import reconstitute
+from bonsai.common.state_to_proto import SimStateException
 from bonsai.common.state_to_proto import build_luminance_from_state
+from bonsai.common.state_to_proto import compile_state_converter
+from bonsai.common.state_to_proto import convert_state_to_proto
+from bonsai.mock_brain_server import make_schema
 
 """
 This namedtuple is useful when generating generic protobuff messages
@@ -43,5 +48,33 @@ class TestStateToProto(unittest.TestCase):
         proto_msg = SimState(lum_in_proto, 'generic_msg')
         build_luminance_from_state(field_name, proto_msg, lum_from_state)
 
+    def test_compiled_converter_matches(self):
+        """
+        Test that the converter from compile_state_converter builds the same
+        message as convert_state_to_proto for a valid state.
+        """
+        state_class = reconstitute(make_schema('State', [
+            ('frame', 'luminance'), ('count', 'int32'), ('score', 'float'),
+            ('done', 'bool'), ('label', 'string')]))
+        state = {'frame': Luminance(2, 1, [0.0, 1.0]), 'count': 3.0,
+                 'score': 1, 'done': 0, 'label': 7}
+        strict = state_class()
+        convert_state_to_proto(strict, state)
+        compiled = state_class()
+        compile_state_converter(state_class.DESCRIPTOR)(compiled, state)
+        self.assertEqual(strict.SerializeToString(),
+                         compiled.SerializeToString())
+
+    def test_compiled_converter_checks_luminance(self):
+        """
+        Test that the compiled converter still rejects a value that is not
+        Luminance in a Luminance field.
+        """
+        state_class = reconstitute(make_schema('State', [
+            ('frame', 'luminance')]))
+        convert = compile_state_converter(state_class.DESCRIPTOR)
+        self.assertRaises(SimStateException, convert, state_class(),
+                          {'frame': [1, 2, 3]})
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,18 +1,49 @@
 import logging
-from pprint import pformat
-
-from google.protobuf.text_format import MessageToString
-
+try:
+    from types import MappingProxyType
+except ImportError:
+    # Python 2 has no read-only mapping, so each step gets its own copy of
+    # the memoized actions instead.
+    MappingProxyType = None
+
+from bonsai import instrumentation
 from bonsai.protocols import BrainServerProtocol, BrainServerSimulatorProtocol
 from bonsai.protocols import BrainServerGeneratorProtocol
 from bonsai.proto.generator_simulator_api_pb2 import SimulatorToServer
 from bonsai.common.message_builder import reconstitute
+from bonsai.common.state_to_proto import compile_state_converter
 from bonsai.common.state_to_proto import convert_state_to_proto
+from bonsai.tracing import lazy_message, lazy_pformat
 
 
 log = logging.getLogger(__name__)
 
 
+def _hit_rate(cache):
+    return lambda: cache.hit_rate
+
+
+def _exercise(schema_class):
+    """
+    Serializes and parses a message of schema_class with every field set, so
+    that protobuf builds the field encoders and decoders now.
+    """
+    message = schema_class()
+    for field in message.DESCRIPTOR.fields:
+        if field.type == field.TYPE_MESSAGE:
+            getattr(message, field.name).SetInParent()
+        elif field.type == field.TYPE_BOOL:
+            setattr(message, field.name, True)
+        elif field.type == field.TYPE_STRING:
+            setattr(message, field.name, u'-')
+        elif field.type in (field.TYPE_FLOAT, field.TYPE_DOUBLE):
+            setattr(message, field.name, 1.0)
+        elif field.cpp_type in (field.CPPTYPE_INT32, field.CPPTYPE_INT64,
+                                field.CPPTYPE_UINT32, field.CPPTYPE_UINT64):
+            setattr(message, field.name, 1)
+    schema_class.FromString(message.SerializeToString())
+
+
 class SimulatorConnection(BrainServerProtocol, BrainServerSimulatorProtocol):
     """
     This is the "glue" class that connects a simulator conforming to Bonsai's
@@ -54,26 +85,186 @@ class SimulatorConnection(BrainServerProtocol, BrainServerSimulatorProtocol):
         # the server-allocated ID for the current simulator session
         self._simulator_id = None
 
+        # Number of decoded predictions and of encoded states to memoize, for
+        # simulators with small discrete action and state spaces that see the
+        # same ones over and over. Zero disables the memos. When enabled, the
+        # actions given to the simulator are read-only mappings (copies on
+        # Python 2).
+        codec_cache_size = kwargs.pop('codec_cache_size', 0)
+        reset_snapshot_count = kwargs.pop('reset_snapshot_count', 0)
+        if codec_cache_size or reset_snapshot_count:
+            # Imported here, so importing bonsai doesn't pay for features
+            # that are off by default.
+            from bonsai.common.lru_cache import LRUCache
+        self._prediction_memo = None
+        self._state_memo = None
+        if codec_cache_size:
+            self._prediction_memo = LRUCache(codec_cache_size)
+            self._state_memo = LRUCache(codec_cache_size)
+
+        # Number of simulator snapshots taken after a reset to keep, keyed by
+        # the SET_PROPERTIES payload. A RESET with properties that have been
+        # seen before restores the snapshot instead of resetting the
+        # simulator. Zero disables snapshots, as does a simulator whose
+        # snapshot() returns None.
+        self._reset_snapshots = None
+        if reset_snapshot_count:
+            self._reset_snapshots = LRUCache(reset_snapshot_count)
+        self._properties_payload = None
+
+        # Output schema field names in the order that keys the state memo, or
+        # None when states of the output schema can't be memoized.
+        self._state_key_fields = None
+
+        # When set, states are checked strictly for this many steps after
+        # the output schema changes, or after a state fails to convert, and
+        # then converted without checks, except for one in every
+        # validation_sample_interval states. None, the default, always
+        # checks them.
+        self._strict_validation_steps = kwargs.pop(
+            'strict_validation_steps', None)
+        self._validation_sample_interval = kwargs.pop(
+            'validation_sample_interval', 1000)
+        self._check_states_strictly()
+
+        # The last (actions, serialized actions) decoded from a prediction.
+        # The serialized form is reused as the action taken in the next
+        # state when memoizing.
+        self._last_decoded = (None, None)
+
+        # SimulatorSchemas of (DescriptorProto, class) pairs built from
+        # inkling before the server acknowledges registration, or None. See
+        # prewarm_schemas().
+        self._prewarmed = None
+
+        # Classes of the schemas received from the server, keyed by their
+        # serialized DescriptorProto, so that schemas sent again with every
+        # SET_PROPERTIES or after reconnecting aren't rebuilt.
+        self._schema_classes = {}
+        inkling = kwargs.pop('inkling', None)
+        if inkling:
+            self.prewarm_schemas(inkling)
+
+        self._bind_instruments()
+
+    def prewarm_schemas(self, inkling):
+        """
+        Builds the schema classes for this simulator from its inkling, and
+        exercises their serialization, so that the first steps after
+        registration don't pay for it. The schemas the server acknowledges
+        with are compared against these, which are only used if their fields
+        match.
+        :param inkling: The inkling text declaring this simulator.
+        """
+        from bonsai.common.inkling_schema import InklingSchemaError
+        from bonsai.common.inkling_schema import SimulatorSchemas
+        from bonsai.common.inkling_schema import simulator_schemas
+        try:
+            schemas = simulator_schemas(inkling, self._simulator_name)
+        except InklingSchemaError as e:
+            log.warning('Unable to prebuild schemas from inkling: %s', e)
+            return
+        prewarmed = []
+        for schema in schemas:
+            if schema is None:
+                prewarmed.append(None)
+                continue
+            schema_class = reconstitute(schema)
+            _exercise(schema_class)
+            prewarmed.append((schema, schema_class))
+        self._prewarmed = SimulatorSchemas(*prewarmed)
+
+    def _schema_class(self, schema, kind):
+        """
+        Returns the class for a schema received from the server, reusing the
+        class built for an identical schema before, or the prewarmed class
+        of that kind ('properties', 'output' or 'prediction') when it has
+        the same fields.
+        """
+        key = schema.SerializeToString()
+        schema_class = self._schema_classes.get(key)
+        if schema_class is not None:
+            return schema_class
+        prewarmed = getattr(self._prewarmed, kind, None)
+        if prewarmed is not None:
+            from bonsai.common.inkling_schema import same_fields
+        if prewarmed is not None and same_fields(prewarmed[0], schema):
+            schema_class = prewarmed[1]
+        else:
+            if prewarmed is not None:
+                log.info('Schema %s from the server differs from the '
+                         'inkling; rebuilding it.', schema.name)
+            schema_class = reconstitute(schema)
+        self._schema_classes[key] = schema_class
+        return schema_class
+
+    def _bind_instruments(self):
+        """
+        Looks up the timers and counters used by this connection, labelled
+        with the current simulator ID once one has been allocated.
+        """
+        registry = instrumentation.get_registry()
+        labels = {}
+        if self._simulator_id is not None:
+            labels['sim_id'] = self._simulator_id
+        self._advance_timer = registry.timer(
+            'simulator_advance_seconds', **labels)
+        self._get_state_timer = registry.timer(
+            'simulator_get_state_seconds', **labels)
+        self._reward_timer = registry.timer(
+            'simulator_reward_seconds', **labels)
+        self._state_encode_timer = registry.timer(
+            'state_encode_seconds', **labels)
+        self._prediction_decode_timer = registry.timer(
+            'prediction_decode_seconds', **labels)
+        self._properties_decode_timer = registry.timer(
+            'properties_decode_seconds', **labels)
+        self._steps_counter = registry.counter('steps_total', **labels)
+        self._episodes_counter = registry.counter('episodes_total', **labels)
+        self._restores_counter = registry.counter(
+            'reset_snapshot_restores_total', **labels)
+        # The caches are only used once a simulator ID is allocated.
+        if self._prediction_memo is not None and labels:
+            registry.gauge('codec_cache_hit_ratio',
+                           _hit_rate(self._prediction_memo),
+                           cache='prediction', **labels)
+            registry.gauge('codec_cache_hit_ratio',
+                           _hit_rate(self._state_memo),
+                           cache='state', **labels)
+
+    def codec_cache_stats(self):
+        """
+        Returns the hit and miss counts of the prediction and state memos, or
+        None when memoization is disabled.
+        """
+        if self._prediction_memo is None:
+            return None
+        return {'prediction': self._prediction_memo.stats(),
+                'state': self._state_memo.stats()}
+
     def generate_register_message(self, message):
         message.message_type = SimulatorToServer.REGISTER
         message.register_data.simulator_name = self._simulator_name
 
     def handle_register_acknowledgement(self, message):
-        log.debug('Processing acknowledgement %s', MessageToString(message))
+        log.debug('Processing acknowledgement %s', lazy_message(message))
 
         props_schema = message.properties_schema
         out_schema = message.output_schema
         pred_schema = message.prediction_schema
-        self._properties_schema = reconstitute(props_schema)
-        self._output_schema = reconstitute(out_schema)
-        self._prediction_schema = reconstitute(pred_schema)
+        self._properties_schema = self._schema_class(
+            props_schema, 'properties')
+        self._set_output_schema(self._schema_class(out_schema, 'output'))
+        self._set_prediction_schema(self._schema_class(
+            pred_schema, 'prediction'))
         self._simulator_id = message.sim_id
+        self._bind_instruments()
 
     def handle_set_properties_message(self, message):
 
-        log.debug('Received set properties data %s',
-                  MessageToString(message))
+        log.debug('Received set properties data %s', lazy_message(message))
         property_data = message
+        start = self._properties_decode_timer.start()
         # Parse request_data into a properties message.
         properties_message = self._properties_schema()
         properties_message.ParseFromString(
@@ -84,58 +275,120 @@ class SimulatorConnection(BrainServerProtocol, BrainServerSimulatorProtocol):
         for field in properties_message.DESCRIPTOR.fields:
             properties[field.name] = getattr(properties_message,
                                              field.name)
+        self._properties_decode_timer.stop(start)
+        self._properties_payload = property_data.dynamic_properties
 
         # Call set_properties on the simulator.
         self._simulator.set_properties(**properties)
 
         # Set current reward name.
         self._current_reward_name = property_data.reward_name
+        if self._current_reward_name:
+            self._simulator.notify_reward_name(self._current_reward_name)
 
         # Set the predictions schema
-        self._prediction_schema = reconstitute(property_data.prediction_schema)
+        self._set_prediction_schema(self._schema_class(
+            property_data.prediction_schema, 'prediction'))
+
+    def _set_output_schema(self, schema_class):
+        if schema_class is self._output_schema:
+            return
+        self._output_schema = schema_class
+        self._check_states_strictly()
+        fields = schema_class.DESCRIPTOR.fields
+        self._simulator.notify_state_fields(
+            frozenset(f.name for f in fields))
+        self._state_key_fields = None
+        if self._state_memo is not None:
+            self._state_memo.clear()
+            # Luminance and other message fields are neither hashable by
+            # value nor likely to repeat.
+            if not any(f.type == f.TYPE_MESSAGE for f in fields):
+                self._state_key_fields = tuple(f.name for f in fields)
+
+    def _set_prediction_schema(self, schema_class):
+        if schema_class is self._prediction_schema:
+            return
+        self._prediction_schema = schema_class
+        if self._prediction_memo is not None:
+            self._prediction_memo.clear()
+        self._last_decoded = (None, None)
 
     def generate_state_message(self, message):
 
         message.message_type = SimulatorToServer.STATE
         message.sim_id = self._simulator_id
+        start = self._get_state_timer.start()
         state = self._simulator.get_state()
+        self._get_state_timer.stop(start)
 
         if self._current_reward_name:
-            reward = getattr(self._simulator, self._current_reward_name)()
+            start = self._reward_timer.start()
+            reward = self._simulator.reward_for(self._current_reward_name)
+            self._reward_timer.stop(start)
         else:
             reward = 0.0
 
-        log.debug('generate_state_message => state = %s', pformat(state))
+        log.debug('generate_state_message => state = %s',
+                  lazy_pformat(state))
+        start = self._state_encode_timer.start()
         terminal = state.is_terminal
-        state_message = self._output_schema()
-        convert_state_to_proto(state_message, state.state)
 
         current_state_data = message.state_data.add()
-        current_state_data.state = state_message.SerializeToString()
+        current_state_data.state = self._encode_state(state.state)
         current_state_data.reward = reward
         current_state_data.terminal = terminal
 
         # add action taken
         last_action = self._simulator.get_last_action()
         if last_action is not None:
-            actions_msg = self._prediction_schema()
-            convert_state_to_proto(actions_msg, last_action)
-            current_state_data.action_taken = actions_msg.SerializeToString()
+            if last_action is self._last_decoded[0] and \
+                    self._last_decoded[1] is not None:
+                current_state_data.action_taken = self._last_decoded[1]
+            else:
+                actions_msg = self._prediction_schema()
+                convert_state_to_proto(actions_msg, last_action)
+                current_state_data.action_taken = \
+                    actions_msg.SerializeToString()
+        self._state_encode_timer.stop(start)
         if self._log_state_messages:
-            log.debug('Generated simulator state %s',
-                      MessageToString(message))
+            log.debug('Generated simulator state %s', lazy_message(message))
 
     def handle_start_message(self):
+        if instrumentation.is_enabled():
+            self._episodes_counter.inc()
         self._simulator.start()
 
     def handle_stop_message(self):
         self._simulator.stop()
 
     def handle_prediction_message(self, message):
-        log.debug('Received prediction message %s',
-                  MessageToString(message))
+        log.debug('Received prediction message %s', lazy_message(message))
 
+        start = self._prediction_decode_timer.start()
         prediction_data = message.dynamic_prediction
+        if self._prediction_memo is not None:
+            decoded = self._prediction_memo.get(prediction_data)
+            if decoded is None:
+                decoded = self._decode_prediction(prediction_data)
+                self._prediction_memo.put(prediction_data, decoded)
+        else:
+            decoded = self._decode_prediction(prediction_data)
+        self._last_decoded = decoded
+        actions = decoded[0]
+        if self._prediction_memo is not None and MappingProxyType is None:
+            actions = dict(actions)
+        self._prediction_decode_timer.stop(start)
+
+        self._simulator.notify_prediction_received(actions)
+
+    def _decode_prediction(self, prediction_data):
+        """
+        Decodes prediction bytes into a dictionary of action names to values.
+        :return: Tuple of the actions and, when memoizing, the actions
+                 serialized for use as the action taken; the actions are then
+                 a read-only mapping, as they're shared between steps.
+        """
         # Parse request_data into a properties message.
         predictions_msg = self._prediction_schema()
         predictions_msg.ParseFromString(prediction_data)
@@ -144,17 +397,112 @@ class SimulatorConnection(BrainServerProtocol, BrainServerSimulatorProtocol):
         predictions = {}
         for field in predictions_msg.DESCRIPTOR.fields:
             predictions[field.name] = getattr(predictions_msg, field.name)
+        if self._prediction_memo is None:
+            return predictions, None
+        if MappingProxyType is not None:
+            predictions = MappingProxyType(predictions)
+        return predictions, predictions_msg.SerializeToString()
 
-        self._simulator.notify_prediction_received(predictions)
+    def _encode_state(self, state):
+        """
+        Serializes a state dictionary with the output schema, looking it up
+        in the state memo first when memoizing.
+        """
+        key = None
+        if self._state_key_fields is not None:
+            try:
+                values = tuple(state[name] for name in self._state_key_fields)
+                # Equal values of different types, like 1 and 1.0 for a
+                # string field, may convert differently.
+                key = values + tuple(type(value) for value in values)
+                encoded = self._state_memo.get(key)
+                if encoded is not None:
+                    return encoded
+            except (KeyError, TypeError):
+                key = None
+
+        state_message = self._output_schema()
+        self._convert_state(state_message, state)
+        encoded = state_message.SerializeToString()
+        if key is not None:
+            self._state_memo.put(key, encoded)
+        return encoded
+
+    def _check_states_strictly(self):
+        # The unchecked converter, compiled once enough states have passed
+        # the checks.
+        self._fast_convert = None
+        self._strict_steps_left = self._strict_validation_steps
+        self._unchecked_steps = 0
+
+    def _convert_state(self, state_message, state):
+        """
+        Fills a state message from a state dictionary, with the checks of
+        convert_state_to_proto while validating strictly or sampling, and
+        with the unchecked converter otherwise.
+        """
+        if self._fast_convert is not None:
+            self._unchecked_steps += 1
+            interval = self._validation_sample_interval
+            if not interval or self._unchecked_steps % interval:
+                try:
+                    self._fast_convert(state_message, state)
+                    return
+                except Exception as e:
+                    log.warning('Unable to convert a state without checks '
+                                '(%s); checking states strictly again.', e)
+                    self._check_states_strictly()
+                    state_message.Clear()
+
+        try:
+            convert_state_to_proto(state_message, state)
+        except Exception:
+            self._check_states_strictly()
+            raise
+        if self._fast_convert is None and self._strict_steps_left is not None:
+            self._strict_steps_left -= 1
+            if self._strict_steps_left <= 0:
+                log.debug('States passed %d strict checks; converting them '
+                          'without checks.', self._strict_validation_steps)
+                self._fast_convert = compile_state_converter(
+                    state_message.DESCRIPTOR)
 
     def handle_finish_message(self):
         pass
 
     def handle_reset_message(self):
+        snapshots = self._reset_snapshots
+        if snapshots is None:
+            self._simulator.reset()
+            return
+
+        key = self._properties_payload
+        token = snapshots.get(key)
+        if token is not None:
+            try:
+                self._simulator.restore(token)
+                if instrumentation.is_enabled():
+                    self._restores_counter.inc()
+                return
+            except Exception:
+                log.exception('Unable to restore the simulator snapshot; '
+                              'resetting it instead.')
+
         self._simulator.reset()
+        token = self._simulator.snapshot()
+        if token is None:
+            log.info('The simulator does not support snapshot(); resetting '
+                     'it for every episode.')
+            self._reset_snapshots = None
+        else:
+            snapshots.put(key, token)
 
     def advance(self):
+        start = self._advance_timer.start()
         self._simulator.advance(self._simulator.get_last_action())
+        if start is not None:
+            self._advance_timer.stop(start)
+            self._steps_counter.inc()
 
     def generate_ready_message(self, message):
         message.message_type = SimulatorToServer.READY
@@ -4,6 +4,7 @@ from google.protobuf.text_format import MessageToString
 
 from bonsai.proto.generator_simulator_api_pb2 import ServerToSimulator
 from bonsai.proto.generator_simulator_api_pb2 import SimulatorToServer
+from bonsai.tracing import Tracer
 
 
 log = logging.getLogger(__name__)
@@ -61,6 +62,7 @@ class Driver(object):
     def __init__(self, **kwargs):
         self._state = DriverState.UNREGISTERED
         self._base_protocol = kwargs.pop('connection')
+        self.tracer = kwargs.pop('tracer', None) or Tracer()
 
     def next(self, message):
         # type: (ServerToSimulator) -> SimulatorToServer
@@ -79,6 +81,30 @@ class Driver(object):
         """
         raise NotImplementedError()
 
+    def _dispatch(self, message):
+        """
+        Passes message to the handler for the current state, tracing the
+        message and its reply. The recent messages are logged if the handler
+        raises.
+        """
+        tracer = self.tracer
+        tracer.received(message)
+        try:
+            reply = self._state_funcs[self._state](message)
+        except Exception:
+            tracer.dump()
+            raise
+        tracer.sent(reply)
+        return reply
+
+    def restart(self):
+        """
+        Returns the driver to its unregistered state, so that it registers
+        again over a new connection. The connections, and the simulator or
+        generator behind them, are kept.
+        """
+        self._state = DriverState.UNREGISTERED
+
     @property
     def state(self):
         """
@@ -293,7 +319,7 @@ class SimulatorDriverForTraining(Driver):
         return None
 
     def next(self, message):
-        return self._state_funcs[self._state](message)
+        return self._dispatch(message)
 
 
 class SimulatorDriverForPrediction(Driver):
@@ -389,7 +415,7 @@ class SimulatorDriverForPrediction(Driver):
         return reply
 
     def next(self, message):
-        return self._state_funcs[self._state](message)
+        return self._dispatch(message)
 
 
 class GeneratorDriverForTraining(Driver):
@@ -0,0 +1,377 @@
+"""
+A simulator that runs in another process, such as an external binary, and
+is driven over its stdin and stdout or over a Unix socket:
+
+    simulator = ExternalProcessSimulator(['./my_sim', '--fast'])
+    run_for_training_or_prediction('my_sim', simulator)
+
+The child is started once and kept running across episodes. Every message
+is a frame: a 4 byte big-endian length followed by that many bytes of UTF-8
+JSON. Calls that don't need a reply (set_properties, start, stop, reset and
+advance) are queued and sent in the next request, so each simulator step
+takes one exchange. A request is
+
+    {"calls": [["set_properties", {...}], ["reset"], ["advance", {...}]],
+     "rewards": ["reward_name"]}
+
+and the child makes the calls in order, then replies with the state after
+them and the rewards asked for:
+
+    {"state": {...}, "terminal": false, "rewards": {"reward_name": 1.0}}
+
+or {"error": "message"} when a call failed. A ["notify_state_fields",
+[names]] call names the fields of the BRAIN's output schema; once it has
+been made, the state holds only those fields. Luminance values are sent as
+{"__luminance__": [width, height, base64 of the pixels as 32 bit floats]}.
+Python simulators can be run in a child with serve(), or with
+
+    $ python -m bonsai.external_process my_sim:MySimulator [--socket PATH]
+"""
+import argparse
+import base64
+import json
+import logging
+import os
+import socket
+import struct
+import subprocess
+import sys
+import time
+import traceback
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+from bonsai.inkling_types import Luminance
+from bonsai.simulator import SimState, Simulator
+
+log = logging.getLogger(__name__)
+
+_HEADER = struct.Struct('>I')
+
+
+class ExternalSimulatorError(RuntimeError):
+    """Raised when the simulator process fails or exits."""
+    pass
+
+
+def write_frame(stream, payload):
+    """Writes bytes as one length-prefixed frame and flushes the stream."""
+    stream.write(_HEADER.pack(len(payload)) + payload)
+    stream.flush()
+
+
+def _read_exactly(stream, size):
+    data = b''
+    while len(data) < size:
+        chunk = stream.read(size - len(data))
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+
+def read_frame(stream):
+    """
+    Reads one length-prefixed frame.
+    :return: The frame's bytes, or None at the end of the stream.
+    """
+    header = _read_exactly(stream, _HEADER.size)
+    if not header:
+        return None
+    if len(header) < _HEADER.size:
+        raise EOFError('The stream ended in a frame header.')
+    size = _HEADER.unpack(header)[0]
+    payload = _read_exactly(stream, size)
+    if len(payload) < size:
+        raise EOFError('The stream ended in a frame.')
+    return payload
+
+
+def _encode_value(value):
+    if isinstance(value, Luminance):
+        return {'__luminance__': [
+            value.width, value.height,
+            base64.b64encode(value.pixels).decode('ascii')]}
+    if isinstance(value, Mapping):
+        # Such as the read-only actions of a memoizing connection.
+        return dict(value)
+    raise TypeError('{!r} is not JSON serializable'.format(value))
+
+
+def _decode_object(obj):
+    if '__luminance__' in obj and len(obj) == 1:
+        width, height, pixels = obj['__luminance__']
+        return Luminance(width, height, base64.b64decode(pixels))
+    return obj
+
+
+def encode(message):
+    return json.dumps(message, separators=(',', ':'),
+                      default=_encode_value).encode('utf-8')
+
+
+def decode(payload):
+    return json.loads(payload.decode('utf-8'), object_hook=_decode_object)
+
+
+class ExternalProcessSimulator(Simulator):
+    """
+    Forwards the Simulator interface to a simulator in a child process.
+    """
+
+    def __init__(self, command=None, **kwargs):
+        """
+        :param command: Command line starting the child, as a list of
+                        arguments. Optional when connecting to socket_path.
+        :param kwargs: Optional keyword arguments. Valid arguments include:
+            - socket_path = Path of a Unix socket to connect to instead of
+                            the child's stdin and stdout. Defaults to None.
+            - connect_timeout = Seconds to wait for the socket to accept
+                                connections. Defaults to 10.
+            - close_timeout = Seconds close() waits for the child to exit
+                              before killing it. Defaults to 5.
+            - env, cwd = Passed on to subprocess.Popen.
+        """
+        super(ExternalProcessSimulator, self).__init__()
+        self.command = command
+        self.socket_path = kwargs.pop('socket_path', None)
+        connect_timeout = kwargs.pop('connect_timeout', 10.0)
+        self.close_timeout = kwargs.pop('close_timeout', 5.0)
+        popen_kwargs = {name: kwargs.pop(name)
+                        for name in ('env', 'cwd') if name in kwargs}
+        if kwargs:
+            raise TypeError('Unexpected arguments {}'.format(
+                sorted(kwargs.keys())))
+        if command is None and self.socket_path is None:
+            raise ValueError('Either command or socket_path is required.')
+
+        # Number of request and reply exchanges with the child.
+        self.exchanges = 0
+        self._calls = []
+        self._state = None
+        self._rewards = {}
+        self._reward_names = set()
+        self._process = None
+        self._socket = None
+
+        if command is not None:
+            stdio = subprocess.PIPE if self.socket_path is None else None
+            self._process = subprocess.Popen(
+                command, stdin=stdio, stdout=stdio, **popen_kwargs)
+        if self.socket_path is None:
+            self._input = self._process.stdout
+            self._output = self._process.stdin
+        else:
+            self._socket = self._connect(connect_timeout)
+            self._input = self._output = self._socket.makefile('rwb')
+
+    def _connect(self, timeout):
+        deadline = time.time() + timeout
+        while True:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(self.socket_path)
+                return sock
+            except (OSError, socket.error):
+                sock.close()
+                if time.time() >= deadline or (
+                        self._process is not None and
+                        self._process.poll() is not None):
+                    raise ExternalSimulatorError(
+                        'Unable to connect to {}'.format(self.socket_path))
+                time.sleep(0.05)
+
+    def _exchange(self, reward_names):
+        request = {'calls': self._calls, 'rewards': sorted(reward_names)}
+        self._calls = []
+        try:
+            write_frame(self._output, encode(request))
+            payload = read_frame(self._input)
+        except (IOError, OSError, EOFError) as e:
+            raise ExternalSimulatorError(
+                'Lost the simulator process: {}'.format(e))
+        if payload is None:
+            code = self._process.poll() if self._process else None
+            raise ExternalSimulatorError(
+                'The simulator process exited (code {}).'.format(code))
+        self.exchanges += 1
+        try:
+            reply = decode(payload)
+        except ValueError as e:
+            # UnicodeDecodeError is a ValueError too.
+            raise ExternalSimulatorError(
+                'Unable to decode a reply from the simulator process: '
+                '{}'.format(e))
+        if 'error' in reply:
+            raise ExternalSimulatorError(reply['error'])
+        self._state = SimState(reply['state'], reply['terminal'])
+        self._rewards = reply.get('rewards', {})
+
+    def set_properties(self, **kwargs):
+        super(ExternalProcessSimulator, self).set_properties(**kwargs)
+        self._calls.append(['set_properties', kwargs])
+
+    def start(self):
+        self._calls.append(['start'])
+
+    def stop(self):
+        self._calls.append(['stop'])
+
+    def reset(self):
+        self._calls.append(['reset'])
+
+    def advance(self, actions):
+        self._calls.append(['advance', actions])
+
+    def notify_state_fields(self, fields):
+        self._calls.append(['notify_state_fields', sorted(fields)])
+
+    def get_state(self):
+        if self._calls or self._state is None:
+            self._exchange(self._reward_names)
+        return self._state
+
+    def reward_for(self, reward_name):
+        if self._calls or reward_name not in self._rewards:
+            self._exchange(self._reward_names | set([reward_name]))
+            # Asked for with every state from now on.
+            self._reward_names.add(reward_name)
+        return self._rewards[reward_name]
+
+    def close(self):
+        """
+        Closes the connection to the child, which should then exit, and
+        waits for it. Pending calls such as a final stop() are sent first.
+        """
+        if self._output is None:
+            return
+        try:
+            if self._calls:
+                self._exchange(())
+        except ExternalSimulatorError:
+            log.exception('Error flushing calls to the simulator process')
+        finally:
+            for stream in set([self._input, self._output]):
+                stream.close()
+            if self._socket is not None:
+                self._socket.close()
+            self._input = self._output = None
+            self._wait_for_child()
+
+    def _wait_for_child(self):
+        if self._process is None:
+            return
+        deadline = time.time() + self.close_timeout
+        while self._process.poll() is None:
+            if time.time() >= deadline:
+                log.warning('The simulator process did not exit; killing it.')
+                self._process.kill()
+                self._process.wait()
+                break
+            time.sleep(0.01)
+
+
+def serve(simulator, stream_in=None, stream_out=None):
+    """
+    Runs the child side of ExternalProcessSimulator for a Python simulator,
+    answering requests until the input ends.
+    :param simulator: The Simulator to drive.
+    :param stream_in: Binary stream to read requests from. Defaults to
+                      stdin.
+    :param stream_out: Binary stream to write replies to. Defaults to
+                       stdout.
+    """
+    if stream_in is None:
+        stream_in = getattr(sys.stdin, 'buffer', sys.stdin)
+    if stream_out is None:
+        stream_out = getattr(sys.stdout, 'buffer', sys.stdout)
+        # Keep the simulator's prints from corrupting the frames.
+        sys.stdout = sys.stderr
+
+    # The output schema's field names, once notify_state_fields names them.
+    fields = None
+    while True:
+        payload = read_frame(stream_in)
+        if payload is None:
+            return
+        request = decode(payload)
+        try:
+            for call in request['calls']:
+                method = call[0]
+                if method == 'set_properties':
+                    simulator.set_properties(**call[1])
+                elif method == 'advance':
+                    simulator.notify_prediction_received(call[1])
+                    simulator.advance(call[1])
+                elif method == 'notify_state_fields':
+                    fields = frozenset(call[1])
+                    simulator.notify_state_fields(fields)
+                elif method in ('start', 'stop', 'reset'):
+                    getattr(simulator, method)()
+                else:
+                    raise ValueError('Unknown call {}'.format(method))
+            state = simulator.get_state()
+            if fields is None:
+                values = dict(state.state)
+            else:
+                values = {name: state.state[name] for name in fields
+                          if name in state.state}
+            reply = {
+                'state': values,
+                'terminal': bool(state.is_terminal),
+                'rewards': {name: simulator.reward_for(name)
+                            for name in request['rewards']},
+            }
+        except Exception:
+            reply = {'error': traceback.format_exc()}
+        write_frame(stream_out, encode(reply))
+
+
+def serve_socket(simulator, path):
+    """
+    Runs serve() for the first connection to a Unix socket at path.
+    """
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        server.bind(path)
+        server.listen(1)
+        connection, _ = server.accept()
+        stream = connection.makefile('rwb')
+        try:
+            serve(simulator, stream, stream)
+        finally:
+            stream.close()
+            connection.close()
+    finally:
+        server.close()
+        if os.path.exists(path):
+            os.unlink(path)
+
+
+def main(argv=None):
+    from bonsai.fork_server import load_object
+
+    parser = argparse.ArgumentParser(
+        description="Run a Python simulator as the child of an "
+                    "ExternalProcessSimulator.")
+    parser.add_argument(
+        'factory',
+        help="'module:callable' returning the simulator to run.")
+    parser.add_argument('--socket',
+                        help="Serve a Unix socket at this path instead of "
+                             "stdin and stdout.")
+    args = parser.parse_args(argv)
+
+    # stdout carries the frames, so logs go to stderr.
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    simulator = load_object(args.factory)()
+    if args.socket:
+        serve_socket(simulator, args.socket)
+    else:
+        serve(simulator)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,253 @@
+"""
+A fork server for starting many simulator processes cheaply. The parent
+process pays once for importing the SDK and the selected event loop,
+building the protobuf message factory, resolving the command line and
+bonsai config, and running a user supplied warmup hook (typically importing
+the simulator's heavy dependencies). It then forks workers, which share the
+parent's memory copy-on-write and start in milliseconds. Each worker calls
+run_for_training_or_prediction with a simulator made by a factory.
+
+    $ python -m bonsai.fork_server my_sim:make_simulator --workers 8 \\
+          --warmup my_sim:warmup --train-brain my_brain
+
+The parent must not start threads or an event loop before forking, so the
+warmup hook should only import and build data, and the metrics exporters
+are not supported in workers. Requires os.fork, so it is not available on
+Windows.
+"""
+import argparse
+import gc
+import importlib
+import logging
+import os
+import random
+import signal
+import sys
+import time
+
+from bonsai import brain_server_connection
+from bonsai.common import message_builder
+
+log = logging.getLogger(__name__)
+
+
+def load_object(spec):
+    """
+    Loads an object from a 'package.module:attribute' string.
+    """
+    module_name, _, attribute = spec.partition(':')
+    if not attribute:
+        raise ValueError(
+            "Expected 'module:attribute', got '{}'".format(spec))
+    obj = importlib.import_module(module_name)
+    for name in attribute.split('.'):
+        obj = getattr(obj, name)
+    return obj
+
+
+def _exit_code(status):
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+class ForkServer(object):
+    """
+    Preloads the SDK in this process and forks simulator workers from it.
+    """
+
+    def __init__(self, name, simulator_factory, argv=None, **kwargs):
+        """
+        :param name: The name to assign to every worker's simulator.
+        :param simulator_factory: Callable taking the worker index and
+                                  returning the Simulator or Generator for
+                                  that worker. Called in the worker.
+        :param argv: Command line arguments, as accepted by
+                     parse_base_arguments. Defaults to sys.argv.
+        :param kwargs: Additional optional keyword arguments. Valid
+                       arguments include:
+                       - warmup = Callable run once in the parent before
+                                  any worker is forked. Defaults to None.
+                       - restart_delay = Seconds serve() waits before
+                                         replacing a worker that failed.
+                                         Defaults to 1.
+                       Any other arguments are passed on to
+                       run_for_training_or_prediction in every worker.
+        """
+        if not hasattr(os, 'fork'):
+            raise RuntimeError('The fork server requires os.fork.')
+        self.name = name
+        self.simulator_factory = simulator_factory
+        self.warmup = kwargs.pop('warmup', None)
+        self.restart_delay = kwargs.pop('restart_delay', 1.0)
+        self.run_kwargs = kwargs
+        self.workers = {}
+        self._argv = argv
+        self._worker_argv = None
+        self._recording_file = None
+        self._next_index = 0
+
+    def preload(self):
+        """
+        Does the work every worker would otherwise repeat. Called by the
+        first spawn() if not called before.
+        """
+        # Resolve the brain URL and access key once, so workers don't read
+        # the bonsai config.
+        base_arguments = brain_server_connection.parse_base_arguments(
+            self._argv)
+        self._worker_argv = ['--brain-url', base_arguments.brain_url,
+                             '--access-key', base_arguments.access_key]
+        self._recording_file = base_arguments.recording_file
+
+        brain_server_connection._get_event_loop_functions(
+            self.run_kwargs.get('event_loop', 'tornado'))
+        message_builder._get_message_factory()
+        if self.warmup is not None:
+            self.warmup()
+
+        # Move everything allocated so far out of the collector's reach, so
+        # collections in the workers don't touch (and copy) shared pages.
+        gc.collect()
+        if hasattr(gc, 'freeze'):
+            gc.freeze()
+
+    def spawn(self):
+        """
+        Forks a worker.
+        :return: The worker's process id.
+        """
+        if self._worker_argv is None:
+            self.preload()
+
+        index = self._next_index
+        self._next_index += 1
+        pid = os.fork()
+        if pid == 0:
+            self._run_worker(index)
+        self.workers[pid] = index
+        log.info('Started worker %d as process %d', index, pid)
+        return pid
+
+    def _run_worker(self, index):
+        code = 1
+        try:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            # Don't let every worker draw the same random numbers.
+            random.seed()
+
+            kwargs = dict(self.run_kwargs)
+            recording_file = kwargs.pop('recording_file', None) or \
+                self._recording_file
+            if recording_file:
+                kwargs['recording_file'] = '{}.{}'.format(
+                    recording_file, index)
+
+            brain_server_connection.run_for_training_or_prediction(
+                self.name, self.simulator_factory(index),
+                *self._worker_argv, **kwargs)
+            code = 0
+        except BaseException:
+            log.exception('Worker %d failed', index)
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(code)
+
+    def reap(self, block=True):
+        """
+        Collects workers that have exited.
+        :param block: Whether to wait for at least one worker to exit.
+        :return: List of (worker index, exit code) of the collected workers;
+                 a negative exit code is the signal that ended the worker.
+        """
+        exited = []
+        flags = 0 if block else os.WNOHANG
+        while self.workers:
+            try:
+                pid, status = os.waitpid(-1, flags)
+            except OSError:
+                break
+            if pid == 0:
+                break
+            index = self.workers.pop(pid, None)
+            if index is not None:
+                exited.append((index, _exit_code(status)))
+                log.info('Worker %d exited with %d', index, exited[-1][1])
+            flags = os.WNOHANG
+        return exited
+
+    def wait(self):
+        """
+        Waits for every worker to exit.
+        :return: Dictionary of worker index to exit code.
+        """
+        codes = {}
+        while self.workers:
+            codes.update(self.reap())
+        return codes
+
+    def stop(self, sig=signal.SIGTERM):
+        """
+        Signals every worker to stop, without waiting for them.
+        """
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, sig)
+            except OSError:
+                self.workers.pop(pid, None)
+
+    def serve(self, workers, restart=True):
+        """
+        Runs `workers` workers until they have all exited or serve() is
+        interrupted. When restart is set, a worker that fails (exits with a
+        non-zero code or is killed by a signal) is replaced; a worker that
+        finishes its run is not.
+        """
+        try:
+            for _ in range(workers):
+                self.spawn()
+            while self.workers:
+                for _, code in self.reap():
+                    if restart and code != 0:
+                        time.sleep(self.restart_delay)
+                        self.spawn()
+        except KeyboardInterrupt:
+            log.info('Stopping %d workers', len(self.workers))
+            self.stop()
+            self.wait()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Run simulators in workers forked from a preloaded "
+                    "parent process. Arguments not listed here are "
+                    "brain_server_connection options.")
+    parser.add_argument(
+        'factory',
+        help="'module:callable' returning the simulator for a worker index.")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Number of workers to keep running.")
+    parser.add_argument('--warmup',
+                        help="'module:callable' run once before forking.")
+    parser.add_argument('--name',
+                        help="Simulator name. Defaults to the factory name.")
+    parser.add_argument('--event-loop', default='tornado',
+                        help="Event loop the workers use.")
+    parser.add_argument('--no-restart', action='store_true',
+                        help="Don't replace workers that fail.")
+    args, remaining = parser.parse_known_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    factory = load_object(args.factory)
+    warmup = load_object(args.warmup) if args.warmup else None
+    name = args.name or args.factory.partition(':')[2]
+
+    server = ForkServer(name, factory, remaining, warmup=warmup,
+                        event_loop=args.event_loop)
+    server.serve(args.workers, restart=not args.no_restart)
+
+
+if __name__ == '__main__':
+    main()
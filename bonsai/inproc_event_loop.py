@@ -0,0 +1,158 @@
+"""
+An event loop that connects a driver to a scripted, in-process mock BRAIN
+through a pair of queues instead of a socket. Only serialized bytes cross the
+queues, so everything the SDK does per step (drivers, connections, state
+conversion and message building) is exercised while transport costs are
+left out. This makes it suitable for benchmarks and deterministic
+performance regression tests.
+"""
+from __future__ import print_function
+
+import logging
+
+from google.protobuf.text_format import MessageToString
+
+from tornado import gen
+from tornado.ioloop import IOLoop
+from tornado import queues
+
+from bonsai.proto.generator_simulator_api_pb2 import ServerToSimulator
+from bonsai.drivers import DriverState
+from bonsai import instrumentation
+from bonsai.mock_brain_server import MockBrainScript, MockBrainSession
+
+log = logging.getLogger(__name__)
+
+
+class _Runner(object):
+
+    def __init__(self, access_key, brain_api_url, driver, recording_file,
+                 script=None):
+        self.access_key = access_key
+        self.brain_api_url = brain_api_url
+        self.driver = driver
+        self.recording_file = recording_file
+        if self.recording_file:
+            self.recording_queue = queues.Queue()
+            instrumentation.watch_recording_queue(self.recording_queue)
+        self.session = MockBrainSession(
+            1, script or MockBrainScript(),
+            for_training=not brain_api_url.endswith('/predictions/ws'))
+        self._to_server = queues.Queue()
+        self._to_simulator = queues.Queue()
+        self._timers = instrumentation.transport_timers()
+        self._messages = instrumentation.MessageCounters()
+
+    @gen.coroutine
+    def record_to_file(self):
+        if not self.recording_file:
+            return
+
+        with open(self.recording_file, 'w') as out:
+            while True:
+                line = yield self.recording_queue.get()
+                if not line:
+                    break
+                print(line, file=out)
+
+    @gen.coroutine
+    def _record(self, send_or_recv, message):
+        yield self.recording_queue.put(send_or_recv)
+        if message:
+            yield self.recording_queue.put(
+                MessageToString(message, as_one_line=True))
+        else:
+            yield self.recording_queue.put('None')
+
+    @gen.coroutine
+    def _serve(self):
+        """
+        The scripted server side. Replies with None to signal that the
+        server closed the connection.
+        """
+        while True:
+            input_bytes = yield self._to_server.get()
+            if input_bytes is None:
+                break
+            output_bytes = self.session.handle(input_bytes)
+            delay = self.session.delay()
+            if delay:
+                yield gen.sleep(delay)
+            yield self._to_simulator.put(output_bytes)
+            if output_bytes is None:
+                break
+        self.session.close()
+
+    @gen.coroutine
+    def run(self):
+        log.info("About to connect in-process to %s", self.brain_api_url)
+        server = self._serve()
+        input_message = None
+
+        try:
+            while self.driver.state != DriverState.FINISHED:
+                if self.recording_file:
+                    yield self._record('RECV', input_message)
+
+                start = self._timers.driver_next.start()
+                output_message = self.driver.next(input_message)
+                self._timers.driver_next.stop(start)
+
+                if self.recording_file:
+                    yield self._record('SEND', output_message)
+
+                if self.driver.state == DriverState.FINISHED:
+                    break
+
+                if not output_message:
+                    raise RuntimeError(
+                        "Driver did not return a message to send.")
+
+                start = self._timers.serialize.start()
+                output_bytes = output_message.SerializeToString()
+                self._timers.serialize.stop(start)
+                self._messages.record('sent', output_message,
+                                      len(output_bytes))
+
+                start = self._timers.send.start()
+                yield self._to_server.put(output_bytes)
+                self._timers.send.stop(start)
+
+                start = self._timers.recv.start()
+                input_bytes = yield self._to_simulator.get()
+                self._timers.recv.stop(start)
+                if input_bytes is None:
+                    log.error("Connection to '%s' is closed",
+                              self.brain_api_url)
+                    break
+
+                start = self._timers.parse.start()
+                input_message = ServerToSimulator()
+                input_message.ParseFromString(input_bytes)
+                self._timers.parse.stop(start)
+                self._messages.record('received', input_message,
+                                      len(input_bytes))
+        finally:
+            yield self._to_server.put(None)
+            yield server
+            if self.recording_file:
+                yield self.recording_queue.put(None)
+
+        raise gen.Return(self.session)
+
+
+def run(access_key, brain_api_url, driver, recording_file, script=None):
+    run_sim, record = create_tasks(access_key,
+                                   brain_api_url,
+                                   driver,
+                                   recording_file,
+                                   script=script)
+    IOLoop.current().add_callback(record)
+    return IOLoop.current().run_sync(run_sim)
+
+
+def create_tasks(access_key, brain_api_url, driver, recording_file,
+                 script=None):
+    server = _Runner(access_key, brain_api_url, driver, recording_file,
+                     script=script)
+    return server.run, server.record_to_file
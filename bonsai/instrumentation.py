@@ -0,0 +1,409 @@
+"""
+This file contains opt-in instrumentation for breaking down where the time
+in a simulator step goes: the simulator itself, state encoding and decoding,
+protobuf serialization, or waiting on the network.
+
+Instrumentation is disabled by default, in which case every timer costs a
+single attribute check. Enable it with `enable()`, by setting the
+BONSAI_INSTRUMENTATION environment variable, or by passing
+`instrumentation_log_interval` to `bonsai.run_for_training_or_prediction()`.
+
+    import bonsai.instrumentation
+    bonsai.instrumentation.enable()
+    ...
+    print(bonsai.instrumentation.snapshot())
+"""
+import logging
+import os
+import threading
+from collections import OrderedDict, namedtuple
+from timeit import default_timer as _clock
+
+
+log = logging.getLogger(__name__)
+
+
+class Histogram(object):
+    """
+    An HDR-style histogram of durations. Values are recorded in nanoseconds
+    into log-linear buckets, which keeps the relative error of reported
+    percentiles under 2% with a small, sparse memory footprint.
+    """
+
+    # Each power of two is split into 2**(_SUB_BUCKET_BITS - 1) buckets.
+    _SUB_BUCKET_BITS = 7
+    _HALF_COUNT = 1 << (_SUB_BUCKET_BITS - 1)
+
+    def __init__(self, name, labels=()):
+        self.name = name
+        self.labels = labels
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._buckets = {}
+            self.count = 0
+            self.total = 0.0
+            self.min = None
+            self.max = None
+
+    @classmethod
+    def _bucket_index(cls, nanos):
+        shift = nanos.bit_length() - cls._SUB_BUCKET_BITS
+        if shift <= 0:
+            return nanos
+        return shift * cls._HALF_COUNT + (nanos >> shift)
+
+    @classmethod
+    def _bucket_upper_bound(cls, index):
+        if index < 2 * cls._HALF_COUNT:
+            return index
+        shift = index // cls._HALF_COUNT - 1
+        top = index - shift * cls._HALF_COUNT
+        return ((top + 1) << shift) - 1
+
+    def record(self, seconds):
+        """
+        Records a duration.
+        :param seconds: The duration, in seconds.
+        """
+        nanos = int(seconds * 1e9) if seconds > 0 else 0
+        index = self._bucket_index(nanos)
+        with self._lock:
+            self._buckets[index] = self._buckets.get(index, 0) + 1
+            self.count += 1
+            self.total += seconds
+            if self.min is None or seconds < self.min:
+                self.min = seconds
+            if self.max is None or seconds > self.max:
+                self.max = seconds
+
+    def percentile(self, percent):
+        """
+        Returns the duration in seconds below which `percent` percent of the
+        recorded durations fall, or 0.0 if nothing has been recorded.
+        """
+        with self._lock:
+            if not self.count:
+                return 0.0
+            target = max(1, int(round(self.count * percent / 100.0)))
+            seen = 0
+            for index in sorted(self._buckets):
+                seen += self._buckets[index]
+                if seen >= target:
+                    upper = self._bucket_upper_bound(index) / 1e9
+                    return min(upper, self.max)
+            return self.max
+
+    def snapshot(self):
+        """
+        Returns a dictionary summarizing the recorded durations, in seconds.
+        """
+        return {
+            'count': self.count,
+            'sum': self.total,
+            'min': self.min or 0.0,
+            'max': self.max or 0.0,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'p999': self.percentile(99.9),
+        }
+
+
+class Counter(object):
+    """A monotonically increasing count."""
+
+    def __init__(self, name, labels=()):
+        self.name = name
+        self.labels = labels
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def reset(self):
+        with self._lock:
+            self.value = 0
+
+    def snapshot(self):
+        return self.value
+
+
+class Gauge(object):
+    """A value read from a callback whenever the gauge is sampled."""
+
+    def __init__(self, name, labels=(), function=None):
+        self.name = name
+        self.labels = labels
+        self._function = function
+
+    def bind(self, function):
+        """Makes the gauge read from function from now on."""
+        self._function = function
+
+    @property
+    def value(self):
+        try:
+            return self._function()
+        except Exception:
+            log.debug('Gauge %s failed to sample', self.name, exc_info=True)
+            return None
+
+    def reset(self):
+        pass
+
+    def snapshot(self):
+        return self.value
+
+
+class Timer(object):
+    """
+    Times a block of code into a histogram. Timers are stateless, so one
+    timer may be shared by several threads or coroutines:
+
+        start = timer.start()
+        do_work()
+        timer.stop(start)
+
+    When instrumentation is disabled, start() returns None and stop() does
+    nothing.
+    """
+    __slots__ = ('_registry', 'histogram')
+
+    def __init__(self, registry, histogram):
+        self._registry = registry
+        self.histogram = histogram
+
+    def start(self):
+        if self._registry.enabled:
+            return _clock()
+        return None
+
+    def stop(self, start):
+        if start is not None:
+            self.histogram.record(_clock() - start)
+
+
+class Registry(object):
+    """
+    A collection of named metrics. Metrics are identified by a name and an
+    optional set of labels, e.g. counter('steps_total', sim_id=3).
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._metrics = OrderedDict()
+
+    def _get(self, metric_class, name, labels, **kwargs):
+        key = (name, tuple(sorted(labels.items())))
+        metric = self._metrics.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(key)
+                if metric is None:
+                    metric = metric_class(name, key[1], **kwargs)
+                    self._metrics[key] = metric
+        if not isinstance(metric, metric_class):
+            raise ValueError('Metric {} is a {}, not a {}'.format(
+                name, type(metric).__name__, metric_class.__name__))
+        return metric
+
+    def histogram(self, name, **labels):
+        return self._get(Histogram, name, labels)
+
+    def counter(self, name, **labels):
+        return self._get(Counter, name, labels)
+
+    def gauge(self, name, function, **labels):
+        # Registering a gauge again rebinds it, so it reports the latest
+        # source and doesn't keep the previous one alive.
+        gauge = self._get(Gauge, name, labels, function=function)
+        gauge.bind(function)
+        return gauge
+
+    def timer(self, name, **labels):
+        return Timer(self, self.histogram(name, **labels))
+
+    def metrics(self):
+        """Returns a list of all the metrics in this registry."""
+        with self._lock:
+            return list(self._metrics.values())
+
+    def reset(self):
+        """Clears the values of all the metrics in this registry."""
+        for metric in self.metrics():
+            metric.reset()
+
+    def snapshot(self):
+        """
+        Returns a dictionary mapping each metric's display name to its
+        current value; histograms are summarized with snapshot().
+        """
+        result = OrderedDict()
+        for metric in self.metrics():
+            result[display_name(metric)] = metric.snapshot()
+        return result
+
+    def summary_lines(self):
+        """Returns human readable lines summarizing every metric in use."""
+        lines = []
+        for metric in self.metrics():
+            if isinstance(metric, Histogram):
+                if not metric.count:
+                    continue
+                snap = metric.snapshot()
+                lines.append(
+                    '{}: count={} p50={:.1f}us p99={:.1f}us max={:.1f}us'
+                    .format(display_name(metric), snap['count'],
+                            snap['p50'] * 1e6, snap['p99'] * 1e6,
+                            snap['max'] * 1e6))
+            else:
+                value = metric.snapshot()
+                if value:
+                    lines.append('{}: {}'.format(display_name(metric), value))
+        return lines
+
+
+def display_name(metric):
+    """Returns name{label=value,...} for a metric."""
+    if not metric.labels:
+        return metric.name
+    return '{}{{{}}}'.format(
+        metric.name,
+        ','.join('{}={}'.format(k, v) for k, v in metric.labels))
+
+
+# The process wide registry used by the SDK.
+_registry = Registry()
+_periodic_log_stop = None
+
+
+def get_registry():
+    return _registry
+
+
+# Timers shared by the event loop runners.
+TransportTimers = namedtuple('TransportTimers', [
+    'driver_next',
+    'serialize',
+    'parse',
+    'send',
+    'recv'
+])
+
+
+class MessageCounters(object):
+    """
+    Counts the messages and bytes sent and received per MessageType.
+    """
+
+    def __init__(self, registry=None):
+        self._registry = registry or _registry
+        self._counters = {}
+
+    def record(self, direction, message, size):
+        """
+        :param direction: Either 'sent' or 'received'.
+        :param message: The SimulatorToServer or ServerToSimulator message.
+        :param size: Size of the serialized message in bytes.
+        """
+        if not self._registry.enabled or message is None:
+            return
+        key = (direction, type(message), message.message_type)
+        counters = self._counters.get(key)
+        if counters is None:
+            labels = {
+                'direction': direction,
+                'type': type(message).MessageType.Name(message.message_type)
+            }
+            counters = (self._registry.counter('messages_total', **labels),
+                        self._registry.counter('message_bytes_total',
+                                               **labels))
+            self._counters[key] = counters
+        counters[0].inc()
+        counters[1].inc(size)
+
+
+def watch_recording_queue(queue):
+    """
+    Publishes the number of messages waiting to be written to the recording
+    file as the recording_queue_depth gauge, replacing any queue watched
+    before.
+    """
+    _registry.gauge('recording_queue_depth', queue.qsize)
+
+
+def transport_timers():
+    """
+    Returns the timers used by the event loops around Driver.next(),
+    protobuf serialization and parsing, and the websocket send and receive.
+    """
+    return TransportTimers(
+        driver_next=_registry.timer('driver_next_seconds'),
+        serialize=_registry.timer('message_serialize_seconds'),
+        parse=_registry.timer('message_parse_seconds'),
+        send=_registry.timer('transport_send_seconds'),
+        recv=_registry.timer('transport_recv_seconds'))
+
+
+def enable():
+    """Turns on collection of timings and counts."""
+    _registry.enabled = True
+
+
+def disable():
+    """Turns off collection; values already collected are kept."""
+    _registry.enabled = False
+
+
+def is_enabled():
+    return _registry.enabled
+
+
+def snapshot():
+    """Returns a snapshot of every metric in the process wide registry."""
+    return _registry.snapshot()
+
+
+def log_summary(logger=None):
+    """Logs a summary of every metric in use at INFO level."""
+    logger = logger or log
+    for line in _registry.summary_lines():
+        logger.info('%s', line)
+
+
+def start_periodic_log(interval=60.0, logger=None):
+    """
+    Enables instrumentation and starts a daemon thread that logs a summary
+    every `interval` seconds. Calling this again replaces the previous
+    thread.
+    """
+    global _periodic_log_stop
+    stop_periodic_log()
+    enable()
+    stop = threading.Event()
+
+    def loop():
+        while not stop.wait(interval):
+            log_summary(logger)
+
+    thread = threading.Thread(target=loop, name='bonsai-instrumentation')
+    thread.daemon = True
+    thread.start()
+    _periodic_log_stop = stop
+
+
+def stop_periodic_log():
+    global _periodic_log_stop
+    if _periodic_log_stop is not None:
+        _periodic_log_stop.set()
+        _periodic_log_stop = None
+
+
+if os.environ.get('BONSAI_INSTRUMENTATION'):
+    enable()
@@ -0,0 +1,105 @@
+"""
+The queue used by logging_basic_config(non_blocking=True): log calls put
+records on a bounded queue, and a listener thread writes them out.
+"""
+import copy
+import logging
+from logging.handlers import QueueHandler, QueueListener
+
+from six.moves import queue
+
+
+# What BoundedQueueHandler does with a record when its queue is full.
+DROP_NEW = 'drop_new'
+DROP_OLD = 'drop_old'
+BLOCK = 'block'
+OVERFLOW_POLICIES = (DROP_NEW, DROP_OLD, BLOCK)
+
+
+class BoundedQueueHandler(QueueHandler):
+    """
+    Puts records on a bounded queue, applying an overflow policy when the
+    queue is full:
+    - 'drop_new' drops the record being logged,
+    - 'drop_old' drops the oldest queued record to make room,
+    - 'block' waits for room.
+    Dropped records are counted in `dropped`, and reported with a warning
+    once the queue has room again.
+    """
+
+    def __init__(self, queue_size=10000, overflow=DROP_NEW):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError('overflow must be one of {}, got {}'.format(
+                ', '.join(OVERFLOW_POLICIES), overflow))
+        super(BoundedQueueHandler, self).__init__(queue.Queue(queue_size))
+        self.overflow = overflow
+        self.dropped = 0
+        self._unreported = 0
+
+    def prepare(self, record):
+        # QueueHandler.prepare formats the record and clears exc_info, which
+        # loses the traceback for formatters such as JsonFormatter. Keep it
+        # as exc_text instead, and leave the formatting to the listener.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(
+                    record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        if self.overflow == BLOCK:
+            self.queue.put(record)
+            return
+        if self._unreported:
+            self._report_dropped()
+        try:
+            self.queue.put_nowait(record)
+            return
+        except queue.Full:
+            pass
+        if self.overflow == DROP_OLD:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                pass
+            self._count_dropped()
+            try:
+                self.queue.put_nowait(record)
+                return
+            except queue.Full:
+                pass
+        self._count_dropped()
+
+    def _count_dropped(self):
+        self.dropped += 1
+        self._unreported += 1
+
+    def _report_dropped(self):
+        warning = logging.LogRecord(
+            __name__, logging.WARNING, __file__, 0,
+            'Dropped %d log records; the logging queue was full.',
+            (self._unreported,), None)
+        try:
+            self.queue.put_nowait(warning)
+        except queue.Full:
+            return
+        self._unreported = 0
+
+
+class LogListener(QueueListener):
+    """
+    A QueueListener that waits for room in a full queue when stopping,
+    rather than failing to enqueue its sentinel.
+    """
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+    def stop(self):
+        # Stopping twice, e.g. explicitly and at exit, is harmless.
+        if self._thread is not None:
+            super(LogListener, self).stop()
@@ -0,0 +1,211 @@
+"""
+This file contains exporters that publish the metrics collected by
+bonsai.instrumentation in the Prometheus text exposition format, either
+from a small HTTP server or by periodically writing a file for the
+node_exporter textfile collector.
+
+Both exporters enable instrumentation when started. They run on daemon
+threads and only do work when scraped or when writing the file, so the
+per-step cost is just that of the instrumentation itself.
+"""
+import logging
+import os
+import threading
+from collections import deque
+from timeit import default_timer as _clock
+
+from six.moves.BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+from bonsai import instrumentation
+from bonsai.instrumentation import Counter, Gauge, Histogram
+
+
+log = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_PREFIX = 'bonsai_'
+_QUANTILES = ((0.5, 50), (0.9, 90), (0.99, 99), (0.999, 99.9))
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('\n', r'\n') \
+        .replace('"', r'\"')
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{{{}}}'.format(','.join(
+        '{}="{}"'.format(key, _escape(value)) for key, value in pairs))
+
+
+def _format_value(value):
+    if value is None:
+        return 'NaN'
+    return repr(float(value))
+
+
+class PrometheusRenderer(object):
+    """
+    Renders a registry in the Prometheus text format. Besides the metrics
+    in the registry, the renderer derives a steps_per_second gauge from the
+    steps_total counters, averaged over the last `rate_window` seconds (or
+    since the first render, until that long has passed), so that how often
+    it is scraped doesn't change the rate.
+    """
+
+    def __init__(self, registry=None, rate_window=60.0):
+        self._registry = registry or instrumentation.get_registry()
+        self.rate_window = rate_window
+        self._lock = threading.Lock()
+        # (time, steps) samples of each steps_total counter, by labels.
+        self._step_samples = {}
+
+    def render(self):
+        families = {}
+        for metric in self._registry.metrics():
+            families.setdefault(metric.name, []).append(metric)
+
+        lines = []
+        for name in sorted(families):
+            metrics = families[name]
+            full_name = _PREFIX + name
+            if isinstance(metrics[0], Histogram):
+                self._render_histograms(full_name, metrics, lines)
+            elif isinstance(metrics[0], Counter):
+                lines.append('# TYPE {} counter'.format(full_name))
+                for metric in metrics:
+                    lines.append('{}{} {}'.format(
+                        full_name, _format_labels(metric.labels),
+                        _format_value(metric.value)))
+            elif isinstance(metrics[0], Gauge):
+                lines.append('# TYPE {} gauge'.format(full_name))
+                for metric in metrics:
+                    lines.append('{}{} {}'.format(
+                        full_name, _format_labels(metric.labels),
+                        _format_value(metric.value)))
+
+        self._render_step_rates(families.get('steps_total', []), lines)
+        lines.append('')
+        return '\n'.join(lines)
+
+    def _render_histograms(self, full_name, metrics, lines):
+        lines.append('# TYPE {} summary'.format(full_name))
+        for metric in metrics:
+            snapshot = metric.snapshot()
+            for quantile, percent in _QUANTILES:
+                lines.append('{}{} {}'.format(
+                    full_name,
+                    _format_labels(metric.labels,
+                                   [('quantile', str(quantile))]),
+                    _format_value(metric.percentile(percent))))
+            labels = _format_labels(metric.labels)
+            lines.append('{}_sum{} {}'.format(
+                full_name, labels, _format_value(snapshot['sum'])))
+            lines.append('{}_count{} {}'.format(
+                full_name, labels, _format_value(snapshot['count'])))
+        lines.append('# TYPE {}_max gauge'.format(full_name))
+        for metric in metrics:
+            lines.append('{}_max{} {}'.format(
+                full_name, _format_labels(metric.labels),
+                _format_value(metric.snapshot()['max'])))
+
+    def _render_step_rates(self, counters, lines):
+        if not counters:
+            return
+        now = _clock()
+        full_name = _PREFIX + 'steps_per_second'
+        lines.append('# TYPE {} gauge'.format(full_name))
+        with self._lock:
+            for counter in counters:
+                rate = self._step_rate(counter.labels, now, counter.value)
+                lines.append('{}{} {}'.format(
+                    full_name, _format_labels(counter.labels),
+                    _format_value(rate)))
+
+    def _step_rate(self, labels, now, steps):
+        samples = self._step_samples.setdefault(labels, deque())
+        samples.append((now, steps))
+        # Keep the newest sample taken at least a window ago as the start.
+        window_start = now - self.rate_window
+        while len(samples) > 2 and samples[1][0] <= window_start:
+            samples.popleft()
+        start_time, start_steps = samples[0]
+        if now <= start_time:
+            return 0.0
+        return max(0.0, (steps - start_steps) / (now - start_time))
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    renderer = None
+
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = self.renderer.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        log.debug('metrics: ' + format, *args)
+
+
+def start_http_server(port, address='', registry=None):
+    """
+    Enables instrumentation and serves the metrics at /metrics on a daemon
+    thread.
+    :param port: Port to listen on; zero picks a free port.
+    :param address: Address to bind to. Defaults to all interfaces.
+    :return: The HTTPServer; its server_port attribute holds the bound port
+             and shutdown() stops it.
+    """
+    instrumentation.enable()
+    handler = type('MetricsHandler', (_MetricsHandler, object), {
+        'renderer': PrometheusRenderer(registry)})
+    server = HTTPServer((address, port), handler)
+    thread = threading.Thread(target=server.serve_forever,
+                              name='bonsai-metrics-http')
+    thread.daemon = True
+    thread.start()
+    log.info('Serving metrics on port %d', server.server_port)
+    return server
+
+
+def write_textfile(path, renderer):
+    """
+    Atomically writes the rendered metrics to path, so the textfile
+    collector never reads a partially written file.
+    """
+    temp_path = '{}.{}.tmp'.format(path, os.getpid())
+    with open(temp_path, 'w') as out:
+        out.write(renderer.render())
+    os.rename(temp_path, path)
+
+
+def start_textfile_exporter(path, interval=15.0, registry=None):
+    """
+    Enables instrumentation and rewrites the metrics file at path every
+    `interval` seconds from a daemon thread.
+    :return: A threading.Event; set it to stop the exporter.
+    """
+    instrumentation.enable()
+    renderer = PrometheusRenderer(registry)
+    stop = threading.Event()
+
+    def loop():
+        while not stop.wait(interval):
+            try:
+                write_textfile(path, renderer)
+            except (IOError, OSError) as e:
+                log.warning('Unable to write metrics to %s: %s', path, e)
+
+    thread = threading.Thread(target=loop, name='bonsai-metrics-textfile')
+    thread.daemon = True
+    thread.start()
+    return stop
@@ -0,0 +1,594 @@
+"""
+A scriptable, local stand-in for the BRAIN backend. It speaks the same
+ServerToSimulator/SimulatorToServer protocol as the hosted service so that
+simulators built on this SDK can be load and latency tested on one machine.
+
+Run it from the command line with:
+
+    $ python -m bonsai.mock_brain_server --port 8888 --episodes 0
+
+and point simulators at ws://127.0.0.1:8888/v1/<user>/<brain>/sims/ws.
+"""
+import argparse
+import logging
+import random
+import time
+
+from google.protobuf.descriptor_pb2 import DescriptorProto
+from google.protobuf.descriptor_pb2 import FieldDescriptorProto
+
+from tornado import gen
+from tornado import websocket
+from tornado.httpserver import HTTPServer
+from tornado.ioloop import IOLoop, PeriodicCallback
+from tornado.netutil import bind_sockets
+from tornado.web import Application
+
+from bonsai.proto.generator_simulator_api_pb2 import ServerToSimulator
+from bonsai.proto.generator_simulator_api_pb2 import SimulatorToServer
+from bonsai.common.message_builder import reconstitute
+
+log = logging.getLogger(__name__)
+
+_LUMINANCE_TYPE_NAME = 'bonsai.inkling_types.proto.Luminance'
+
+# Mapping of the short type names accepted by make_schema() and the command
+# line to protobuf field types.
+_FIELD_TYPES = {
+    'int32': FieldDescriptorProto.TYPE_INT32,
+    'int64': FieldDescriptorProto.TYPE_INT64,
+    'uint32': FieldDescriptorProto.TYPE_UINT32,
+    'uint64': FieldDescriptorProto.TYPE_UINT64,
+    'float': FieldDescriptorProto.TYPE_FLOAT,
+    'double': FieldDescriptorProto.TYPE_DOUBLE,
+    'bool': FieldDescriptorProto.TYPE_BOOL,
+    'string': FieldDescriptorProto.TYPE_STRING,
+    'luminance': FieldDescriptorProto.TYPE_MESSAGE,
+}
+
+
+class MockBrainError(RuntimeError):
+    """Raised when a simulator sends something the mock BRAIN can't handle."""
+    pass
+
+
+def make_schema(name, fields):
+    """
+    Builds a DescriptorProto suitable for use as a properties, output or
+    prediction schema.
+    :param name: Name of the schema message.
+    :param fields: Iterable of (field_name, type_name) pairs, where type_name
+                   is one of the keys of _FIELD_TYPES.
+    :return: The schema.
+    :rtype: DescriptorProto
+    """
+    schema = DescriptorProto()
+    schema.name = name
+    for number, (field_name, type_name) in enumerate(fields, 1):
+        try:
+            field_type = _FIELD_TYPES[type_name]
+        except KeyError:
+            raise ValueError(
+                'Unknown type {} for field {}; expected one of {}'.format(
+                    type_name, field_name, sorted(_FIELD_TYPES.keys())))
+        field = schema.field.add()
+        field.name = field_name
+        field.number = number
+        field.label = FieldDescriptorProto.LABEL_OPTIONAL
+        field.type = field_type
+        if field_type == FieldDescriptorProto.TYPE_MESSAGE:
+            field.type_name = _LUMINANCE_TYPE_NAME
+    return schema
+
+
+def parse_schema_argument(name, text):
+    """
+    Parses a schema given on the command line as "field:type,field:type".
+    """
+    fields = []
+    for item in text.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        field_name, _, type_name = item.partition(':')
+        fields.append((field_name.strip(), type_name.strip() or 'float'))
+    return make_schema(name, fields)
+
+
+class MockBrainScript(object):
+    """
+    Describes what the mock BRAIN does with every simulator that connects to
+    it: the schemas it acknowledges registration with, the properties it
+    sends, how long episodes last and how much latency to inject.
+    """
+
+    def __init__(self, **kwargs):
+        """
+        :param kwargs: Optional keyword arguments. Valid arguments include:
+            - properties_schema, output_schema, prediction_schema =
+                DescriptorProtos sent in the registration acknowledgement.
+                Default to a single int32 property, a single float state
+                field and a single int32 action.
+            - properties = Dictionary of property values sent with every
+                           SET_PROPERTIES message. Defaults to {}.
+            - reward_name = Reward function name sent with SET_PROPERTIES.
+            - episodes = Number of episodes to run before sending FINISHED.
+                         Zero means run forever. Defaults to 1.
+            - steps_per_episode = Number of simulator steps after which an
+                                  episode is stopped, even if the simulator
+                                  never reports a terminal state.
+            - predictions_per_message = Number of prediction_data entries in
+                                        each PREDICTION message.
+            - latency = Seconds to wait before sending every reply.
+            - jitter = Maximum seconds randomly added to or removed from
+                       latency.
+            - seed = Seed for the random predictions and jitter.
+            - prediction_factory = Callable taking (prediction_class, rng)
+                                   and returning a dictionary of action
+                                   values. Defaults to random values.
+            - disconnect_after = Number of messages after which the server
+                                 drops a connection, to exercise
+                                 reconnecting. Defaults to None.
+            - disconnects = Number of connections the server drops after
+                            disconnect_after messages. Defaults to 1.
+        """
+        self.properties_schema = kwargs.pop(
+            'properties_schema',
+            make_schema('MockProperties', [('episode_length', 'int32')]))
+        self.output_schema = kwargs.pop(
+            'output_schema', make_schema('MockState', [('value', 'float')]))
+        self.prediction_schema = kwargs.pop(
+            'prediction_schema',
+            make_schema('MockAction', [('command', 'int32')]))
+        self.properties = kwargs.pop('properties', {})
+        self.reward_name = kwargs.pop('reward_name', 'mock_reward')
+        self.episodes = kwargs.pop('episodes', 1)
+        self.steps_per_episode = kwargs.pop('steps_per_episode', 100)
+        self.predictions_per_message = kwargs.pop(
+            'predictions_per_message', 1)
+        self.latency = kwargs.pop('latency', 0.0)
+        self.jitter = kwargs.pop('jitter', 0.0)
+        self.seed = kwargs.pop('seed', None)
+        self.prediction_factory = kwargs.pop(
+            'prediction_factory', random_prediction)
+        self.disconnect_after = kwargs.pop('disconnect_after', None)
+        self.disconnects = kwargs.pop('disconnects', 1)
+        if kwargs:
+            raise TypeError('Unexpected arguments {}'.format(
+                sorted(kwargs.keys())))
+
+
+def random_prediction(prediction_class, rng):
+    """
+    Default prediction factory; produces a random value for every numeric or
+    boolean field of the prediction schema.
+    """
+    prediction = {}
+    for field in prediction_class.DESCRIPTOR.fields:
+        if field.type in (field.TYPE_FLOAT, field.TYPE_DOUBLE):
+            prediction[field.name] = rng.random()
+        elif field.type == field.TYPE_BOOL:
+            prediction[field.name] = rng.random() < 0.5
+        elif field.type != field.TYPE_MESSAGE and \
+                field.type != field.TYPE_STRING:
+            prediction[field.name] = rng.randint(0, 1)
+    return prediction
+
+
+def _encode_fields(message_class, values):
+    message = message_class()
+    for name, value in values.items():
+        setattr(message, name, value)
+    return message.SerializeToString()
+
+
+class _SessionState(object):
+    AWAITING_REGISTER = 0
+    AWAITING_READY_FOR_PROPERTIES = 10
+    AWAITING_READY_FOR_RESET = 20
+    AWAITING_READY_FOR_START = 30
+    AWAITING_STATE = 40
+    AWAITING_READY_AFTER_STOP = 50
+    FINISHED = 60
+
+
+class MockBrainSession(object):
+    """
+    The server side of a single simulator connection. A session only deals in
+    serialized bytes, so the same script can be driven over a websocket or
+    directly in-process.
+    """
+
+    def __init__(self, sim_id, script, for_training=True):
+        self.sim_id = sim_id
+        self.for_training = for_training
+        self._script = script
+        self._rng = random.Random(
+            script.seed + sim_id if script.seed is not None else None)
+        self._properties_class = reconstitute(script.properties_schema)
+        self._prediction_class = reconstitute(script.prediction_schema)
+        self._state = _SessionState.AWAITING_REGISTER
+        self._episode_steps = 0
+
+        # Statistics for this connection.
+        self.simulator_name = None
+        self.steps = 0
+        self.episodes = 0
+        self.messages_received = 0
+        self.messages_sent = 0
+        self.bytes_received = 0
+        self.bytes_sent = 0
+        self.connected_at = time.time()
+        self.first_step_at = None
+        self.last_step_at = None
+        self.closed_at = None
+
+    @property
+    def finished(self):
+        return self._state == _SessionState.FINISHED
+
+    def delay(self):
+        """
+        Returns the number of seconds to wait before sending the next reply.
+        """
+        delay = self._script.latency
+        if self._script.jitter:
+            delay += self._rng.uniform(-self._script.jitter,
+                                       self._script.jitter)
+        return max(0.0, delay)
+
+    def steps_per_second(self):
+        if not self.first_step_at or self.last_step_at <= self.first_step_at:
+            return 0.0
+        return self.steps / (self.last_step_at - self.first_step_at)
+
+    def close(self):
+        if self.closed_at is None:
+            self.closed_at = time.time()
+
+    def summary(self):
+        return {
+            'sim_id': self.sim_id,
+            'simulator_name': self.simulator_name,
+            'steps': self.steps,
+            'episodes': self.episodes,
+            'steps_per_second': self.steps_per_second(),
+            'messages_received': self.messages_received,
+            'messages_sent': self.messages_sent,
+            'bytes_received': self.bytes_received,
+            'bytes_sent': self.bytes_sent,
+            'connected': self.closed_at is None,
+        }
+
+    def handle(self, input_bytes):
+        """
+        Processes a serialized SimulatorToServer message.
+        :param input_bytes: The serialized message from the simulator.
+        :return: The serialized ServerToSimulator reply, or None when the
+                 connection should be closed.
+        """
+        self.messages_received += 1
+        self.bytes_received += len(input_bytes)
+        message = SimulatorToServer()
+        message.ParseFromString(input_bytes)
+
+        reply = self._next(message)
+        if reply is None:
+            return None
+
+        reply.sim_id = self.sim_id
+        output_bytes = reply.SerializeToString()
+        self.messages_sent += 1
+        self.bytes_sent += len(output_bytes)
+        return output_bytes
+
+    def _expect(self, message, message_type):
+        if message.message_type != message_type:
+            raise MockBrainError(
+                'Simulator {} sent {} while the mock BRAIN expected {}'.format(
+                    self.sim_id,
+                    SimulatorToServer.MessageType.Name(message.message_type),
+                    SimulatorToServer.MessageType.Name(message_type)))
+
+    def _next(self, message):
+        state = self._state
+        if state == _SessionState.AWAITING_REGISTER:
+            self._expect(message, SimulatorToServer.REGISTER)
+            self.simulator_name = message.register_data.simulator_name
+            return self._acknowledge_register()
+
+        if state == _SessionState.AWAITING_STATE:
+            self._expect(message, SimulatorToServer.STATE)
+            return self._handle_state(message)
+
+        if not self.for_training:
+            raise MockBrainError(
+                'Unexpected message from prediction simulator {}'.format(
+                    self.sim_id))
+
+        self._expect(message, SimulatorToServer.READY)
+        if state == _SessionState.AWAITING_READY_FOR_PROPERTIES:
+            return self._set_properties()
+        elif state == _SessionState.AWAITING_READY_FOR_RESET:
+            self._state = _SessionState.AWAITING_READY_FOR_START
+            return self._command(ServerToSimulator.RESET)
+        elif state == _SessionState.AWAITING_READY_FOR_START:
+            self._state = _SessionState.AWAITING_STATE
+            self._episode_steps = 0
+            self.episodes += 1
+            return self._command(ServerToSimulator.START)
+        elif state == _SessionState.AWAITING_READY_AFTER_STOP:
+            if self._script.episodes and \
+                    self.episodes >= self._script.episodes:
+                self._state = _SessionState.FINISHED
+                return self._command(ServerToSimulator.FINISHED)
+            return self._set_properties()
+
+        raise MockBrainError('Session {} is already finished'.format(
+            self.sim_id))
+
+    def _acknowledge_register(self):
+        reply = ServerToSimulator()
+        reply.message_type = ServerToSimulator.ACKNOWLEDGE_REGISTER
+        data = reply.acknowledge_register_data
+        data.properties_schema.CopyFrom(self._script.properties_schema)
+        data.output_schema.CopyFrom(self._script.output_schema)
+        data.prediction_schema.CopyFrom(self._script.prediction_schema)
+        data.sim_id = self.sim_id
+        if self.for_training:
+            self._state = _SessionState.AWAITING_READY_FOR_PROPERTIES
+        else:
+            # Predicting simulators answer the acknowledgement with their
+            # initial state.
+            self._state = _SessionState.AWAITING_STATE
+            self.episodes += 1
+        return reply
+
+    def _set_properties(self):
+        reply = ServerToSimulator()
+        reply.message_type = ServerToSimulator.SET_PROPERTIES
+        data = reply.set_properties_data
+        data.dynamic_properties = _encode_fields(self._properties_class,
+                                                 self._script.properties)
+        data.reward_name = self._script.reward_name
+        data.prediction_schema.CopyFrom(self._script.prediction_schema)
+        self._state = _SessionState.AWAITING_READY_FOR_RESET
+        return reply
+
+    def _command(self, message_type):
+        reply = ServerToSimulator()
+        reply.message_type = message_type
+        return reply
+
+    def _handle_state(self, message):
+        now = time.time()
+        if self.first_step_at is None:
+            self.first_step_at = now
+        self.last_step_at = now
+
+        terminal = False
+        for state_data in message.state_data:
+            terminal = terminal or state_data.terminal
+
+        # The first STATE of an episode answers START; every other one is
+        # one step per prediction sent.
+        if self._episode_steps or not self.for_training:
+            self.steps += len(message.state_data)
+        self._episode_steps += len(message.state_data)
+
+        limit = self._script.steps_per_episode
+        episode_over = terminal or (limit and self._episode_steps > limit)
+
+        if self.for_training and episode_over:
+            self._state = _SessionState.AWAITING_READY_AFTER_STOP
+            return self._command(ServerToSimulator.STOP)
+
+        if not self.for_training and episode_over:
+            if self._script.episodes and \
+                    self.episodes >= self._script.episodes:
+                self._state = _SessionState.FINISHED
+                return None
+            self.episodes += 1
+            self._episode_steps = 0
+
+        reply = self._command(ServerToSimulator.PREDICTION)
+        for _ in range(self._script.predictions_per_message):
+            values = self._script.prediction_factory(self._prediction_class,
+                                                     self._rng)
+            prediction = reply.prediction_data.add()
+            prediction.dynamic_prediction = _encode_fields(
+                self._prediction_class, values)
+        return reply
+
+
+class MockBrainServer(object):
+    """
+    A tornado based websocket server that runs a MockBrainSession for every
+    simulator that connects. Any URL path is accepted; paths ending in
+    "/predictions/ws" are treated as prediction connections and everything
+    else as training connections.
+    """
+
+    def __init__(self, script=None, access_key=None):
+        self.script = script or MockBrainScript()
+        self.access_key = access_key
+        self.sessions = []
+        self.dropped_connections = 0
+        self._next_sim_id = 1
+        self._http_server = None
+        self._summary_callback = None
+
+    def open_session(self, path):
+        sim_id = self._next_sim_id
+        self._next_sim_id += 1
+        session = MockBrainSession(
+            sim_id, self.script,
+            for_training=not path.rstrip('/').endswith('/predictions/ws'))
+        self.sessions.append(session)
+        log.debug('Opened session %s for %s', sim_id, path)
+        return session
+
+    def should_drop(self, session):
+        """
+        Whether to drop the connection of session, as set by the script's
+        disconnect_after and disconnects.
+        """
+        script = self.script
+        if script.disconnect_after is None or \
+                session.messages_received < script.disconnect_after or \
+                self.dropped_connections >= script.disconnects:
+            return False
+        self.dropped_connections += 1
+        return True
+
+    def listen(self, port=0, address='127.0.0.1'):
+        """
+        Starts listening on the current IOLoop.
+        :param port: Port to listen on. Zero picks a free port.
+        :return: The port actually being listened on.
+        """
+        app = Application([
+            (r'/.*', _SimulatorSocketHandler, {'server': self}),
+        ])
+        sockets = bind_sockets(port, address=address)
+        self._http_server = HTTPServer(app)
+        self._http_server.add_sockets(sockets)
+        return sockets[0].getsockname()[1]
+
+    def stop(self):
+        if self._summary_callback:
+            self._summary_callback.stop()
+            self._summary_callback = None
+        if self._http_server:
+            self._http_server.stop()
+            self._http_server = None
+
+    def summary(self):
+        """
+        Returns a list of per-connection statistics dictionaries.
+        """
+        return [session.summary() for session in self.sessions]
+
+    def log_summary(self):
+        active = [s for s in self.sessions if s.closed_at is None]
+        total_rate = sum(s.steps_per_second() for s in active)
+        log.info('%d connected simulators, %d total, %.1f steps/sec',
+                 len(active), len(self.sessions), total_rate)
+        for session in active:
+            log.info('  sim %s (%s): %d steps, %d episodes, %.1f steps/sec',
+                     session.sim_id, session.simulator_name, session.steps,
+                     session.episodes, session.steps_per_second())
+
+    def start_periodic_summary(self, interval):
+        self._summary_callback = PeriodicCallback(self.log_summary,
+                                                  interval * 1000)
+        self._summary_callback.start()
+
+
+class _SimulatorSocketHandler(websocket.WebSocketHandler):
+    def initialize(self, server):
+        self._server = server
+        self._session = None
+
+    def open(self, *args):
+        key = self._server.access_key
+        if key and self.request.headers.get('Authorization') != key:
+            log.warning('Rejecting connection with a bad access key')
+            self.close(code=4001, reason='Unauthorized')
+            return
+        self._session = self._server.open_session(self.request.path)
+
+    @gen.coroutine
+    def on_message(self, message):
+        if self._session is None:
+            return
+        try:
+            reply = self._session.handle(message)
+        except MockBrainError as e:
+            log.error('%s', e)
+            self.close(code=1011, reason=str(e))
+            return
+
+        delay = self._session.delay()
+        if delay:
+            yield gen.sleep(delay)
+
+        if reply is None:
+            self.close()
+            return
+        if self._server.should_drop(self._session):
+            log.info('Dropping the connection of session %s',
+                     self._session.sim_id)
+            self.close(code=1001, reason='Mock disconnect')
+            return
+        try:
+            yield self.write_message(reply, binary=True)
+        except websocket.WebSocketClosedError:
+            pass
+
+    def on_close(self):
+        if self._session:
+            self._session.close()
+
+
+def _parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Runs a local mock BRAIN websocket server for load and '
+                    'latency testing simulators.')
+    parser.add_argument('--port', type=int, default=8888)
+    parser.add_argument('--address', default='127.0.0.1')
+    parser.add_argument('--access-key', default=None,
+                        help='If set, simulators must present this key.')
+    parser.add_argument('--episodes', type=int, default=0,
+                        help='Episodes per simulator; 0 runs forever.')
+    parser.add_argument('--steps-per-episode', type=int, default=100)
+    parser.add_argument('--predictions-per-message', type=int, default=1)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='Seconds of latency added to every reply.')
+    parser.add_argument('--jitter', type=float, default=0.0,
+                        help='Maximum seconds of random jitter.')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--properties', default='episode_length:int32',
+                        help='Properties schema as "name:type,...".')
+    parser.add_argument('--output', default='value:float',
+                        help='State schema as "name:type,...".')
+    parser.add_argument('--prediction', default='command:int32',
+                        help='Action schema as "name:type,...".')
+    parser.add_argument('--reward-name', default='mock_reward')
+    parser.add_argument('--summary-interval', type=float, default=10.0,
+                        help='Seconds between step rate summaries.')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = _parse_arguments(argv)
+    logging.basicConfig(level=logging.INFO)
+    script = MockBrainScript(
+        properties_schema=parse_schema_argument('MockProperties',
+                                                args.properties),
+        output_schema=parse_schema_argument('MockState', args.output),
+        prediction_schema=parse_schema_argument('MockAction',
+                                                args.prediction),
+        reward_name=args.reward_name,
+        episodes=args.episodes,
+        steps_per_episode=args.steps_per_episode,
+        predictions_per_message=args.predictions_per_message,
+        latency=args.latency,
+        jitter=args.jitter,
+        seed=args.seed)
+    server = MockBrainServer(script, access_key=args.access_key)
+    port = server.listen(args.port, args.address)
+    log.info('Mock BRAIN listening on ws://%s:%d', args.address, port)
+    if args.summary_interval > 0:
+        server.start_periodic_summary(args.summary_interval)
+    try:
+        IOLoop.current().start()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        server.log_summary()
+
+
+if __name__ == '__main__':
+    main()
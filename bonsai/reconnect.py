@@ -0,0 +1,118 @@
+"""
+Reconnection for the event loops. When the connection to the BRAIN closes
+before training or prediction has finished, an event loop given a
+ReconnectPolicy waits, connects again and registers the same driver, so the
+simulator, its connection and the schema classes it built are kept.
+
+    run_for_training_or_prediction('my_simulator', sim,
+                                   reconnect=ReconnectPolicy(max_delay=30))
+
+Reconnects are counted by the `reconnects_total` counter, and the time spent
+disconnected by the `reconnect_downtime_seconds` histogram.
+"""
+import logging
+import random
+from timeit import default_timer as _clock
+
+from bonsai import instrumentation
+
+log = logging.getLogger(__name__)
+
+
+class ReconnectPolicy(object):
+    """
+    Exponential backoff with jitter between connection attempts. A policy
+    tracks one connection; don't share it between event loops.
+    """
+
+    def __init__(self, **kwargs):
+        """
+        :param kwargs: Optional keyword arguments. Valid arguments include:
+            - initial_delay = Seconds to wait before the first attempt after
+                              a disconnect. Defaults to 1.
+            - max_delay = Longest wait between attempts. Defaults to 60.
+            - multiplier = Factor the wait grows by after every failed
+                           attempt. Defaults to 2.
+            - jitter = Fraction of each wait that is randomized, so that
+                       many simulators don't reconnect in lockstep.
+                       Defaults to 0.5.
+            - max_attempts = Consecutive failed attempts after which the
+                             event loop gives up. Defaults to None, which
+                             retries forever.
+            - reset_after = Seconds a connection must last for the backoff
+                            to start again from initial_delay when it
+                            closes. Defaults to 30.
+        """
+        self.initial_delay = kwargs.pop('initial_delay', 1.0)
+        self.max_delay = kwargs.pop('max_delay', 60.0)
+        self.multiplier = kwargs.pop('multiplier', 2.0)
+        self.jitter = kwargs.pop('jitter', 0.5)
+        self.max_attempts = kwargs.pop('max_attempts', None)
+        self.reset_after = kwargs.pop('reset_after', 30.0)
+        if kwargs:
+            raise TypeError('Unexpected arguments {}'.format(
+                sorted(kwargs.keys())))
+        self.reconnects = 0
+        self.downtime = 0.0
+        self.has_connected = False
+        self._attempts = 0
+        self._connected_at = None
+        self._disconnected_at = None
+        registry = instrumentation.get_registry()
+        self._reconnects_counter = registry.counter('reconnects_total')
+        self._downtime_histogram = registry.histogram(
+            'reconnect_downtime_seconds')
+
+    def connected(self):
+        """
+        Called by the event loop when a connection has been established.
+        """
+        now = _clock()
+        self._connected_at = now
+        self.has_connected = True
+        if self._disconnected_at is not None:
+            downtime = now - self._disconnected_at
+            self._disconnected_at = None
+            self.reconnects += 1
+            self.downtime += downtime
+            self._reconnects_counter.inc()
+            self._downtime_histogram.record(downtime)
+            log.info('Reconnected after %.1f seconds', downtime)
+
+    def disconnected(self):
+        """
+        Called by the event loop when a connection closed, or an attempt to
+        connect failed, before the driver finished.
+        :return: Seconds to wait before connecting again, or None to give
+                 up. Failures to connect before the first connection are
+                 never retried, since they are likely misconfiguration.
+        """
+        now = _clock()
+        if not self.has_connected:
+            return None
+        if self._connected_at is not None:
+            if now - self._connected_at >= self.reset_after:
+                self._attempts = 0
+            self._connected_at = None
+        if self._disconnected_at is None:
+            self._disconnected_at = now
+
+        if self.max_attempts is not None and \
+                self._attempts >= self.max_attempts:
+            log.error('Giving up after %d attempts to reconnect',
+                      self._attempts)
+            return None
+        delay = min(self.max_delay,
+                    self.initial_delay * self.multiplier ** self._attempts)
+        self._attempts += 1
+        return delay * (1.0 - self.jitter * random.random())
+
+
+def get_policy(reconnect):
+    """
+    Returns the ReconnectPolicy for the `reconnect` argument of the event
+    loops, which may be a policy, True for the default policy, or None.
+    """
+    if reconnect is True:
+        return ReconnectPolicy()
+    return reconnect or None
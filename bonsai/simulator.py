@@ -1,5 +1,9 @@
 
 from collections import namedtuple
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
 
 # SimState is a convenience class for the data generated by the simulator
 # during training. It consists of a "state", which is a dictionary mapping
@@ -10,6 +14,55 @@ from collections import namedtuple
 SimState = namedtuple("SimState", ["state", "is_terminal"])
 
 
+class LazyState(Mapping):
+    """
+    A state dictionary whose expensive fields are computed only when read.
+    Only the fields in the BRAIN's output schema are read, so observables
+    the BRAIN doesn't use are never computed:
+
+        return SimState(LazyState({'x': self.x}, image=self.render), False)
+
+    :param values: Dictionary of fields whose values are already known.
+    :param kwargs: Functions taking no arguments that compute the remaining
+                   fields. Each is called at most once.
+    """
+    def __init__(self, values=None, **kwargs):
+        self._values = dict(values or {})
+        self._functions = kwargs
+
+    def __getitem__(self, name):
+        try:
+            return self._values[name]
+        except KeyError:
+            pass
+        value = self._functions[name]()
+        # Only forgotten once computed, so a failed field can be read again.
+        del self._functions[name]
+        self._values[name] = value
+        return value
+
+    def __contains__(self, name):
+        return name in self._values or name in self._functions
+
+    def __iter__(self):
+        for name in self._values:
+            yield name
+        for name in list(self._functions):
+            if name not in self._values:
+                yield name
+
+    def __len__(self):
+        return len(set(self._values) | set(self._functions))
+
+    def __repr__(self):
+        # Doesn't compute anything, so that logging a state is cheap.
+        fields = ['{!r}: {!r}'.format(name, value)
+                  for name, value in sorted(self._values.items())]
+        fields.extend('{!r}: <not computed>'.format(name)
+                      for name in sorted(self._functions))
+        return 'LazyState({{{}}})'.format(', '.join(fields))
+
+
 class Simulator(object):
     """
     Interface for client implemented Simulators using
@@ -49,6 +102,35 @@ class Simulator(object):
         to simulator """
         self._last_actions = predictions
 
+    def notify_state_fields(self, fields):
+        """ Called with the set of field names in the BRAIN's output schema
+        whenever it changes. get_state() only needs to return these fields,
+        so simulators may skip computing the others. See also LazyState """
+        pass
+
+    def notify_reward_name(self, reward_name):
+        """ Called with the name of the objective the BRAIN trains on, when
+        it sets the properties, before any reward is asked for """
+        pass
+
+    def reward_for(self, reward_name):
+        """ Returns the reward for the objective named reward_name in inkling.
+        By default this calls the simulator's method of that name """
+        return getattr(self, reward_name)()
+
+    def snapshot(self):
+        """ Simulators that can save and restore their state may implement
+        this to return a token capturing the simulation's current state, for
+        restore() to return to later. It must not be changed by the
+        simulation that follows. Returns None, for not supported, by
+        default """
+        return None
+
+    def restore(self, token):
+        """ Returns the simulation to the state captured by snapshot().
+        Must be implemented by simulators that implement snapshot() """
+        raise NotImplementedError()
+
     def advance(self, actions):
         """ This function must be implemented for all simulators.
         During training this function will be called repeatedly, and is used
@@ -62,3 +144,62 @@ class Simulator(object):
         message that represents the current simulation state.
         It is assumed that this function returns SimState objects """
         raise NotImplementedError()
+
+
+class SimulatorWrapper(Simulator):
+    """
+    Base class for simulators that wrap another simulator to change part of
+    its behavior. Everything a wrapper doesn't override, including the
+    reward methods, is passed on to the wrapped simulator.
+    """
+    def __init__(self, simulator):
+        self.simulator = simulator
+
+    def __getattr__(self, name):
+        # Only called for attributes not found on the wrapper itself.
+        if name == 'simulator':
+            raise AttributeError(name)
+        return getattr(self.simulator, name)
+
+    @property
+    def properties(self):
+        return self.simulator.properties
+
+    def set_properties(self, **kwargs):
+        self.simulator.set_properties(**kwargs)
+
+    def start(self):
+        self.simulator.start()
+
+    def stop(self):
+        self.simulator.stop()
+
+    def reset(self):
+        self.simulator.reset()
+
+    def get_last_action(self):
+        return self.simulator.get_last_action()
+
+    def notify_prediction_received(self, predictions):
+        self.simulator.notify_prediction_received(predictions)
+
+    def notify_state_fields(self, fields):
+        self.simulator.notify_state_fields(fields)
+
+    def notify_reward_name(self, reward_name):
+        self.simulator.notify_reward_name(reward_name)
+
+    def reward_for(self, reward_name):
+        return self.simulator.reward_for(reward_name)
+
+    def snapshot(self):
+        return self.simulator.snapshot()
+
+    def restore(self, token):
+        self.simulator.restore(token)
+
+    def advance(self, actions):
+        self.simulator.advance(actions)
+
+    def get_state(self):
+        return self.simulator.get_state()
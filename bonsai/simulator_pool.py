@@ -0,0 +1,195 @@
+"""
+A pool of constructed simulators, for simulators that are expensive to
+create. Instances returned to the pool are reset and handed to the next
+session that asks for one, instead of constructing a new one:
+
+    pool = SimulatorPool(MySimulator, size=2, idle_timeout=600)
+    while True:
+        with pool.lease() as simulator:
+            run_for_training_or_prediction('my_simulator', simulator)
+
+run_for_training_or_prediction also accepts the pool itself, and leases a
+simulator from it for the duration of the run.
+"""
+import logging
+import threading
+from contextlib import contextmanager
+from timeit import default_timer as _clock
+
+log = logging.getLogger(__name__)
+
+
+class SimulatorPool(object):
+    """
+    Keeps idle simulators made by a factory for reuse. Thread-safe.
+    """
+
+    def __init__(self, factory, **kwargs):
+        """
+        :param factory: Callable taking no arguments and returning a new
+                        Simulator.
+        :param kwargs: Optional keyword arguments. Valid arguments include:
+            - size = Number of simulators to construct up front. Defaults
+                     to 0.
+            - max_idle = Most idle simulators kept; more are closed when
+                         returned. Defaults to None, which keeps them all.
+            - idle_timeout = Seconds an idle simulator is kept before it is
+                             closed. Defaults to None, which keeps it
+                             forever.
+        """
+        self.factory = factory
+        self.max_idle = kwargs.pop('max_idle', None)
+        self.idle_timeout = kwargs.pop('idle_timeout', None)
+        size = kwargs.pop('size', 0)
+        if kwargs:
+            raise TypeError('Unexpected arguments {}'.format(
+                sorted(kwargs.keys())))
+        self.created = 0
+        self.reused = 0
+        self.evicted = 0
+        self._lock = threading.Lock()
+        # (simulator, time returned) pairs; the most recently returned last.
+        self._idle = []
+        self._leased = 0
+        self._closed = False
+        self.prewarm(size)
+
+    def prewarm(self, count):
+        """Constructs simulators until `count` are idle."""
+        while self.idle_count() < count:
+            simulator = self._create()
+            with self._lock:
+                self._idle.append((simulator, _clock()))
+
+    def _create(self):
+        start = _clock()
+        simulator = self.factory()
+        with self._lock:
+            self.created += 1
+        log.info('Constructed simulator %d in %.2f seconds',
+                 self.created, _clock() - start)
+        return simulator
+
+    def acquire(self):
+        """
+        Returns an idle simulator, or a new one when none are idle.
+        """
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('The simulator pool is closed.')
+            expired = self._expire(_clock())
+            simulator = None
+            if self._idle:
+                simulator = self._idle.pop()[0]
+                self.reused += 1
+            self._leased += 1
+        self._close_all(expired)
+        if simulator is None:
+            try:
+                simulator = self._create()
+            except BaseException:
+                with self._lock:
+                    self._leased -= 1
+                raise
+        return simulator
+
+    def release(self, simulator, discard=False):
+        """
+        Returns a simulator to the pool. It is reset before it is reused.
+        :param discard: Close the simulator instead, e.g. because it failed.
+        """
+        if not discard:
+            try:
+                simulator.reset()
+                simulator.notify_prediction_received(None)
+            except Exception:
+                log.exception('Unable to reset a returned simulator; '
+                              'closing it.')
+                discard = True
+
+        with self._lock:
+            self._leased -= 1
+            expired = self._expire(_clock())
+            if discard or self._closed or (
+                    self.max_idle is not None and
+                    len(self._idle) >= self.max_idle):
+                expired.append(simulator)
+            else:
+                self._idle.append((simulator, _clock()))
+        self._close_all(expired)
+
+    @contextmanager
+    def lease(self):
+        """
+        Context manager acquiring a simulator and returning it when done.
+        Simulators are closed rather than returned when the block raises an
+        exception.
+        """
+        simulator = self.acquire()
+        failed = False
+        try:
+            yield simulator
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self.release(simulator, discard=failed)
+
+    def _expire(self, now):
+        """
+        Removes idle simulators past idle_timeout. Must hold the lock.
+        :return: The removed simulators, to be closed outside the lock.
+        """
+        if self.idle_timeout is None:
+            return []
+        expired = [simulator for simulator, returned in self._idle
+                   if now - returned >= self.idle_timeout]
+        if expired:
+            self._idle = [entry for entry in self._idle
+                          if now - entry[1] < self.idle_timeout]
+        return expired
+
+    def _close_all(self, simulators):
+        if not simulators:
+            return
+        with self._lock:
+            self.evicted += len(simulators)
+        for simulator in simulators:
+            close = getattr(simulator, 'close', None)
+            if close is None:
+                continue
+            try:
+                close()
+            except Exception:
+                log.exception('Error closing a pooled simulator')
+
+    def evict_idle(self):
+        """Closes the idle simulators past idle_timeout."""
+        with self._lock:
+            expired = self._expire(_clock())
+        self._close_all(expired)
+
+    def idle_count(self):
+        with self._lock:
+            return len(self._idle)
+
+    def close(self):
+        """
+        Closes the idle simulators. Leased simulators are closed when they
+        are returned.
+        """
+        with self._lock:
+            self._closed = True
+            idle = [simulator for simulator, _ in self._idle]
+            self._idle = []
+        self._close_all(idle)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'created': self.created,
+                'reused': self.reused,
+                'evicted': self.evicted,
+                'idle': len(self._idle),
+                'leased': self._leased,
+            }
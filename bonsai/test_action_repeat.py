@@ -0,0 +1,83 @@
+"""
+Unit tests for the code in action_repeat.py.
+"""
+from unittest import TestCase
+
+from tornado.ioloop import IOLoop
+
+from bonsai.action_repeat import ActionRepeat
+from bonsai.brain_server_connection import create_async_tasks
+from bonsai.test_inproc_event_loop import _TRAIN_URL, _script
+from bonsai.test_mock_brain_server import CountingSimulator
+
+
+class RewardingSimulator(CountingSimulator):
+    """Rewards the step count, so summed rewards show which steps ran."""
+    def mock_reward(self):
+        return float(self.count)
+
+
+class ActionRepeatTests(TestCase):
+
+    def test_repeats_action_and_sums_rewards(self):
+        inner = RewardingSimulator(episode_length=10)
+        simulator = ActionRepeat(inner, repeat=3)
+        simulator.reset()
+        self.assertEqual(0.0, simulator.reward_for('mock_reward'))
+
+        simulator.notify_prediction_received({'command': 1})
+        simulator.advance(simulator.get_last_action())
+        self.assertEqual([{'command': 1}] * 3, inner.actions)
+        self.assertEqual(3, simulator.get_state().state['value'])
+        self.assertEqual(1.0 + 2.0 + 3.0, simulator.reward_for('mock_reward'))
+        self.assertEqual(3, simulator.last_repeat)
+
+    def test_stops_at_terminal_state(self):
+        inner = RewardingSimulator(episode_length=4)
+        simulator = ActionRepeat(inner, repeat=3)
+        simulator.reset()
+        simulator.reward_for('mock_reward')
+        simulator.advance({})
+        simulator.advance({})
+
+        self.assertEqual(4, inner.count)
+        self.assertEqual(1, simulator.last_repeat)
+        self.assertTrue(simulator.get_state().is_terminal)
+        self.assertEqual(4.0, simulator.reward_for('mock_reward'))
+
+    def test_repeat_from_properties(self):
+        inner = CountingSimulator()
+        simulator = ActionRepeat(inner, repeat=2)
+        simulator.set_properties(action_repeat=5, episode_length=7)
+        self.assertEqual(5, simulator.repeat)
+        self.assertEqual({'episode_length': 7}, inner.properties)
+
+        simulator.set_properties(action_repeat=0)
+        self.assertEqual(5, simulator.repeat)
+
+    def test_rewards_of_first_action(self):
+        inner = RewardingSimulator(episode_length=10)
+        simulator = ActionRepeat(inner, repeat=3)
+        simulator.notify_reward_name('mock_reward')
+        simulator.reset()
+        simulator.advance({})
+        self.assertEqual(1.0 + 2.0 + 3.0, simulator.reward_for('mock_reward'))
+
+    def test_invalid_repeat(self):
+        with self.assertRaises(ValueError):
+            ActionRepeat(CountingSimulator(), repeat=0)
+        simulator = ActionRepeat(CountingSimulator())
+        with self.assertRaises(ValueError):
+            simulator.set_properties(action_repeat=-2)
+        self.assertEqual(4, simulator.repeat)
+
+    def test_training_round_trips(self):
+        inner = CountingSimulator(episode_length=10)
+        run_sim, _ = create_async_tasks(
+            'counter', ActionRepeat(inner, repeat=5), _TRAIN_URL, 'key',
+            event_loop='inproc', event_loop_kwargs={'script': _script()})
+        session = IOLoop.current().run_sync(run_sim)
+
+        self.assertTrue(session.finished)
+        self.assertEqual(10, len(inner.actions))
+        self.assertEqual(2, session.steps)
@@ -0,0 +1,147 @@
+"""
+Unit tests for the code in bonsai_logging.py and logging_queue.py.
+"""
+import json
+import logging
+from unittest import TestCase
+
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+from six import StringIO
+
+from bonsai.bonsai_logging import RateLimitFilter, logging_basic_config
+from bonsai.logging_queue import BoundedQueueHandler
+
+
+def _record(message, level=logging.INFO, name='bonsai.test'):
+    return logging.LogRecord(name, level, __file__, 0, message, (), None)
+
+
+def _drain(handler):
+    messages = []
+    while not handler.queue.empty():
+        messages.append(handler.queue.get_nowait().getMessage())
+    return messages
+
+
+class LoggingBasicConfigTests(TestCase):
+
+    def setUp(self):
+        root = logging.getLogger()
+        saved = (root.level, root.handlers[:])
+        root.handlers = []
+
+        def restore():
+            root.setLevel(saved[0])
+            root.handlers = saved[1]
+        self.addCleanup(restore)
+        self.log = logging.getLogger('bonsai.test_bonsai_logging')
+
+    def test_non_blocking_writes_from_listener(self):
+        stream = StringIO()
+        listener = logging_basic_config(non_blocking=True, stream=stream)
+        self.log.info('first %s', 1)
+        self.log.debug('hidden')
+        listener.stop()
+        listener.stop()
+
+        lines = stream.getvalue().splitlines()
+        self.assertEqual(1, len(lines))
+        self.assertTrue(lines[0].endswith(
+            '[INFO][bonsai.test_bonsai_logging]first 1'))
+
+    def test_json_format(self):
+        stream = StringIO()
+        self.assertIsNone(logging_basic_config(json_format=True,
+                                               stream=stream))
+        try:
+            raise ValueError('bad')
+        except ValueError:
+            self.log.exception('failed %d', 2)
+
+        entry = json.loads(stream.getvalue())
+        self.assertEqual('failed 2', entry['message'])
+        self.assertEqual('ERROR', entry['level'])
+        self.assertEqual('bonsai.test_bonsai_logging', entry['logger'])
+        self.assertIn('ValueError: bad', entry['exception'])
+
+    def test_non_blocking_json_keeps_exception(self):
+        stream = StringIO()
+        listener = logging_basic_config(non_blocking=True, json_format=True,
+                                        stream=stream)
+        try:
+            raise ValueError('bad')
+        except ValueError:
+            self.log.exception('failed %d', 2)
+        listener.stop()
+
+        entry = json.loads(stream.getvalue())
+        self.assertEqual('failed 2', entry['message'])
+        self.assertIn('ValueError: bad', entry['exception'])
+
+    def test_non_blocking_text_keeps_exception(self):
+        stream = StringIO()
+        listener = logging_basic_config(non_blocking=True, stream=stream)
+        try:
+            raise ValueError('bad')
+        except ValueError:
+            self.log.exception('failed')
+        listener.stop()
+
+        output = stream.getvalue()
+        self.assertIn('failed\nTraceback', output)
+        self.assertEqual(1, output.count('ValueError: bad'))
+
+    def test_non_blocking_without_queue_handler(self):
+        with patch.dict('sys.modules', {'bonsai.logging_queue': None}):
+            with self.assertRaises(RuntimeError):
+                logging_basic_config(non_blocking=True)
+        self.assertEqual([], logging.getLogger().handlers)
+
+    def test_configured_logging_is_left_alone(self):
+        existing = logging.NullHandler()
+        logging.getLogger().addHandler(existing)
+        logging.getLogger().setLevel(logging.WARNING)
+        self.assertIsNone(logging_basic_config(level=logging.DEBUG,
+                                               non_blocking=True))
+        self.assertEqual([existing], logging.getLogger().handlers)
+        self.assertEqual(logging.WARNING, logging.getLogger().level)
+
+
+class BoundedQueueHandlerTests(TestCase):
+
+    def test_drop_new_reports_drops(self):
+        handler = BoundedQueueHandler(2)
+        for index in range(5):
+            handler.handle(_record('message {}'.format(index)))
+        self.assertEqual(3, handler.dropped)
+        self.assertEqual(['message 0', 'message 1'], _drain(handler))
+
+        handler.handle(_record('message 5'))
+        self.assertEqual(['Dropped 3 log records; the logging queue was '
+                          'full.', 'message 5'], _drain(handler))
+
+    def test_drop_old_keeps_newest(self):
+        handler = BoundedQueueHandler(2, overflow='drop_old')
+        for index in range(5):
+            handler.handle(_record('message {}'.format(index)))
+        self.assertEqual(3, handler.dropped)
+        self.assertEqual(['message 3', 'message 4'], _drain(handler))
+
+    def test_unknown_overflow(self):
+        with self.assertRaises(ValueError):
+            BoundedQueueHandler(2, overflow='explode')
+
+
+class RateLimitFilterTests(TestCase):
+
+    def test_limits_each_logger(self):
+        limit = RateLimitFilter(rate=0.001, burst=2)
+        passed = [limit.filter(_record('x')) for _ in range(4)]
+        self.assertEqual([True, True, False, False], passed)
+        self.assertTrue(limit.filter(_record('x', name='bonsai.other')))
+        self.assertTrue(limit.filter(_record('x', level=logging.WARNING)))
+        self.assertEqual({'bonsai.test': 2}, limit.suppressed)
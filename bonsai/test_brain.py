@@ -0,0 +1,448 @@
+"""
+Unit tests for the code in brain.py, run against a small in-memory fake of
+the BRAIN REST API.
+"""
+import hashlib
+import json
+import re
+import shutil
+import tempfile
+import threading
+import time
+from unittest import TestCase
+
+from six.moves.BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from six.moves.socketserver import ThreadingMixIn
+
+from bonsai import brain
+
+
+_INKLING = '''schema GameState
+    Float32 x,
+    Float32 y
+end
+
+schema Action
+    Int8{0, 1} command
+end
+
+schema Config
+    Int8 episode_length
+end
+
+concept balance is classifier
+    predicts (Action)
+    follows input(GameState)
+    feeds output
+end
+
+simulator my_simulator(Config)
+    action (Action)
+    state (GameState)
+end
+
+curriculum balance_curriculum
+    train balance
+    with simulator my_simulator
+    objective reward
+        lesson balancing
+            configure
+                constrain episode_length with Int8{-1}
+            until
+                maximize reward
+end
+'''
+
+
+class _FakeBrainApi(ThreadingMixIn, HTTPServer):
+    """A threaded HTTP server holding brains in memory."""
+    daemon_threads = True
+    # Room for every BrainSet worker to connect at once; the default of 5
+    # makes the rest wait on SYN retries.
+    request_queue_size = 64
+
+    def __init__(self):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), _FakeBrainHandler)
+        self.lock = threading.Lock()
+        self.brains = {}
+        self.requests = []
+        self.client_ports = set()
+        # Number of status requests a brain stays in STARTING after a
+        # PUT /train.
+        self.starting_polls = 1
+        # Requests wait, for up to two seconds, until this many of them
+        # have been in flight at once; max_in_flight is the most that were.
+        self.wait_for_concurrent = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.concurrency = threading.Condition()
+        # Names of brains whose inkling fails to compile.
+        self.failing = set()
+        # Number of GET requests answered with 304 Not Modified.
+        self.not_modified = 0
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}'.format(self.server_port)
+
+    def add_brain(self, name, state=brain.NOT_STARTED, inkling=None):
+        self.brains[name] = {
+            'state': state,
+            'inkling': inkling,
+            'versions': [],
+            'polls': 0,
+        }
+
+    def requests_for(self, method, suffix=''):
+        return [r for r in self.requests
+                if r[0] == method and r[1].endswith(suffix)]
+
+
+class _FakeBrainHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, body=None, headers=None):
+        data = json.dumps(body).encode('utf-8') if body is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length).decode('utf-8')) \
+            if length else None
+
+    def _wait_for_concurrent(self, api):
+        with api.concurrency:
+            api.in_flight += 1
+            api.max_in_flight = max(api.max_in_flight, api.in_flight)
+            api.concurrency.notify_all()
+            deadline = time.time() + 2.0
+            while api.max_in_flight < api.wait_for_concurrent:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    # Don't hold up the requests that follow as well.
+                    api.wait_for_concurrent = 0
+                    break
+                api.concurrency.wait(remaining)
+            api.in_flight -= 1
+
+    def _handle(self, method):
+        api = self.server
+        body = self._body()
+        self._wait_for_concurrent(api)
+        with api.lock:
+            api.requests.append((method, self.path))
+            api.client_ports.add(self.client_address[1])
+            status, reply, headers = self._route(api, method, body)
+            if method == 'GET' and status == 200:
+                etag = '"{}"'.format(hashlib.md5(json.dumps(
+                    reply, sort_keys=True).encode('utf-8')).hexdigest())
+                headers = dict(headers or {}, ETag=etag)
+                if self.headers.get('If-None-Match') == etag:
+                    api.not_modified += 1
+                    status, reply = 304, None
+        self._reply(status, reply, headers)
+
+    def _route(self, api, method, body):
+        match = re.match(r'^/v1/(\w+)(?:/(\w+))?(?:/(.*))?$', self.path)
+        user, name, rest = match.groups()
+        if name is None:
+            return 200, {'brains': [
+                {'name': n, 'state': b['state']}
+                for n, b in sorted(api.brains.items())]}, None
+        if name == 'brains' and method == 'POST':
+            api.add_brain(body['name'])
+            return 201, {'name': body['name']}, None
+        if name not in api.brains:
+            return 404, {'error': 'not found'}, None
+
+        data = api.brains[name]
+        if rest is None and method == 'GET':
+            return 200, {'name': name, 'versions': [
+                {'version': v} for v in reversed(data['versions'])]}, None
+        if rest is None and method == 'DELETE':
+            del api.brains[name]
+            return 204, None, None
+        if rest == 'status':
+            if data['state'] == brain.STARTING:
+                data['polls'] += 1
+                if data['polls'] > api.starting_polls:
+                    data['state'] = brain.IN_PROGRESS
+            return 200, {'state': data['state'],
+                         'objective_name': 'reward'}, None
+        if rest == 'ink' and method == 'POST' and name in api.failing:
+            return 400, {'error': 'compile failed'}, None
+        if rest == 'ink' and method == 'POST':
+            data['inkling'] = body['ink_content']
+            return 200, {'ink_compile': {'success': True}}, None
+        if rest is not None and rest.endswith('/ink'):
+            return 200, {'inkling': data['inkling']}, None
+        if rest == 'train':
+            data['versions'].append(len(data['versions']) + 1)
+            data['state'] = brain.STARTING
+            data['polls'] = 0
+            return 200, {'version': data['versions'][-1]}, None
+        if rest == 'stop':
+            data['state'] = brain.COMPLETED
+            return 200, {}, None
+        return 400, {'error': 'unsupported'}, None
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_PUT(self):
+        self._handle('PUT')
+
+    def do_DELETE(self):
+        self._handle('DELETE')
+
+
+class BrainTestCase(TestCase):
+
+    def setUp(self):
+        self.api = _FakeBrainApi()
+        thread = threading.Thread(target=self.api.serve_forever,
+                                  kwargs={'poll_interval': 0.05})
+        thread.daemon = True
+        thread.start()
+        self.cache_dir = tempfile.mkdtemp()
+        self.config = brain.BonsaiConfig(apikey='key', user='user',
+                                         server=self.api.url,
+                                         cache_dir=self.cache_dir)
+
+    def tearDown(self):
+        self.config.close()
+        shutil.rmtree(self.cache_dir)
+        self.api.shutdown()
+        self.api.server_close()
+
+
+class SessionTests(BrainTestCase):
+
+    def test_session_is_shared(self):
+        self.assertIs(self.config.session, self.config.session)
+
+    def test_requests_reuse_connections(self):
+        """Every REST call made with a config goes over one connection."""
+        self.api.add_brain('tinman', inkling=_INKLING)
+        address = ('tinman', self.config)
+        for _ in range(5):
+            brain.get_info(address)
+            brain.get_status(address)
+        brain.get_inkling(address, 0)
+        brain.set_inkling(address, _INKLING)
+
+        # Repeated get_info calls are answered from the response cache.
+        self.assertEqual(8, len(self.api.requests))
+        self.assertEqual(1, len(self.api.client_ports))
+
+
+class ResponseCacheTests(BrainTestCase):
+
+    def setUp(self):
+        super(ResponseCacheTests, self).setUp()
+        self.api.add_brain('tinman', inkling=_INKLING)
+        self.address = ('tinman', self.config)
+
+    def test_ttl(self):
+        first = brain.get_info(self.address)
+        self.assertEqual(first, brain.get_info(self.address))
+        self.assertEqual(1, len(self.api.requests_for('GET', '/tinman')))
+
+        self.config.cache.ttls['info'] = 0
+        self.config.cache.clear()
+        brain.get_info(self.address)
+        brain.get_info(self.address)
+        self.assertEqual(3, len(self.api.requests_for('GET', '/tinman')))
+
+    def test_revalidation(self):
+        """Expired entries are revalidated with their ETag."""
+        for _ in range(3):
+            self.assertEqual(brain.NOT_STARTED,
+                             brain.get_status(self.address)['state'])
+        self.assertEqual(3, len(self.api.requests_for('GET', '/status')))
+        self.assertEqual(2, self.api.not_modified)
+
+    def test_changes_invalidate(self):
+        brain.get_info(self.address)
+        brain.start_training(self.address)
+        info = brain.get_info(self.address)
+        self.assertEqual(1, info['versions'][0]['version'])
+
+    def test_inkling_on_disk(self):
+        """Inkling of a version is kept on disk between configs."""
+        brain.start_training(self.address)
+        brain.get_inkling(self.address, 1)
+
+        config = brain.BonsaiConfig(apikey='key', user='user',
+                                    server=self.api.url,
+                                    cache_dir=self.cache_dir)
+        tinman = brain.Brain(('tinman', config))
+        config.close()
+
+        self.assertEqual(_INKLING, tinman.inkling)
+        self.assertEqual(1, len(self.api.requests_for('GET', '/1/ink')))
+
+
+class InklingUploadTests(BrainTestCase):
+
+    def test_unchanged_inkling_is_not_uploaded(self):
+        brain.Brain(('tinman', self.config), inkling=_INKLING)
+        brain.Brain(('tinman', self.config), inkling=_INKLING)
+        self.assertEqual(1, len(self.api.requests_for('POST', '/ink')))
+
+        changed = _INKLING.replace('Int8 episode_length',
+                                   'Int16 episode_length')
+        brain.Brain(('tinman', self.config), inkling=changed)
+        self.assertEqual(2, len(self.api.requests_for('POST', '/ink')))
+
+    def test_inkling_changed_elsewhere_is_uploaded(self):
+        """A change made on the server, e.g. in the web UI, is noticed."""
+        brain.Brain(('tinman', self.config), inkling=_INKLING)
+        self.api.brains['tinman']['inkling'] = 'changed in the web UI'
+        brain.Brain(('tinman', self.config), inkling=_INKLING)
+        self.assertEqual(2, len(self.api.requests_for('POST', '/ink')))
+        self.assertEqual(_INKLING, self.api.brains['tinman']['inkling'])
+
+    def test_compares_with_loaded_inkling(self):
+        """The loaded inkling is compared with the one to upload."""
+        self.api.add_brain('tinman', inkling=_INKLING)
+        brain.Brain(('tinman', self.config), inkling=_INKLING)
+        self.assertEqual([], self.api.requests_for('POST', '/ink'))
+
+    def test_failed_compile_is_uploaded_again(self):
+        self.api.failing.add('tinman')
+        self.api.add_brain('tinman')
+        address = ('tinman', self.config)
+        for _ in range(2):
+            with self.assertRaises(Exception):
+                brain.set_inkling_if_changed(address, _INKLING)
+        self.assertEqual(2, len(self.api.requests_for('POST', '/ink')))
+
+    def test_recreated_brain_gets_inkling_uploaded(self):
+        brain.Brain(('tinman', self.config), inkling=_INKLING)
+        brain.delete(('tinman', self.config))
+        brain.Brain(('tinman', self.config), inkling=_INKLING)
+        self.assertEqual(2, len(self.api.requests_for('POST', '/ink')))
+
+
+class BrainSetTests(BrainTestCase):
+
+    def test_load_runs_concurrently(self):
+        """Every brain's requests are in flight at once."""
+        names = ['brain{}'.format(i) for i in range(16)]
+        for name in names[:8]:
+            self.api.add_brain(name)
+
+        self.api.wait_for_concurrent = len(names)
+        with brain.BrainSet(self.config, max_workers=16) as brains:
+            results = brains.load(names, inkling=_INKLING)
+
+        self.assertTrue(all(r.ok for r in results.values()))
+        self.assertEqual(names, list(brains.brains.keys()))
+        self.assertEqual('my_simulator',
+                         brains.brains['brain3'].simulator_name)
+        self.assertEqual(len(names), self.api.max_in_flight)
+
+    def test_errors_are_collected(self):
+        self.api.failing.add('bad')
+        with brain.BrainSet(self.config) as brains:
+            results = brains.load(['good', 'bad'], inkling=_INKLING)
+            deleted = brains.delete()
+
+        self.assertTrue(results['good'].ok)
+        self.assertFalse(results['bad'].ok)
+        self.assertEqual(400, results['bad'].error.response.status_code)
+        self.assertEqual(['good'], list(deleted.keys()))
+        self.assertEqual({'bad'}, set(self.api.brains.keys()))
+
+
+class StatusWatcherTests(BrainTestCase):
+
+    def setUp(self):
+        super(StatusWatcherTests, self).setUp()
+        self.watcher = brain.StatusWatcher(min_interval=0.01,
+                                           max_interval=0.05)
+
+    def _brain(self, name, state=brain.NOT_STARTED):
+        self.api.add_brain(name, state=state, inkling=_INKLING)
+        return brain.Brain((name, self.config))
+
+    def test_waiters_share_polls(self):
+        self.api.starting_polls = 3
+        tinman = self._brain('tinman')
+        brain.start_training(tinman.address)
+
+        futures = [self.watcher.wait_for_state(tinman, brain.IN_PROGRESS, 5)
+                   for _ in range(10)]
+
+        for future in futures:
+            self.assertEqual(brain.IN_PROGRESS, future.result())
+        self.assertEqual(brain.IN_PROGRESS, tinman.state)
+        self.assertLessEqual(len(self.api.requests_for('GET', '/status')), 6)
+
+    def test_callback_and_timeout(self):
+        tinman = self._brain('tinman')
+        states = []
+        future = self.watcher.wait_for_state(
+            tinman, [brain.IN_PROGRESS, brain.COMPLETED], 0.2,
+            callback=lambda f: states.append(f.exception()))
+
+        with self.assertRaises(brain.FutureTimeoutError):
+            future.result()
+        self.assertEqual(1, len(states))
+
+    def test_backoff_while_unchanged(self):
+        tinman = self._brain('tinman')
+        self.watcher.max_interval = 1.0
+        future = self.watcher.wait_for_state(tinman, brain.IN_PROGRESS, 0.5)
+        with self.assertRaises(brain.FutureTimeoutError):
+            future.result()
+        # Fixed 10ms polling would make about 50 requests.
+        self.assertLess(len(self.api.requests_for('GET', '/status')), 12)
+
+    def test_start_and_stop_training(self):
+        self.api.starting_polls = 2
+        tinman = self._brain('tinman')
+
+        tinman.start_training(watcher=self.watcher)
+        self.assertEqual(brain.IN_PROGRESS, tinman.state)
+        self.assertEqual(1, tinman.latest_version)
+
+        tinman.stop_training(watcher=self.watcher)
+        self.assertEqual(brain.COMPLETED, tinman.state)
+        self.assertEqual(1, len(self.api.requests_for('PUT', '/stop')))
+
+    def test_second_brain_for_the_same_name(self):
+        tinman = self._brain('tinman')
+        # tinman's watch is the one the watcher polls and updates.
+        future = self.watcher.wait_for_state(tinman, brain.IN_PROGRESS, 5)
+        other = brain.Brain(('tinman', self.config))
+
+        other.start_training(watcher=self.watcher)
+        self.assertEqual(brain.IN_PROGRESS, other.state)
+        self.assertEqual(brain.IN_PROGRESS, future.result())
+
+    def test_poll_of_replaced_watch_keeps_new_watch(self):
+        tinman = self._brain('tinman')
+        key = ('tinman', id(self.config))
+        # A watch _expire has already dropped, polled late.
+        stale = brain._Watch(tinman, time.time())
+        future = self.watcher.wait_for_state(tinman, brain.IN_PROGRESS, 5)
+        current = self.watcher._watches[key]
+
+        self.watcher._poll(stale)
+        self.assertIs(current, self.watcher._watches.get(key))
+        brain.start_training(tinman.address)
+        self.assertEqual(brain.IN_PROGRESS, future.result(5))
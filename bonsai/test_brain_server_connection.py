@@ -2,6 +2,7 @@
 Unit tests for the code in brain_server_connection.py.
 """
 import os
+import subprocess
 import sys
 from contextlib import contextmanager
 from unittest import TestCase
@@ -11,6 +12,7 @@ except ImportError:
     from mock import ANY, Mock, patch
 
 from bonsai.simulator import Simulator
+from bonsai import brain_server_connection
 from bonsai.brain_server_connection import parse_base_arguments
 from bonsai.brain_server_connection import run_for_training_or_prediction
 
@@ -170,3 +172,26 @@ class BrainServerConnectionTests(TestCase):
             ['--access-key', 'test_key', '--train-brain', 'life'])
         self.assertIn('life/sims/ws', base_arguments.brain_url)
         self.assertNotIn('life/predictions/ws', base_arguments.brain_url)
+
+
+class LazyImportTests(TestCase):
+
+    def test_import_leaves_out_event_loops(self):
+        """ Importing bonsai doesn't import any event loop or its deps """
+        code = ('import sys, bonsai; print(" ".join(sorted(sys.modules)))')
+        modules = subprocess.check_output(
+            [sys.executable, '-c', code]).decode('utf-8').split()
+        for name in ('bonsai.tornado_event_loop',
+                     'bonsai.websocket_event_loop',
+                     'bonsai.inproc_event_loop', 'bonsai_config',
+                     'tornado', 'websocket'):
+            self.assertNotIn(name, modules)
+
+    def test_event_loop_imported_when_selected(self):
+        from bonsai import inproc_event_loop
+        run, create_tasks = \
+            brain_server_connection._get_event_loop_functions('inproc')
+        self.assertIs(inproc_event_loop.run, run)
+        self.assertIs(inproc_event_loop.create_tasks, create_tasks)
+        with self.assertRaises(ValueError):
+            brain_server_connection._get_event_loop_functions('nope')
@@ -0,0 +1,133 @@
+"""
+Unit tests for the code in cached_simulator.py.
+"""
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from bonsai.cached_simulator import CachedSimulator, freeze
+from bonsai.simulator import LazyState, Simulator, SimState
+
+
+class WalkSimulator(Simulator):
+    """A deterministic simulator that moves by the step it is given."""
+    def __init__(self):
+        super(WalkSimulator, self).__init__()
+        self.position = 0
+        self.advances = 0
+        self.rewards = 0
+
+    def reset(self):
+        self.position = self.properties.get('start', 0)
+
+    def advance(self, actions):
+        self.advances += 1
+        self.position += actions['step']
+
+    def get_state(self):
+        return SimState(state={'position': self.position},
+                        is_terminal=abs(self.position) >= 10)
+
+    def distance(self):
+        self.rewards += 1
+        return float(abs(self.position))
+
+
+def _episode(simulator, steps):
+    """
+    Runs an episode the way SimulatorConnection does.
+    :return: List of (state, reward) observed at every step.
+    """
+    simulator.reset()
+    simulator.start()
+    observed = [(simulator.get_state().state,
+                 simulator.reward_for('distance'))]
+    for step in steps:
+        simulator.notify_prediction_received({'step': step})
+        simulator.advance(simulator.get_last_action())
+        observed.append((simulator.get_state().state,
+                         simulator.reward_for('distance')))
+    simulator.stop()
+    return observed
+
+
+class CachedSimulatorTests(TestCase):
+
+    def test_repeated_episode_is_served_from_cache(self):
+        inner = WalkSimulator()
+        cached = CachedSimulator(inner)
+        first = _episode(cached, [1, 2, 3])
+        advances, rewards = inner.advances, inner.rewards
+
+        self.assertEqual(first, _episode(cached, [1, 2, 3]))
+        self.assertEqual(advances, inner.advances)
+        # Only the reward of the first state, which isn't cached, is asked.
+        self.assertEqual(rewards + 1, inner.rewards)
+        self.assertEqual(3, cached.stats()['hits'])
+        self.assertEqual(0.5, cached.hit_rate)
+
+    def test_miss_after_hits_catches_up(self):
+        inner = WalkSimulator()
+        cached = CachedSimulator(inner)
+        _episode(cached, [1, 2, 3])
+        observed = _episode(cached, [1, 2, -5])
+
+        self.assertEqual(({'position': -2}, 2.0), observed[-1])
+        self.assertEqual(-2, inner.position)
+        self.assertEqual(3 + 3, inner.advances)
+
+    def test_properties_are_part_of_the_key(self):
+        inner = WalkSimulator()
+        cached = CachedSimulator(inner)
+        _episode(cached, [1, 1])
+        cached.set_properties(start=0, scale=2)
+        _episode(cached, [1, 1])
+
+        self.assertEqual(0, cached.stats()['hits'])
+        self.assertEqual(4, inner.advances)
+
+    def test_unhashable_states_are_not_cached(self):
+        cached = CachedSimulator(
+            WalkSimulator(), state_key=lambda state: [state['position']])
+        _episode(cached, [1, 1])
+        _episode(cached, [1, 1])
+
+        self.assertEqual(0, cached.stats()['hits'])
+        self.assertEqual(0, len(cached._table))
+
+    def test_evicted_transitions_spill_to_disk(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        inner = WalkSimulator()
+        cached = CachedSimulator(
+            inner, maxsize=1, spill_path=os.path.join(directory, 'spill'))
+        self.addCleanup(cached.close)
+        first = _episode(cached, [1, 2, 3])
+        advances = inner.advances
+
+        self.assertEqual(first, _episode(cached, [1, 2, 3]))
+        self.assertEqual(advances, inner.advances)
+        self.assertEqual(3, cached.stats()['spill_hits'])
+
+    def test_new_state_fields_clear_the_cache(self):
+        cached = CachedSimulator(WalkSimulator())
+        cached.notify_state_fields(frozenset(['position']))
+        _episode(cached, [1, 1])
+        cached.notify_state_fields(frozenset(['position']))
+        self.assertEqual(2, len(cached._table))
+        cached.notify_state_fields(frozenset(['position', 'speed']))
+        self.assertEqual(0, len(cached._table))
+
+    def test_unknown_attributes_are_delegated(self):
+        inner = WalkSimulator()
+        cached = CachedSimulator(inner)
+        self.assertEqual(0.0, cached.distance())
+        self.assertIs(inner.properties, cached.properties)
+
+    def test_freeze(self):
+        self.assertEqual((('a', (1, 2)), ('b', (('c', 3),))),
+                         freeze({'b': {'c': 3}, 'a': [1, 2]}))
+        self.assertEqual((('a', 1),), freeze(LazyState(a=lambda: 1)))
+        with self.assertRaises(TypeError):
+            freeze({'a': set()})
@@ -0,0 +1,371 @@
+"""
+Unit tests for the code in connections.py.
+"""
+from unittest import TestCase
+
+from tornado.ioloop import IOLoop
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+from bonsai import instrumentation
+from bonsai.brain_server_connection import create_async_tasks
+from bonsai.cached_simulator import CachedSimulator
+from bonsai.common.message_builder import reconstitute
+from bonsai.common.state_to_proto import SimStateException
+from bonsai.common.state_to_proto import convert_state_to_proto
+from bonsai.connections import SimulatorConnection
+from bonsai.mock_brain_server import MockBrainScript, MockBrainSession
+from bonsai.mock_brain_server import make_schema
+from bonsai.proto.generator_simulator_api_pb2 import ServerToSimulator
+from bonsai.proto.generator_simulator_api_pb2 import SimulatorToServer
+from bonsai.simulator import LazyState, SimState
+from bonsai.test_inproc_event_loop import _TRAIN_URL, _script
+from bonsai.test_mock_brain_server import CountingSimulator
+
+
+# Declares the schemas _script() acknowledges registration with.
+_INKLING = '''
+schema MockProperties
+    Int32 episode_length
+end
+
+schema State
+    Int32 value
+end
+
+schema MockAction
+    Int8{0, 1} command
+end
+
+simulator counter(MockProperties)
+    action (MockAction)
+    state (State)
+end
+'''
+
+
+class SchemaPrewarmTests(TestCase):
+
+    def _acknowledge(self, connection, script):
+        session = MockBrainSession(1, script)
+        register = SimulatorToServer()
+        register.message_type = SimulatorToServer.REGISTER
+        register.register_data.simulator_name = 'counter'
+        ack = ServerToSimulator()
+        ack.ParseFromString(session.handle(register.SerializeToString()))
+        connection.handle_register_acknowledgement(
+            ack.acknowledge_register_data)
+
+    def test_prewarmed_schemas_are_used(self):
+        connection = SimulatorConnection(
+            simulator_name='counter', simulator=CountingSimulator(),
+            inkling=_INKLING)
+        prewarmed = connection._prewarmed
+
+        with patch('bonsai.connections.reconstitute') as reconstitute:
+            self._acknowledge(connection, _script())
+        self.assertFalse(reconstitute.called)
+        self.assertIs(prewarmed.properties[1], connection._properties_schema)
+        self.assertIs(prewarmed.output[1], connection._output_schema)
+        self.assertIs(prewarmed.prediction[1], connection._prediction_schema)
+
+    def test_server_schema_wins(self):
+        connection = SimulatorConnection(
+            simulator_name='counter', simulator=CountingSimulator(),
+            inkling=_INKLING)
+        script = MockBrainScript(
+            output_schema=make_schema('State', [('value', 'float')]))
+        self._acknowledge(connection, script)
+
+        self.assertIsNot(connection._prewarmed.output[1],
+                         connection._output_schema)
+        self.assertEqual(
+            'value', connection._output_schema.DESCRIPTOR.fields[0].name)
+
+    def test_unusable_inkling(self):
+        connection = SimulatorConnection(
+            simulator_name='other', simulator=CountingSimulator(),
+            inkling=_INKLING)
+        self.assertIsNone(connection._prewarmed)
+        self._acknowledge(connection, _script())
+        self.assertIsNotNone(connection._output_schema)
+
+    def test_schemas_are_reused_when_registering_again(self):
+        connection = SimulatorConnection(
+            simulator_name='counter', simulator=CountingSimulator())
+        self._acknowledge(connection, _script())
+        output_schema = connection._output_schema
+
+        with patch('bonsai.connections.reconstitute') as reconstitute:
+            self._acknowledge(connection, _script())
+        self.assertFalse(reconstitute.called)
+        self.assertIs(output_schema, connection._output_schema)
+
+
+def _binary_prediction(prediction_class, rng):
+    return {'command': rng.randint(0, 1)}
+
+
+class MutatingSimulator(CountingSimulator):
+    """Changes the actions it is given after recording a copy."""
+    def advance(self, actions):
+        super(MutatingSimulator, self).advance(dict(actions))
+        actions['command'] = 7
+
+
+class CodecMemoTests(TestCase):
+
+    def _train(self, simulator=None, **connection_kwargs):
+        simulator = simulator or CountingSimulator(episode_length=10)
+        connections = []
+
+        def connection_class(**kwargs):
+            kwargs.update(connection_kwargs)
+            connections.append(SimulatorConnection(**kwargs))
+            return connections[-1]
+
+        run_sim, _ = create_async_tasks(
+            'counter', simulator, _TRAIN_URL, 'key', event_loop='inproc',
+            simulator_connection_class=connection_class,
+            event_loop_kwargs={'script': _script(
+                episodes=5, prediction_factory=_binary_prediction)})
+        session = IOLoop.current().run_sync(run_sim)
+        return simulator, connections[0], session
+
+    def test_memoized_run_matches(self):
+        plain, connection, plain_session = self._train()
+        memoized, memo_connection, session = self._train(codec_cache_size=64)
+
+        self.assertIsNone(connection.codec_cache_stats())
+        self.assertEqual(plain.actions, [dict(a) for a in memoized.actions])
+        self.assertEqual(plain_session.bytes_received, session.bytes_received)
+
+        stats = memo_connection.codec_cache_stats()
+        self.assertEqual(2, stats['prediction']['size'])
+        self.assertGreater(stats['prediction']['hit_rate'], 0.9)
+        self.assertEqual(11, stats['state']['size'])
+        self.assertGreater(stats['state']['hits'], 0)
+
+    def test_actions_are_read_only(self):
+        simulator, _, _ = self._train(codec_cache_size=8)
+        with self.assertRaises(TypeError):
+            simulator.actions[0]['command'] = 5
+
+    def test_actions_are_copied_without_read_only_mappings(self):
+        plain, _, _ = self._train()
+        with patch('bonsai.connections.MappingProxyType', None):
+            mutating, connection, _ = self._train(
+                MutatingSimulator(episode_length=10), codec_cache_size=8)
+
+        self.assertEqual(plain.actions, mutating.actions)
+        stats = connection.codec_cache_stats()
+        self.assertGreater(stats['prediction']['hits'], 0)
+
+    def test_hit_ratio_gauge(self):
+        self._train(codec_cache_size=8)
+        snapshot = instrumentation.snapshot()
+        self.assertGreater(
+            snapshot['codec_cache_hit_ratio{cache=prediction,sim_id=1}'], 0)
+        self.assertNotIn('codec_cache_hit_ratio{cache=prediction}', snapshot)
+
+    def test_hit_ratio_gauge_follows_latest_connection(self):
+        self._train(codec_cache_size=8)
+        _, connection, _ = self._train(codec_cache_size=8)
+        # Distinguish this connection's cache from the first one's.
+        connection._prediction_memo.hits = 0
+        snapshot = instrumentation.snapshot()
+        self.assertEqual(
+            0.0, snapshot['codec_cache_hit_ratio{cache=prediction,sim_id=1}'])
+
+
+class LazyCountingSimulator(CountingSimulator):
+    """Reports an expensive field that the State schema doesn't use."""
+    def __init__(self):
+        super(LazyCountingSimulator, self).__init__()
+        self.renders = 0
+        self.state_fields = None
+
+    def notify_state_fields(self, fields):
+        self.state_fields = fields
+
+    def _render(self):
+        self.renders += 1
+        return [0] * 1024
+
+    def get_state(self):
+        return SimState(LazyState({'value': self.count}, image=self._render),
+                        self.count >= self.episode_length)
+
+
+class LazyStateTests(TestCase):
+
+    def test_values_are_computed_once_on_access(self):
+        calls = []
+        state = LazyState({'x': 1}, y=lambda: calls.append(1) or 2)
+        self.assertEqual(['x', 'y'], sorted(state))
+        self.assertEqual(2, len(state))
+        self.assertIn("'y': <not computed>", repr(state))
+        self.assertEqual(2, state['y'])
+        self.assertEqual(2, state['y'])
+        self.assertEqual(1, len(calls))
+        self.assertEqual({'x': 1, 'y': 2}, dict(state))
+        with self.assertRaises(KeyError):
+            state['z']
+
+    def test_failed_field_can_be_read_again(self):
+        results = [ValueError(), 3]
+
+        def compute():
+            result = results.pop(0)
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        state = LazyState({'x': 1}, x=lambda: 2, y=compute)
+        self.assertEqual(2, len(state))
+        with self.assertRaises(ValueError):
+            state['y']
+        self.assertIn('y', state)
+        self.assertEqual(3, state['y'])
+
+    def _train(self, simulator):
+        run_sim, _ = create_async_tasks(
+            'counter', simulator, _TRAIN_URL, 'key', event_loop='inproc',
+            event_loop_kwargs={'script': _script(episodes=2)})
+        return IOLoop.current().run_sync(run_sim)
+
+    def test_only_schema_fields_are_computed(self):
+        simulator = LazyCountingSimulator()
+        session = self._train(simulator)
+
+        self.assertTrue(session.finished)
+        self.assertEqual(frozenset(['value']), simulator.state_fields)
+        self.assertEqual(0, simulator.renders)
+
+    def test_cached_simulator_keeps_states_lazy(self):
+        simulator = LazyCountingSimulator()
+        session = self._train(CachedSimulator(simulator))
+
+        self.assertTrue(session.finished)
+        self.assertEqual(frozenset(['value']), simulator.state_fields)
+        self.assertEqual(0, simulator.renders)
+
+
+class AdaptiveValidationTests(TestCase):
+
+    def _connection(self, **kwargs):
+        connection = SimulatorConnection(
+            simulator_name='counter', simulator=CountingSimulator(), **kwargs)
+        connection._set_output_schema(reconstitute(
+            make_schema('State', [('value', 'int32')])))
+        return connection
+
+    def _strict_encodes(self, connection, states):
+        with patch('bonsai.connections.convert_state_to_proto',
+                   wraps=convert_state_to_proto) as strict:
+            encoded = [connection._encode_state(state) for state in states]
+        return strict.call_count, encoded
+
+    def test_checks_stop_after_warmup(self):
+        connection = self._connection(strict_validation_steps=3,
+                                      validation_sample_interval=None)
+        count, encoded = self._strict_encodes(
+            connection, [{'value': i} for i in range(10)])
+        self.assertEqual(3, count)
+        self.assertEqual(
+            encoded, [connection._encode_state({'value': i})
+                      for i in range(10)])
+
+    def test_sampled_checks(self):
+        connection = self._connection(strict_validation_steps=2,
+                                      validation_sample_interval=4)
+        count, _ = self._strict_encodes(connection, [{'value': 1}] * 10)
+        self.assertEqual(2 + 2, count)
+
+    def test_always_strict_by_default(self):
+        connection = self._connection()
+        count, _ = self._strict_encodes(connection, [{'value': 1}] * 5)
+        self.assertEqual(5, count)
+
+    def test_encode_error_returns_to_strict_checks(self):
+        connection = self._connection(strict_validation_steps=2,
+                                      validation_sample_interval=None)
+        self._strict_encodes(connection, [{'value': 1}] * 2)
+        self.assertIsNotNone(connection._fast_convert)
+
+        with self.assertRaises(SimStateException):
+            connection._encode_state({'other': 1})
+        count, _ = self._strict_encodes(connection, [{'value': 1}] * 3)
+        self.assertEqual(2, count)
+
+    def test_schema_change_returns_to_strict_checks(self):
+        connection = self._connection(strict_validation_steps=1)
+        self._strict_encodes(connection, [{'value': 1}])
+        self.assertIsNotNone(connection._fast_convert)
+        connection._set_output_schema(reconstitute(
+            make_schema('State', [('value', 'float')])))
+        self.assertIsNone(connection._fast_convert)
+
+
+class SnapshotSimulator(CountingSimulator):
+    """Counts how often its expensive reset runs."""
+    def __init__(self, **kwargs):
+        super(SnapshotSimulator, self).__init__(**kwargs)
+        self.setups = 0
+        self.restores = 0
+
+    def reset(self):
+        super(SnapshotSimulator, self).reset()
+        self.setups += 1
+
+    def snapshot(self):
+        return {'count': self.count}
+
+    def restore(self, token):
+        self.restores += 1
+        self.count = token['count']
+
+
+class ResetSnapshotTests(TestCase):
+
+    def _train(self, simulator, **connection_kwargs):
+        connections = []
+
+        def connection_class(**kwargs):
+            kwargs.update(connection_kwargs)
+            connections.append(SimulatorConnection(**kwargs))
+            return connections[-1]
+
+        run_sim, _ = create_async_tasks(
+            'counter', simulator, _TRAIN_URL, 'key', event_loop='inproc',
+            simulator_connection_class=connection_class,
+            event_loop_kwargs={'script': _script(episodes=3)})
+        session = IOLoop.current().run_sync(run_sim)
+        self.assertTrue(session.finished)
+        return connections[0]
+
+    def test_resets_restore_snapshot(self):
+        simulator = SnapshotSimulator()
+        self._train(simulator, reset_snapshot_count=4)
+        self.assertEqual(1, simulator.setups)
+        self.assertEqual(2, simulator.restores)
+        self.assertEqual(5 * 3, len(simulator.actions))
+
+    def test_snapshots_are_off_by_default(self):
+        simulator = SnapshotSimulator()
+        self._train(simulator)
+        self.assertEqual(3, simulator.setups)
+        self.assertEqual(0, simulator.restores)
+
+    def test_simulator_without_snapshots(self):
+        simulator = CountingSimulator()
+        connection = self._train(simulator, reset_snapshot_count=4)
+        self.assertIsNone(connection._reset_snapshots)
+
+    def test_failed_restore_resets(self):
+        simulator = SnapshotSimulator()
+        with patch.object(simulator, 'restore', side_effect=RuntimeError()):
+            self._train(simulator, reset_snapshot_count=4)
+        self.assertEqual(3, simulator.setups)
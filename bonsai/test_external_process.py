@@ -0,0 +1,196 @@
+"""
+Unit tests for the code in external_process.py.
+"""
+import os
+import shutil
+import sys
+import tempfile
+from io import BytesIO
+try:
+    from types import MappingProxyType
+except ImportError:
+    MappingProxyType = dict
+from unittest import TestCase
+
+from tornado.ioloop import IOLoop
+
+from bonsai.brain_server_connection import create_async_tasks
+from bonsai.external_process import ExternalProcessSimulator
+from bonsai.external_process import ExternalSimulatorError
+from bonsai.connections import SimulatorConnection
+from bonsai.external_process import decode, encode, read_frame, write_frame
+from bonsai.external_process import serve
+from bonsai.inkling_types import Luminance
+from bonsai.test_connections import LazyCountingSimulator
+from bonsai.test_inproc_event_loop import _TRAIN_URL, _script
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_CHILD = [sys.executable, '-m', 'bonsai.external_process',
+          'bonsai.test_mock_brain_server:CountingSimulator']
+
+
+def _external(*arguments, **kwargs):
+    simulator = ExternalProcessSimulator(
+        _CHILD + list(arguments), cwd=_ROOT,
+        env=dict(os.environ, PYTHONPATH=_ROOT), **kwargs)
+    return simulator
+
+
+class FramingTests(TestCase):
+
+    def test_frames_round_trip(self):
+        stream = BytesIO()
+        write_frame(stream, b'abc')
+        write_frame(stream, b'')
+        stream.seek(0)
+        self.assertEqual(b'abc', read_frame(stream))
+        self.assertEqual(b'', read_frame(stream))
+        self.assertIsNone(read_frame(stream))
+
+    def test_truncated_frame(self):
+        with self.assertRaises(EOFError):
+            read_frame(BytesIO(b'\x00\x00\x00\x05ab'))
+
+    def test_luminance_round_trip(self):
+        luminance = decode(encode({'frame': Luminance(2, 1, [0.5, 1.0])}))
+        self.assertEqual((2, 1), (luminance['frame'].width,
+                                  luminance['frame'].height))
+        self.assertEqual(Luminance(2, 1, [0.5, 1.0]).pixels,
+                         luminance['frame'].pixels)
+
+    def test_read_only_mappings(self):
+        actions = MappingProxyType({'command': 1})
+        self.assertEqual({'actions': {'command': 1}},
+                         decode(encode({'actions': actions})))
+
+
+class ServeTests(TestCase):
+
+    def _serve(self, simulator, *requests):
+        stream_in = BytesIO()
+        for request in requests:
+            write_frame(stream_in, encode(request))
+        stream_in.seek(0)
+        stream_out = BytesIO()
+        serve(simulator, stream_in, stream_out)
+        stream_out.seek(0)
+        replies = []
+        payload = read_frame(stream_out)
+        while payload is not None:
+            replies.append(decode(payload))
+            payload = read_frame(stream_out)
+        return replies
+
+    def test_only_schema_fields_are_sent(self):
+        simulator = LazyCountingSimulator()
+        replies = self._serve(
+            simulator,
+            {'calls': [['notify_state_fields', ['value']], ['reset']],
+             'rewards': []},
+            {'calls': [['advance', {'command': 1}]],
+             'rewards': ['mock_reward']})
+
+        self.assertEqual(frozenset(['value']), simulator.state_fields)
+        self.assertEqual({'value': 1}, replies[1]['state'])
+        self.assertEqual({'mock_reward': 1.0}, replies[1]['rewards'])
+        self.assertEqual(0, simulator.renders)
+
+    def test_errors_are_replied(self):
+        replies = self._serve(LazyCountingSimulator(),
+                              {'calls': [['explode']], 'rewards': []},
+                              {'calls': [], 'rewards': []})
+        self.assertIn('Unknown call explode', replies[0]['error'])
+        self.assertEqual({'value': 0, 'image': [0] * 1024},
+                         replies[1]['state'])
+
+
+class ExternalProcessSimulatorTests(TestCase):
+
+    def _episode(self, simulator):
+        simulator.set_properties(difficulty=2)
+        simulator.reset()
+        simulator.start()
+        self.assertEqual({'value': 0}, simulator.get_state().state)
+        self.assertEqual(1.0, simulator.reward_for('mock_reward'))
+        for _ in range(5):
+            simulator.advance({'command': 1})
+            state = simulator.get_state()
+            simulator.reward_for('mock_reward')
+        self.assertEqual(({'value': 5}, True), state)
+
+    def test_one_exchange_per_step(self):
+        simulator = _external()
+        self.addCleanup(simulator.close)
+        self._episode(simulator)
+        # The first reward is asked for separately, then with every state.
+        self.assertEqual(7, simulator.exchanges)
+        self._episode(simulator)
+        self.assertEqual(13, simulator.exchanges)
+
+    def test_close_stops_child(self):
+        simulator = _external()
+        self._episode(simulator)
+        simulator.stop()
+        simulator.close()
+        self.assertEqual(0, simulator._process.returncode)
+        simulator.close()
+
+    def test_child_errors_are_raised(self):
+        simulator = _external()
+        self.addCleanup(simulator.close)
+        simulator.reset()
+        with self.assertRaises(ExternalSimulatorError) as raised:
+            simulator.reward_for('missing_reward')
+        self.assertIn('missing_reward', str(raised.exception))
+        self.assertEqual({'value': 0}, simulator.get_state().state)
+
+    def test_unix_socket(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'sim.sock')
+        simulator = _external('--socket', path, socket_path=path)
+        self._episode(simulator)
+        simulator.close()
+        self.assertEqual(0, simulator._process.returncode)
+
+    def test_training(self):
+        simulator = _external()
+        self.addCleanup(simulator.close)
+        run_sim, _ = create_async_tasks(
+            'counter', simulator, _TRAIN_URL, 'key', event_loop='inproc',
+            event_loop_kwargs={'script': _script(episodes=2)})
+        session = IOLoop.current().run_sync(run_sim)
+        self.assertTrue(session.finished)
+        self.assertEqual(session.steps + session.episodes + 1,
+                         simulator.exchanges)
+
+    def test_training_with_read_only_actions(self):
+        simulator = _external()
+        self.addCleanup(simulator.close)
+
+        def connection_class(**kwargs):
+            return SimulatorConnection(codec_cache_size=8, **kwargs)
+
+        run_sim, _ = create_async_tasks(
+            'counter', simulator, _TRAIN_URL, 'key', event_loop='inproc',
+            simulator_connection_class=connection_class,
+            event_loop_kwargs={'script': _script(episodes=2)})
+        session = IOLoop.current().run_sync(run_sim)
+        self.assertTrue(session.finished)
+
+    def test_corrupt_reply(self):
+        # Answers the first request with a frame that isn't UTF-8.
+        script = ('import sys\n'
+                  'getattr(sys.stdin, "buffer", sys.stdin).read(4)\n'
+                  'out = getattr(sys.stdout, "buffer", sys.stdout)\n'
+                  'out.write(b"\\x00\\x00\\x00\\x02\\xff\\xfe")\n'
+                  'out.flush()\n')
+        simulator = ExternalProcessSimulator([sys.executable, '-c', script])
+        self.addCleanup(simulator.close)
+        with self.assertRaises(ExternalSimulatorError) as raised:
+            simulator.get_state()
+        self.assertIn('decode', str(raised.exception))
+
+    def test_requires_command_or_socket(self):
+        with self.assertRaises(ValueError):
+            ExternalProcessSimulator()
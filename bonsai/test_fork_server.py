@@ -0,0 +1,78 @@
+"""
+Unit tests for the code in fork_server.py.
+"""
+import os
+import shutil
+import tempfile
+from unittest import TestCase, skipUnless
+
+from bonsai.fork_server import ForkServer, load_object
+from bonsai.test_inproc_event_loop import _TRAIN_URL, _script
+from bonsai.test_mock_brain_server import CountingSimulator
+
+
+def _failing_factory(index):
+    raise RuntimeError('no simulator for worker {}'.format(index))
+
+
+def _first_fails_factory(index):
+    if index == 0:
+        _failing_factory(index)
+    return CountingSimulator()
+
+
+@skipUnless(hasattr(os, 'fork'), 'requires os.fork')
+class ForkServerTests(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.warmups = []
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _server(self, factory, **kwargs):
+        recording_file = os.path.join(self.directory, 'recording')
+        return ForkServer(
+            'counter', factory,
+            ['--brain-url', _TRAIN_URL, '--access-key', 'key',
+             '--recording-file', recording_file],
+            warmup=lambda: self.warmups.append(os.getpid()),
+            event_loop='inproc',
+            event_loop_kwargs={'script': _script(episodes=2)}, **kwargs)
+
+    def test_workers_run_simulators(self):
+        server = self._server(lambda index: CountingSimulator())
+        server.spawn()
+        server.spawn()
+        codes = server.wait()
+
+        self.assertEqual({0: 0, 1: 0}, codes)
+        self.assertEqual([os.getpid()], self.warmups)
+        self.assertEqual(['recording.0', 'recording.1'],
+                         sorted(os.listdir(self.directory)))
+
+    def test_failed_worker(self):
+        server = self._server(_failing_factory)
+        server.serve(2, restart=False)
+        self.assertEqual({}, server.workers)
+
+        server.spawn()
+        self.assertEqual({2: 1}, server.wait())
+
+    def test_restart_replaces_only_failed_workers(self):
+        server = self._server(_first_fails_factory, restart_delay=0)
+        server.serve(2)
+
+        # Worker 0 failed and was replaced by worker 2; the workers that
+        # finished their runs were not replaced.
+        self.assertEqual({}, server.workers)
+        self.assertEqual(3, server._next_index)
+        self.assertEqual(['recording.1', 'recording.2'],
+                         sorted(os.listdir(self.directory)))
+
+    def test_load_object(self):
+        self.assertIs(CountingSimulator, load_object(
+            'bonsai.test_mock_brain_server:CountingSimulator'))
+        with self.assertRaises(ValueError):
+            load_object('bonsai.test_mock_brain_server')
@@ -0,0 +1,54 @@
+"""
+Unit tests for the code in inproc_event_loop.py.
+"""
+from unittest import TestCase
+
+from tornado.ioloop import IOLoop
+
+from bonsai.brain_server_connection import create_async_tasks
+from bonsai.mock_brain_server import MockBrainScript, make_schema
+from bonsai.test_mock_brain_server import CountingSimulator
+
+
+_TRAIN_URL = 'inproc://user/brain/sims/ws'
+_PREDICT_URL = 'inproc://user/brain/1/predictions/ws'
+
+
+def _script(**kwargs):
+    return MockBrainScript(
+        output_schema=make_schema('State', [('value', 'int32')]),
+        seed=1234, **kwargs)
+
+
+def _run(simulator, url, script):
+    run_sim, _ = create_async_tasks(
+        'counter', simulator, url, 'key', event_loop='inproc',
+        event_loop_kwargs={'script': script})
+    return IOLoop.current().run_sync(run_sim)
+
+
+class InprocEventLoopTests(TestCase):
+
+    def test_training_runs_to_completion(self):
+        simulator = CountingSimulator(episode_length=10)
+        session = _run(simulator, _TRAIN_URL,
+                       _script(episodes=4, predictions_per_message=2))
+        self.assertTrue(session.finished)
+        self.assertEqual(4, session.episodes)
+        self.assertEqual(40, session.steps)
+        self.assertEqual(40, len(simulator.actions))
+
+    def test_runs_are_deterministic(self):
+        """Two runs with the same seed see the same actions."""
+        first = CountingSimulator()
+        second = CountingSimulator()
+        _run(first, _TRAIN_URL, _script(episodes=3))
+        _run(second, _TRAIN_URL, _script(episodes=3))
+        self.assertEqual(first.actions, second.actions)
+
+    def test_prediction(self):
+        simulator = CountingSimulator(episode_length=1000)
+        session = _run(simulator, _PREDICT_URL,
+                       _script(episodes=1, steps_per_episode=25))
+        self.assertEqual(26, session.steps)
+        self.assertEqual(25, len(simulator.actions))
@@ -0,0 +1,107 @@
+"""
+Unit tests for the code in instrumentation.py.
+"""
+from unittest import TestCase
+
+from six.moves.queue import Queue
+
+from bonsai import instrumentation
+from bonsai.instrumentation import Histogram, Registry
+from bonsai.test_inproc_event_loop import _TRAIN_URL, _run, _script
+from bonsai.test_mock_brain_server import CountingSimulator
+
+
+class HistogramTests(TestCase):
+
+    def test_percentiles_within_precision(self):
+        histogram = Histogram('test')
+        for micros in range(1, 10001):
+            histogram.record(micros * 1e-6)
+
+        self.assertEqual(10000, histogram.count)
+        for percent in (50, 90, 99):
+            expected = percent * 100 * 1e-6
+            self.assertAlmostEqual(expected, histogram.percentile(percent),
+                                   delta=expected * 0.02)
+        self.assertAlmostEqual(0.01, histogram.snapshot()['max'])
+
+    def test_empty(self):
+        histogram = Histogram('test')
+        self.assertEqual(0.0, histogram.percentile(99))
+        self.assertEqual(0, histogram.snapshot()['count'])
+
+
+class RegistryTests(TestCase):
+
+    def test_disabled_timer_records_nothing(self):
+        registry = Registry()
+        timer = registry.timer('work_seconds')
+        timer.stop(timer.start())
+        self.assertEqual(0, timer.histogram.count)
+
+        registry.enabled = True
+        timer.stop(timer.start())
+        self.assertEqual(1, timer.histogram.count)
+
+    def test_labels_identify_metrics(self):
+        registry = Registry()
+        registry.counter('steps_total', sim_id=1).inc()
+        registry.counter('steps_total', sim_id=1).inc()
+        registry.counter('steps_total', sim_id=2).inc()
+        snapshot = registry.snapshot()
+        self.assertEqual(2, snapshot['steps_total{sim_id=1}'])
+        self.assertEqual(1, snapshot['steps_total{sim_id=2}'])
+
+    def test_gauge_registered_again_is_rebound(self):
+        registry = Registry()
+        first = registry.gauge('depth', lambda: 1, queue='a')
+        second = registry.gauge('depth', lambda: 2, queue='a')
+        self.assertIs(first, second)
+        self.assertEqual({'depth{queue=a}': 2}, registry.snapshot())
+
+    def test_recording_queue_gauge_follows_latest_queue(self):
+        first, second = Queue(), Queue()
+        first.put('message')
+        instrumentation.watch_recording_queue(first)
+        instrumentation.watch_recording_queue(second)
+        self.assertEqual(
+            0, instrumentation.snapshot()['recording_queue_depth'])
+
+    def test_name_reused_with_another_type(self):
+        registry = Registry()
+        registry.counter('things')
+        with self.assertRaises(ValueError):
+            registry.histogram('things')
+
+
+class StepInstrumentationTests(TestCase):
+
+    def setUp(self):
+        instrumentation.get_registry().reset()
+        instrumentation.enable()
+
+    def tearDown(self):
+        instrumentation.disable()
+        instrumentation.get_registry().reset()
+
+    def test_step_breakdown(self):
+        """A training run records timings for every stage of a step."""
+        _run(CountingSimulator(episode_length=10), _TRAIN_URL,
+             _script(episodes=2))
+        snapshot = instrumentation.snapshot()
+
+        self.assertEqual(20, snapshot['steps_total{sim_id=1}'])
+        self.assertEqual(2, snapshot['episodes_total{sim_id=1}'])
+        self.assertEqual(
+            20, snapshot['simulator_advance_seconds{sim_id=1}']['count'])
+        self.assertEqual(
+            20, snapshot['prediction_decode_seconds{sim_id=1}']['count'])
+        for name in ('simulator_get_state_seconds{sim_id=1}',
+                     'state_encode_seconds{sim_id=1}',
+                     'driver_next_seconds',
+                     'message_serialize_seconds',
+                     'message_parse_seconds',
+                     'transport_send_seconds',
+                     'transport_recv_seconds'):
+            self.assertGreater(snapshot[name]['count'], 0, name)
+        self.assertTrue(instrumentation.get_registry().summary_lines())
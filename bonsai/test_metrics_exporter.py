@@ -0,0 +1,100 @@
+"""
+Unit tests for the code in metrics_exporter.py.
+"""
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+from six.moves.urllib.request import urlopen
+
+from bonsai import instrumentation
+from bonsai import metrics_exporter
+from bonsai.instrumentation import Registry
+from bonsai.test_inproc_event_loop import _TRAIN_URL, _run, _script
+from bonsai.test_mock_brain_server import CountingSimulator
+
+
+class MetricsExporterTests(TestCase):
+
+    def setUp(self):
+        instrumentation.get_registry().reset()
+        instrumentation.enable()
+        _run(CountingSimulator(episode_length=10), _TRAIN_URL,
+             _script(episodes=2))
+
+    def tearDown(self):
+        instrumentation.disable()
+        instrumentation.get_registry().reset()
+
+    def test_render(self):
+        text = metrics_exporter.PrometheusRenderer().render()
+        lines = text.splitlines()
+
+        self.assertIn('# TYPE bonsai_steps_total counter', lines)
+        self.assertIn('bonsai_steps_total{sim_id="1"} 20.0', lines)
+        self.assertIn('bonsai_episodes_total{sim_id="1"} 2.0', lines)
+        self.assertIn('bonsai_messages_total{direction="sent",type="STATE"} '
+                      '22.0', lines)
+        self.assertIn('bonsai_messages_total{direction="received",'
+                      'type="PREDICTION"} 20.0', lines)
+        self.assertIn('# TYPE bonsai_simulator_advance_seconds summary',
+                      lines)
+        self.assertIn('bonsai_simulator_advance_seconds_count{sim_id="1"} '
+                      '20.0', lines)
+        self.assertTrue(any(
+            line.startswith('bonsai_transport_recv_seconds{quantile="0.99"}')
+            for line in lines))
+        self.assertTrue(any(
+            line.startswith('bonsai_steps_per_second{sim_id="1"}')
+            for line in lines))
+
+    def test_step_rate_is_windowed(self):
+        registry = Registry()
+        steps = registry.counter('steps_total', sim_id=1)
+        renderer = metrics_exporter.PrometheusRenderer(registry,
+                                                       rate_window=60.0)
+
+        def rate(now, total):
+            steps.value = total
+            with patch('bonsai.metrics_exporter._clock', return_value=now):
+                lines = renderer.render().splitlines()
+            prefix = 'bonsai_steps_per_second{sim_id="1"} '
+            return [float(line[len(prefix):]) for line in lines
+                    if line.startswith(prefix)][0]
+
+        self.assertEqual(0.0, rate(0.0, 0))
+        self.assertEqual(1.0, rate(30.0, 30))
+        # A second scraper in between doesn't shorten the window.
+        rate(35.0, 35)
+        self.assertEqual(2.0, rate(40.0, 80))
+        # Once a window has passed, samples older than it are dropped.
+        self.assertEqual(2.0, rate(100.0, 200))
+
+    def test_http_server(self):
+        server = metrics_exporter.start_http_server(0, '127.0.0.1')
+        try:
+            response = urlopen('http://127.0.0.1:{}/metrics'.format(
+                server.server_port))
+            body = response.read().decode('utf-8')
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.assertIn('bonsai_steps_total{sim_id="1"} 20.0', body)
+
+    def test_textfile(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'bonsai.prom')
+            metrics_exporter.write_textfile(
+                path, metrics_exporter.PrometheusRenderer())
+            with open(path) as infile:
+                self.assertIn('bonsai_steps_total', infile.read())
+            self.assertEqual(['bonsai.prom'], os.listdir(directory))
+        finally:
+            shutil.rmtree(directory)
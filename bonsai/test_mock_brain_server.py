@@ -0,0 +1,107 @@
+"""
+Unit tests for the code in mock_brain_server.py.
+"""
+from tornado.testing import AsyncTestCase, gen_test
+
+from bonsai.simulator import Simulator, SimState
+from bonsai.brain_server_connection import create_async_tasks
+from bonsai.mock_brain_server import MockBrainScript, MockBrainServer
+from bonsai.mock_brain_server import MockBrainSession, make_schema
+from bonsai.proto.generator_simulator_api_pb2 import ServerToSimulator
+from bonsai.proto.generator_simulator_api_pb2 import SimulatorToServer
+
+
+class CountingSimulator(Simulator):
+    """A simulator whose episodes end after a fixed number of steps."""
+    def __init__(self, episode_length=5):
+        super(CountingSimulator, self).__init__()
+        self.episode_length = episode_length
+        self.count = 0
+        self.actions = []
+
+    def reset(self):
+        self.count = 0
+
+    def advance(self, actions):
+        self.actions.append(actions)
+        self.count += 1
+
+    def get_state(self):
+        return SimState(state={'value': self.count},
+                        is_terminal=self.count >= self.episode_length)
+
+    def mock_reward(self):
+        return 1.0
+
+
+class MockBrainSessionTests(AsyncTestCase):
+
+    def _message(self, message_type):
+        message = SimulatorToServer()
+        message.message_type = message_type
+        return message
+
+    def _handle(self, session, message):
+        reply = ServerToSimulator()
+        reply.ParseFromString(session.handle(message.SerializeToString()))
+        return reply
+
+    def test_training_cycle(self):
+        """A session walks through register, properties, reset and start."""
+        session = MockBrainSession(7, MockBrainScript(
+            predictions_per_message=3))
+
+        register = self._message(SimulatorToServer.REGISTER)
+        register.register_data.simulator_name = 'counter'
+        reply = self._handle(session, register)
+        self.assertEqual(ServerToSimulator.ACKNOWLEDGE_REGISTER,
+                         reply.message_type)
+        self.assertEqual(7, reply.acknowledge_register_data.sim_id)
+
+        ready = self._message(SimulatorToServer.READY)
+        expected = [ServerToSimulator.SET_PROPERTIES,
+                    ServerToSimulator.RESET,
+                    ServerToSimulator.START]
+        for message_type in expected:
+            reply = self._handle(session, ready)
+            self.assertEqual(message_type, reply.message_type)
+
+        state = self._message(SimulatorToServer.STATE)
+        state.state_data.add()
+        reply = self._handle(session, state)
+        self.assertEqual(ServerToSimulator.PREDICTION, reply.message_type)
+        self.assertEqual(3, len(reply.prediction_data))
+        self.assertEqual('counter', session.simulator_name)
+
+    def test_jitter_is_never_negative(self):
+        session = MockBrainSession(1, MockBrainScript(latency=0.001,
+                                                      jitter=0.01))
+        for _ in range(100):
+            self.assertGreaterEqual(session.delay(), 0.0)
+
+    @gen_test(timeout=30)
+    def test_simulators_run_against_server(self):
+        """Several simulators train to completion against the server."""
+        script = MockBrainScript(
+            output_schema=make_schema('State', [('value', 'int32')]),
+            episodes=3,
+            steps_per_episode=50)
+        server = MockBrainServer(script, access_key='key')
+        port = server.listen()
+        url = 'ws://127.0.0.1:{}/v1/user/brain/sims/ws'.format(port)
+
+        simulators = [CountingSimulator() for _ in range(3)]
+        tasks = [create_async_tasks('counter', sim, url, 'key')[0]()
+                 for sim in simulators]
+        yield tasks
+        server.stop()
+
+        summary = server.summary()
+        self.assertEqual(3, len(summary))
+        for entry in summary:
+            self.assertEqual('counter', entry['simulator_name'])
+            self.assertEqual(3, entry['episodes'])
+            self.assertEqual(15, entry['steps'])
+        for sim in simulators:
+            self.assertEqual(15, len(sim.actions))
+            self.assertIn('command', sim.actions[0])
@@ -0,0 +1,105 @@
+"""
+Unit tests for the code in reconnect.py.
+"""
+from unittest import TestCase
+
+from tornado.testing import AsyncTestCase, gen_test
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+from bonsai.brain_server_connection import create_async_tasks
+from bonsai.mock_brain_server import MockBrainScript, MockBrainServer
+from bonsai.mock_brain_server import make_schema
+from bonsai.reconnect import ReconnectPolicy, get_policy
+from bonsai.test_mock_brain_server import CountingSimulator
+
+
+class ReconnectPolicyTests(TestCase):
+
+    def _policy(self, **kwargs):
+        policy = ReconnectPolicy(jitter=0, **kwargs)
+        policy.connected()
+        return policy
+
+    def test_backoff_grows_to_max_delay(self):
+        policy = self._policy(initial_delay=1, max_delay=5)
+        delays = [policy.disconnected() for _ in range(4)]
+        self.assertEqual([1, 2, 4, 5], delays)
+
+    def test_gives_up_after_max_attempts(self):
+        policy = self._policy(max_attempts=2)
+        self.assertIsNotNone(policy.disconnected())
+        self.assertIsNotNone(policy.disconnected())
+        self.assertIsNone(policy.disconnected())
+
+    def test_never_retries_before_first_connection(self):
+        self.assertIsNone(ReconnectPolicy().disconnected())
+
+    def test_jitter_shortens_delay(self):
+        policy = ReconnectPolicy(initial_delay=1, jitter=0.5)
+        policy.connected()
+        with patch('bonsai.reconnect.random.random', return_value=1.0):
+            self.assertEqual(0.5, policy.disconnected())
+
+    def test_tracks_reconnects_and_downtime(self):
+        policy = self._policy()
+        with patch('bonsai.reconnect._clock', side_effect=[10.0, 12.5]):
+            policy.disconnected()
+            policy.connected()
+        self.assertEqual(1, policy.reconnects)
+        self.assertEqual(2.5, policy.downtime)
+
+    def test_long_connection_resets_backoff(self):
+        policy = self._policy(reset_after=30)
+        with patch('bonsai.reconnect._clock',
+                   side_effect=[0.0, 0.0, 100.0, 200.0]):
+            policy.disconnected()
+            policy.connected()
+            policy.disconnected()
+        with patch('bonsai.reconnect._clock', return_value=200.0):
+            self.assertEqual(2, policy.disconnected())
+
+    def test_get_policy(self):
+        self.assertIsNone(get_policy(None))
+        self.assertIsInstance(get_policy(True), ReconnectPolicy)
+        policy = ReconnectPolicy()
+        self.assertIs(policy, get_policy(policy))
+
+
+class ReconnectTests(AsyncTestCase):
+
+    def _serve(self):
+        script = MockBrainScript(
+            output_schema=make_schema('State', [('value', 'int32')]),
+            episodes=1, disconnect_after=6)
+        server = MockBrainServer(script, access_key='key')
+        port = server.listen()
+        return server, 'ws://127.0.0.1:{}/v1/user/brain/sims/ws'.format(port)
+
+    @gen_test(timeout=30)
+    def test_reconnects_with_the_same_simulator(self):
+        server, url = self._serve()
+        simulator = CountingSimulator()
+        policy = ReconnectPolicy(initial_delay=0.01, jitter=0)
+        run, _ = create_async_tasks('counter', simulator, url, 'key',
+                                    reconnect=policy)
+        yield run()
+        server.stop()
+
+        self.assertEqual(1, server.dropped_connections)
+        self.assertEqual(2, len(server.sessions))
+        self.assertTrue(server.sessions[1].finished)
+        self.assertEqual(1, policy.reconnects)
+
+    @gen_test(timeout=30)
+    def test_stops_without_reconnect(self):
+        server, url = self._serve()
+        run, _ = create_async_tasks('counter', CountingSimulator(), url,
+                                    'key')
+        yield run()
+        server.stop()
+
+        self.assertEqual(1, len(server.sessions))
+        self.assertFalse(server.sessions[0].finished)
@@ -0,0 +1,123 @@
+"""
+Unit tests for the code in simulator_pool.py.
+"""
+from unittest import TestCase
+
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+from bonsai.brain_server_connection import run_for_training_or_prediction
+from bonsai.simulator import Simulator
+from bonsai.simulator_pool import SimulatorPool
+
+
+class PooledSimulator(Simulator):
+    def __init__(self):
+        super(PooledSimulator, self).__init__()
+        self.resets = 0
+        self.closed = False
+
+    def reset(self):
+        self.resets += 1
+
+    def close(self):
+        self.closed = True
+
+
+class SimulatorPoolTests(TestCase):
+
+    def test_reuses_returned_simulator(self):
+        pool = SimulatorPool(PooledSimulator)
+        simulator = pool.acquire()
+        simulator.notify_prediction_received({'action': 1})
+        pool.release(simulator)
+
+        self.assertIs(simulator, pool.acquire())
+        self.assertEqual(1, simulator.resets)
+        self.assertIsNone(simulator.get_last_action())
+        self.assertEqual(1, pool.created)
+        self.assertEqual(1, pool.reused)
+
+    def test_prewarm(self):
+        pool = SimulatorPool(PooledSimulator, size=2)
+        self.assertEqual(2, pool.idle_count())
+        first, second = pool.acquire(), pool.acquire()
+        self.assertIsNot(first, second)
+        pool.acquire()
+        self.assertEqual({'created': 3, 'reused': 2, 'evicted': 0,
+                          'idle': 0, 'leased': 3}, pool.stats())
+
+    def test_max_idle_closes_extra_simulators(self):
+        pool = SimulatorPool(PooledSimulator, max_idle=1)
+        first, second = pool.acquire(), pool.acquire()
+        pool.release(first)
+        pool.release(second)
+
+        self.assertFalse(first.closed)
+        self.assertTrue(second.closed)
+        self.assertEqual(1, pool.idle_count())
+        self.assertEqual(1, pool.evicted)
+
+    def test_idle_timeout_evicts(self):
+        with patch('bonsai.simulator_pool._clock', return_value=0.0):
+            pool = SimulatorPool(PooledSimulator, size=1, idle_timeout=60)
+            simulator = pool._idle[0][0]
+        with patch('bonsai.simulator_pool._clock', return_value=30.0):
+            pool.evict_idle()
+            self.assertEqual(1, pool.idle_count())
+        with patch('bonsai.simulator_pool._clock', return_value=60.0):
+            self.assertIsNot(simulator, pool.acquire())
+        self.assertTrue(simulator.closed)
+        self.assertEqual(2, pool.created)
+
+    def test_lease_discards_failed_simulator(self):
+        pool = SimulatorPool(PooledSimulator)
+        with self.assertRaises(ValueError):
+            with pool.lease() as simulator:
+                raise ValueError()
+        self.assertTrue(simulator.closed)
+        self.assertEqual(0, pool.idle_count())
+
+        with pool.lease() as simulator:
+            pass
+        self.assertFalse(simulator.closed)
+        self.assertEqual(1, pool.idle_count())
+
+    def test_failed_reset_discards(self):
+        pool = SimulatorPool(PooledSimulator)
+        simulator = pool.acquire()
+        with patch.object(simulator, 'reset', side_effect=RuntimeError()):
+            pool.release(simulator)
+        self.assertTrue(simulator.closed)
+        self.assertEqual(0, pool.idle_count())
+
+    def test_close(self):
+        pool = SimulatorPool(PooledSimulator, size=1)
+        idle = pool._idle[0][0]
+        leased = pool.acquire()
+        leased_too = pool.acquire()
+        pool.release(leased)
+        pool.close()
+        pool.release(leased_too)
+
+        self.assertTrue(leased.closed)
+        self.assertTrue(leased_too.closed)
+        self.assertIs(idle, leased)
+        with self.assertRaises(RuntimeError):
+            pool.acquire()
+
+    def test_unexpected_argument(self):
+        with self.assertRaises(TypeError):
+            SimulatorPool(PooledSimulator, capacity=2)
+
+    def test_run_leases_from_pool(self):
+        pool = SimulatorPool(PooledSimulator)
+        with patch('bonsai.brain_server_connection.parse_base_arguments',
+                   return_value=None):
+            run_for_training_or_prediction('name', pool)
+            run_for_training_or_prediction('name', pool)
+        self.assertEqual(1, pool.created)
+        self.assertEqual(1, pool.reused)
+        self.assertEqual(1, pool.idle_count())
@@ -0,0 +1,110 @@
+"""
+Unit tests for the code in tracing.py.
+"""
+import logging
+from unittest import TestCase
+
+from bonsai import tracing
+from bonsai.drivers import SimulatorDriverForTraining
+from bonsai.proto.generator_simulator_api_pb2 import ServerToSimulator
+from bonsai.proto.generator_simulator_api_pb2 import SimulatorToServer
+from bonsai.test_drivers import _MockSimulatorConnectionForTraining
+
+
+class _ListHandler(logging.Handler):
+    def __init__(self):
+        super(_ListHandler, self).__init__(logging.DEBUG)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def _message(message_type):
+    message = ServerToSimulator()
+    message.message_type = message_type
+    return message
+
+
+class TracingTests(TestCase):
+
+    def setUp(self):
+        self.logger = logging.getLogger('bonsai.test_tracing')
+        self.handler = _ListHandler()
+        self.logger.addHandler(self.handler)
+        self.logger.propagate = False
+        self.addCleanup(self.logger.removeHandler, self.handler)
+
+    def test_lazy_is_only_called_when_formatted(self):
+        calls = []
+
+        def describe():
+            calls.append(1)
+            return 'described'
+
+        self.logger.setLevel(logging.INFO)
+        self.logger.debug('%s', tracing.Lazy(describe))
+        self.assertEqual([], calls)
+
+        self.logger.setLevel(logging.DEBUG)
+        self.logger.debug('%s', tracing.Lazy(describe))
+        self.assertEqual('described', self.handler.records[0].getMessage())
+
+    def test_messages_are_sampled_per_type(self):
+        self.logger.setLevel(logging.DEBUG)
+        tracer = tracing.Tracer(sample_rates={'PREDICTION': 3, 'RESET': 0},
+                                logger=self.logger)
+        for _ in range(7):
+            tracer.received(_message(ServerToSimulator.PREDICTION))
+            tracer.received(_message(ServerToSimulator.RESET))
+        tracer.received(_message(ServerToSimulator.START))
+
+        traced = [record.args[:3] for record in self.handler.records]
+        self.assertEqual([('Received', 'PREDICTION', 1),
+                          ('Received', 'PREDICTION', 4),
+                          ('Received', 'PREDICTION', 7),
+                          ('Received', 'START', 1)], traced)
+
+    def test_nothing_is_sampled_without_debug(self):
+        self.logger.setLevel(logging.INFO)
+        tracer = tracing.Tracer(logger=self.logger)
+        tracer.received(_message(ServerToSimulator.PREDICTION))
+        self.assertEqual([], self.handler.records)
+        self.assertEqual({}, tracer._counts)
+
+    def test_ring_keeps_recent_messages(self):
+        tracer = tracing.Tracer(ring_size=2, logger=self.logger)
+        messages = [_message(ServerToSimulator.PREDICTION) for _ in range(3)]
+        for message in messages:
+            tracer.received(message)
+        tracer.sent(None)
+
+        self.assertEqual([('Received', messages[1]),
+                          ('Received', messages[2])], tracer.recent())
+
+    def test_configure_sets_defaults(self):
+        self.addCleanup(tracing.configure, tracing.DEFAULT_RING_SIZE, {})
+        tracing.configure(ring_size=0, sample_rates={'STATE': 10})
+        tracer = tracing.Tracer()
+        self.assertEqual([], tracer.recent())
+        self.assertEqual({'STATE': 10}, tracer.sample_rates)
+
+    def test_driver_dumps_recent_messages_on_error(self):
+        self.logger.setLevel(logging.INFO)
+        connection = _MockSimulatorConnectionForTraining()
+        driver = SimulatorDriverForTraining(
+            connection=connection, simulator_connection=connection,
+            tracer=tracing.Tracer(logger=self.logger))
+        register = driver.next(None)
+        self.assertEqual(SimulatorToServer.REGISTER, register.message_type)
+
+        with self.assertRaises(Exception):
+            driver.next(_message(ServerToSimulator.PREDICTION))
+
+        self.assertEqual(1, len(self.handler.records))
+        record = self.handler.records[0]
+        self.assertEqual(logging.ERROR, record.levelno)
+        self.assertIn('Sent message_type: REGISTER', record.getMessage())
+        self.assertIn('Received message_type: PREDICTION',
+                      record.getMessage())
+        self.assertEqual([], driver.tracer.recent())
@@ -0,0 +1,80 @@
+"""
+Unit tests for the code in transport.py.
+"""
+import socket
+from unittest import TestCase
+
+from tornado.testing import AsyncTestCase, gen_test
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+from bonsai.brain_server_connection import create_async_tasks
+from bonsai.mock_brain_server import MockBrainScript, MockBrainServer
+from bonsai.mock_brain_server import make_schema
+from bonsai.test_mock_brain_server import CountingSimulator
+from bonsai.transport import TransportOptions, get_options
+
+
+class TransportOptionsTests(TestCase):
+
+    def test_defaults_set_nothing(self):
+        self.assertEqual([], get_options(None).socket_options())
+        self.assertEqual('TransportOptions()', repr(TransportOptions()))
+
+    def test_socket_options(self):
+        options = TransportOptions(tcp_nodelay=True, send_buffer_size=65536,
+                                   receive_buffer_size=131072)
+        self.assertEqual(
+            [(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1),
+             (socket.SOL_SOCKET, socket.SO_SNDBUF, 65536),
+             (socket.SOL_SOCKET, socket.SO_RCVBUF, 131072)],
+            options.socket_options())
+
+    def test_apply_to_socket(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.addCleanup(sock.close)
+        TransportOptions(tcp_nodelay=True).apply_to_socket(sock)
+        self.assertTrue(sock.getsockopt(socket.IPPROTO_TCP,
+                                        socket.TCP_NODELAY))
+        TransportOptions(tcp_nodelay=True).apply_to_socket(None)
+
+    def test_unexpected_argument(self):
+        with self.assertRaises(TypeError):
+            TransportOptions(nagle=False)
+
+    def test_warn_unsupported(self):
+        options = TransportOptions(compression=False, connect_timeout=5)
+        with patch('bonsai.transport.log') as log:
+            options.warn_unsupported('test', 'compression', 'connect_timeout',
+                                     'max_message_size')
+        self.assertEqual(1, log.warning.call_count)
+        self.assertEqual('connect_timeout', log.warning.call_args[0][2])
+
+
+class _RecordingOptions(TransportOptions):
+    def apply_to_socket(self, sock):
+        super(_RecordingOptions, self).apply_to_socket(sock)
+        self.nodelay = sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY)
+
+
+class TornadoTransportTests(AsyncTestCase):
+
+    @gen_test(timeout=30)
+    def test_options_are_applied(self):
+        server = MockBrainServer(MockBrainScript(
+            output_schema=make_schema('State', [('value', 'int32')])),
+            access_key='key')
+        url = 'ws://127.0.0.1:{}/v1/user/brain/sims/ws'.format(
+            server.listen())
+        options = _RecordingOptions(tcp_nodelay=True, compression=True,
+                                    connect_timeout=5,
+                                    max_message_size=1 << 20)
+        run, _ = create_async_tasks('counter', CountingSimulator(), url,
+                                    'key', transport=options)
+        yield run()
+        server.stop()
+
+        self.assertTrue(options.nodelay)
+        self.assertTrue(server.sessions[0].finished)
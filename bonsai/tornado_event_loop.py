@@ -9,16 +9,19 @@ from google.protobuf.text_format import MessageToString, Merge
 from tornado import gen
 from tornado.ioloop import IOLoop
 from tornado import websocket as websockets
-from tornado.httpclient import HTTPRequest
+from tornado.httpclient import HTTPError, HTTPRequest
 from tornado import queues
 
 from bonsai.proto.generator_simulator_api_pb2 import ServerToSimulator
 from bonsai.proto.generator_simulator_api_pb2 import SimulatorToServer
 from bonsai.drivers import DriverState
+from bonsai import instrumentation
+from bonsai.reconnect import get_policy
+from bonsai.transport import get_options
 
 log = logging.getLogger(__name__)
 
-# Timeouts for the websocket connection.
+# Timeouts for the websocket connection, unless set by TransportOptions.
 _INITIAL_CONNECT_TIMEOUT_SECS = 60
 
 
@@ -47,14 +50,20 @@ class _WrapSocket(object):
 
 class _Runner(object):
 
-    def __init__(self, access_key, brain_api_url, driver, recording_file):
+    def __init__(self, access_key, brain_api_url, driver, recording_file,
+                 reconnect=None, transport=None):
         self.access_key = access_key
         self.brain_api_url = brain_api_url
         self.driver = driver
         self.recording_file = recording_file
+        self.reconnect = get_policy(reconnect)
+        self.transport = get_options(transport)
         if self.recording_file:
             self.recording_queue = queues.Queue()
+            instrumentation.watch_recording_queue(self.recording_queue)
         self._sim_executor = ThreadPoolExecutor(max_workers=1)
+        self._timers = instrumentation.transport_timers()
+        self._messages = instrumentation.MessageCounters()
 
     @gen.coroutine
     def record_to_file(self):
@@ -82,15 +91,52 @@ class _Runner(object):
         if not self.access_key:
             raise RuntimeError("Access Key was not set.")
 
+        try:
+            while True:
+                yield self._run_connection()
+                if self.driver.state == DriverState.FINISHED or \
+                        self.reconnect is None:
+                    break
+                delay = self.reconnect.disconnected()
+                if delay is None:
+                    break
+                log.info("Reconnecting to %s in %.1f seconds",
+                         self.brain_api_url, delay)
+                yield gen.sleep(delay)
+                self.driver.restart()
+        finally:
+            if self.recording_file:
+                yield self.recording_queue.put(None)
+
+    @gen.coroutine
+    def _run_connection(self):
         log.info("About to connect to %s", self.brain_api_url)
 
+        options = self.transport
+        timeout = options.connect_timeout or _INITIAL_CONNECT_TIMEOUT_SECS
         req = HTTPRequest(
             self.brain_api_url,
-            connect_timeout=_INITIAL_CONNECT_TIMEOUT_SECS,
-            request_timeout=_INITIAL_CONNECT_TIMEOUT_SECS)
+            connect_timeout=timeout,
+            request_timeout=timeout)
         req.headers['Authorization'] = self.access_key
+        connect_kwargs = {}
+        if options.compression:
+            connect_kwargs['compression_options'] = {}
+        if options.max_message_size is not None:
+            connect_kwargs['max_message_size'] = options.max_message_size
 
-        websocket = yield websockets.websocket_connect(req)
+        try:
+            websocket = yield websockets.websocket_connect(
+                req, **connect_kwargs)
+        except (IOError, HTTPError) as e:
+            if self.reconnect is None or not self.reconnect.has_connected:
+                raise
+            log.error("Unable to connect to '%s': %s", self.brain_api_url, e)
+            return
+        if self.reconnect is not None:
+            self.reconnect.connected()
+        stream = getattr(websocket.protocol, 'stream', None)
+        options.apply_to_socket(getattr(stream, 'socket', None))
         wrapped = _WrapSocket(websocket)
 
         input_message = None
@@ -103,8 +149,10 @@ class _Runner(object):
                 if self.recording_file:
                     yield self._record('RECV', input_message)
 
+                start = self._timers.driver_next.start()
                 output_message = yield self._sim_executor.submit(
                     self.driver.next, input_message)
+                self._timers.driver_next.stop(start)
 
                 if self.recording_file:
                     yield self._record('SEND', output_message)
@@ -116,14 +164,27 @@ class _Runner(object):
                         raise RuntimeError(
                             "Driver did not return a message to send.")
 
+                    start = self._timers.serialize.start()
                     output_bytes = output_message.SerializeToString()
+                    self._timers.serialize.stop(start)
+                    self._messages.record('sent', output_message,
+                                          len(output_bytes))
+
+                    start = self._timers.send.start()
                     yield wrapped.send(output_bytes)
+                    self._timers.send.stop(start)
 
                     # Only do this part if the last message wasn't a FINISH
+                    start = self._timers.recv.start()
                     input_bytes = yield wrapped.recv()
+                    self._timers.recv.stop(start)
                     if input_bytes:
+                        start = self._timers.parse.start()
                         input_message = ServerToSimulator()
                         input_message.ParseFromString(input_bytes)
+                        self._timers.parse.stop(start)
+                        self._messages.record('received', input_message,
+                                              len(input_bytes))
                     else:
                         input_message = None
 
@@ -133,21 +194,24 @@ class _Runner(object):
             log.error("Connection to '%s' is closed, code='%s', reason='%s'",
                       self.brain_api_url, code, reason)
         finally:
-            if self.recording_file:
-                yield self.recording_queue.put(None)
             websocket.close()
 
 
-def run(access_key, brain_api_url, driver, recording_file):
+def run(access_key, brain_api_url, driver, recording_file, reconnect=None,
+        transport=None):
 
     run_sim, record = create_tasks(access_key,
                                    brain_api_url,
                                    driver,
-                                   recording_file)
+                                   recording_file,
+                                   reconnect,
+                                   transport)
     IOLoop.current().add_callback(record)
     IOLoop.current().run_sync(run_sim)
 
 
-def create_tasks(access_key, brain_api_url, driver, recording_file):
-    server = _Runner(access_key, brain_api_url, driver, recording_file)
+def create_tasks(access_key, brain_api_url, driver, recording_file,
+                 reconnect=None, transport=None):
+    server = _Runner(access_key, brain_api_url, driver, recording_file,
+                     reconnect, transport)
     return server.run, server.record_to_file
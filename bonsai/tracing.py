@@ -0,0 +1,166 @@
+"""
+Message tracing for simulator drivers. Every driver keeps the last few
+messages it received and sent in a ring buffer, and logs them when handling
+a message fails. With the `bonsai.tracing` logger at DEBUG, a sample of the
+messages is also logged as they pass, at a rate set per message type:
+
+    import bonsai.tracing
+    bonsai.tracing.configure(sample_rates={'PREDICTION': 1000,
+                                           'STATE': 1000},
+                             ring_size=64)
+
+Messages are only formatted when they are actually logged, so tracing costs
+a deque append per message when DEBUG is off. The ring holds references to
+the messages, not copies.
+"""
+import logging
+import threading
+from collections import deque
+
+from google.protobuf.text_format import MessageToString
+
+
+log = logging.getLogger(__name__)
+
+# Number of messages kept by new tracers.
+DEFAULT_RING_SIZE = 32
+
+_defaults = {'ring_size': DEFAULT_RING_SIZE, 'sample_rates': {}}
+_defaults_lock = threading.Lock()
+
+
+class Lazy(object):
+    """
+    Defers a call until the object is converted to a string, so it can be
+    passed as a logging argument and only cost anything when logged.
+    """
+    __slots__ = ('function', 'args', 'kwargs')
+
+    def __init__(self, function, *args, **kwargs):
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+
+    def __str__(self):
+        return str(self.function(*self.args, **self.kwargs))
+
+    __repr__ = __str__
+
+
+def lazy_message(message, as_one_line=False):
+    """Returns a lazy text representation of a protobuf message."""
+    return Lazy(MessageToString, message, as_one_line=as_one_line)
+
+
+def lazy_pformat(value):
+    """Returns a lazy pretty-printed representation of value."""
+    return Lazy(_pformat, value)
+
+
+def _pformat(value):
+    # Imported here, since pprint is slow to import and rarely logged.
+    from pprint import pformat
+    return pformat(value)
+
+
+def message_type_name(message):
+    """
+    Returns the name of a message's message_type, such as 'PREDICTION'.
+    """
+    field = message.DESCRIPTOR.fields_by_name.get('message_type')
+    if field is None:
+        return type(message).__name__
+    return field.enum_type.values_by_number[message.message_type].name
+
+
+def configure(ring_size=None, sample_rates=None):
+    """
+    Sets the defaults of tracers created afterwards.
+    :param ring_size: Number of recent messages each tracer keeps; 0 keeps
+                      none.
+    :param sample_rates: Dictionary of message type name to N, tracing one
+                         in every N messages of that type. Types not listed
+                         are traced every time; 0 never traces a type.
+    """
+    with _defaults_lock:
+        if ring_size is not None:
+            _defaults['ring_size'] = ring_size
+        if sample_rates is not None:
+            _defaults['sample_rates'] = dict(sample_rates)
+
+
+class Tracer(object):
+    """
+    Keeps the recent messages of one driver, and logs a sample of them.
+    """
+
+    def __init__(self, ring_size=None, sample_rates=None, logger=None):
+        """
+        :param ring_size: Number of recent messages kept. Defaults to the
+                          value set with configure().
+        :param sample_rates: Dictionary of message type name to sample rate.
+                             Defaults to the value set with configure().
+        :param logger: Logger traced messages and dumps are written to.
+                       Defaults to the `bonsai.tracing` logger.
+        """
+        with _defaults_lock:
+            if ring_size is None:
+                ring_size = _defaults['ring_size']
+            if sample_rates is None:
+                sample_rates = _defaults['sample_rates']
+        self.sample_rates = dict(sample_rates)
+        self.log = logger or log
+        self._ring = deque(maxlen=ring_size) if ring_size else None
+        self._counts = {}
+
+    def received(self, message):
+        self.record('Received', message)
+
+    def sent(self, message):
+        self.record('Sent', message)
+
+    def record(self, direction, message):
+        """
+        Records a message, logging it if it is sampled.
+        :param direction: 'Received' or 'Sent'.
+        """
+        if message is None:
+            return
+        if self._ring is not None:
+            self._ring.append((direction, message))
+        if self.log.isEnabledFor(logging.DEBUG):
+            self._sample(direction, message)
+
+    def _sample(self, direction, message):
+        name = message_type_name(message)
+        rate = self.sample_rates.get(name, 1)
+        if rate <= 0:
+            return
+        key = (direction, name)
+        count = self._counts.get(key, 0)
+        self._counts[key] = count + 1
+        if count % rate == 0:
+            self.log.debug('%s %s message #%d:\n%s', direction, name,
+                           count + 1, lazy_message(message))
+
+    def recent(self):
+        """
+        Returns a list of (direction, message) of the recent messages,
+        oldest first.
+        """
+        return list(self._ring) if self._ring is not None else []
+
+    def dump(self, level=logging.ERROR):
+        """
+        Logs the recent messages, oldest first, and clears them.
+        """
+        recent = self.recent()
+        if not recent:
+            return
+        if self.log.isEnabledFor(level):
+            lines = ['{} {}'.format(direction,
+                                    MessageToString(message, as_one_line=True))
+                     for direction, message in recent]
+            self.log.log(level, 'Last %d messages:\n%s', len(recent),
+                         '\n'.join(lines))
+        self._ring.clear()
@@ -0,0 +1,105 @@
+"""
+Transport settings shared by the event loops, so the same options tune the
+websocket connection whichever event loop runs it:
+
+    options = TransportOptions(tcp_nodelay=True, compression=False)
+    run_for_training_or_prediction('my_simulator', sim, transport=options)
+
+Small scalar states benefit from tcp_nodelay, which sends every message
+immediately, while large Luminance states benefit from compression.
+Options left as None keep the event loop's default. An event loop that can't
+apply an option logs a warning and ignores it.
+"""
+import logging
+import socket
+
+log = logging.getLogger(__name__)
+
+
+class TransportOptions(object):
+    """
+    Settings for the websocket connection to the BRAIN.
+    """
+
+    def __init__(self, **kwargs):
+        """
+        :param kwargs: Optional keyword arguments. Valid arguments include:
+            - tcp_nodelay = Whether to disable Nagle's algorithm, so small
+                            messages are sent without delay.
+            - compression = Whether to negotiate permessage-deflate
+                            compression.
+            - send_buffer_size = Size in bytes of the socket send buffer
+                                 (SO_SNDBUF).
+            - receive_buffer_size = Size in bytes of the socket receive
+                                    buffer (SO_RCVBUF).
+            - connect_timeout = Seconds to wait for the connection to be
+                                established.
+            - max_message_size = Largest message in bytes accepted from the
+                                 server.
+            All default to None, which keeps the event loop's default.
+        """
+        self.tcp_nodelay = kwargs.pop('tcp_nodelay', None)
+        self.compression = kwargs.pop('compression', None)
+        self.send_buffer_size = kwargs.pop('send_buffer_size', None)
+        self.receive_buffer_size = kwargs.pop('receive_buffer_size', None)
+        self.connect_timeout = kwargs.pop('connect_timeout', None)
+        self.max_message_size = kwargs.pop('max_message_size', None)
+        if kwargs:
+            raise TypeError('Unexpected arguments {}'.format(
+                sorted(kwargs.keys())))
+
+    def socket_options(self):
+        """
+        Returns the (level, option, value) socket options to set.
+        """
+        options = []
+        if self.tcp_nodelay is not None:
+            options.append((socket.IPPROTO_TCP, socket.TCP_NODELAY,
+                            int(bool(self.tcp_nodelay))))
+        if self.send_buffer_size is not None:
+            options.append((socket.SOL_SOCKET, socket.SO_SNDBUF,
+                            self.send_buffer_size))
+        if self.receive_buffer_size is not None:
+            options.append((socket.SOL_SOCKET, socket.SO_RCVBUF,
+                            self.receive_buffer_size))
+        return options
+
+    def apply_to_socket(self, sock):
+        """
+        Sets the socket options on a connected socket. Does nothing when the
+        event loop doesn't expose its socket.
+        """
+        if sock is None:
+            return
+        for option in self.socket_options():
+            try:
+                sock.setsockopt(*option)
+            except (OSError, socket.error) as e:
+                log.warning('Unable to set socket option %s: %s',
+                            option[1], e)
+
+    def warn_unsupported(self, event_loop, *names):
+        """
+        Logs a warning for every option in names that is set, for options
+        the event loop can't apply. Options set to False, which turn a
+        feature off, are never warned about.
+        """
+        for name in names:
+            if getattr(self, name) not in (None, False):
+                log.warning('The %s event loop does not support the %s '
+                            'transport option; ignoring it.',
+                            event_loop, name)
+
+    def __repr__(self):
+        return 'TransportOptions({})'.format(', '.join(
+            '{}={!r}'.format(name, value)
+            for name, value in sorted(vars(self).items())
+            if value is not None))
+
+
+def get_options(transport):
+    """
+    Returns the TransportOptions for the `transport` argument of the event
+    loops, which may be None for the defaults.
+    """
+    return transport if transport is not None else TransportOptions()
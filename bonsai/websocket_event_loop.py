@@ -3,6 +3,7 @@ from __future__ import print_function
 
 import logging
 import os
+import time
 
 from concurrent.futures import ThreadPoolExecutor
 
@@ -13,19 +14,36 @@ import websocket
 
 from bonsai.proto.generator_simulator_api_pb2 import ServerToSimulator
 from bonsai.drivers import DriverState
+from bonsai import instrumentation
+from bonsai.reconnect import get_policy
+from bonsai.transport import get_options
 
 log = logging.getLogger(__name__)
 
 
 class _Runner(object):
 
-    def __init__(self, access_key, brain_api_url, driver, recording_file):
+    def __init__(self, access_key, brain_api_url, driver, recording_file,
+                 reconnect=None, transport=None):
         self.access_key = access_key
         self.brain_api_url = brain_api_url
         self.driver = driver
         self.recording_file = recording_file
+        self.reconnect = get_policy(reconnect)
+        self.transport = get_options(transport)
+        self.transport.warn_unsupported('websocket', 'compression',
+                                        'connect_timeout', 'max_message_size')
+        # Set when the connection was closed by an error in the driver or by
+        # the user, rather than by the network or the server.
+        self._stopped = False
         if self.recording_file:
             self.recording_queue = Queue()
+            instrumentation.watch_recording_queue(self.recording_queue)
+        self._timers = instrumentation.transport_timers()
+        self._messages = instrumentation.MessageCounters()
+        # When the last message was sent; the receive time is measured from
+        # here to the arrival of the reply in _on_message.
+        self._recv_start = None
 
     def record_to_file(self):
         # A loop to record queued information to a file.
@@ -73,22 +91,30 @@ class _Runner(object):
     def _on_message(self, ws, message):
         log.debug("ON_MESSAGE: %s", message)
 
+        self._timers.recv.stop(self._recv_start)
+        self._recv_start = None
+
         input_bytes = message
         if input_bytes:
+            start = self._timers.parse.start()
             input_message = ServerToSimulator()
             input_message.ParseFromString(input_bytes)
+            self._timers.parse.stop(start)
+            self._messages.record('received', input_message, len(input_bytes))
         else:
             input_message = None
 
         try:
             self._handle_message(ws, input_message)
         except Exception as e:
+            self._stopped = True
             self._on_error(ws, e)
             ws.close()
 
     def _on_error(self, ws, error):
         if type(error) == KeyboardInterrupt:
             log.debug("Handling Ctrl+c ...")
+            self._stopped = True
             return
         log.debug("Error received for '%s': '%s'", self.brain_api_url, error)
 
@@ -102,11 +128,15 @@ class _Runner(object):
 
     def _on_open(self, ws):
         log.debug("_on_open()")
+        if self.reconnect is not None:
+            self.reconnect.connected()
         self._handle_message(ws, None)
 
     def _handle_message(self, ws, message):
         self._maybe_record('RECV', message)
+        start = self._timers.driver_next.start()
         output_message = self.driver.next(message)
+        self._timers.driver_next.stop(start)
         self._maybe_record('SEND', output_message)
 
         # If the driver is FINSIHED, don't bother sending and
@@ -121,13 +151,40 @@ class _Runner(object):
             raise RuntimeError(
                 "Driver did not return a message to send.")
 
+        start = self._timers.serialize.start()
         output_bytes = output_message.SerializeToString()
+        self._timers.serialize.stop(start)
+        self._messages.record('sent', output_message, len(output_bytes))
+
+        start = self._timers.send.start()
         ws.send(output_bytes, opcode=websocket.ABNF.OPCODE_BINARY)
+        self._timers.send.stop(start)
+        self._recv_start = self._timers.recv.start()
 
     def run(self):
         if not self.access_key:
             raise RuntimeError("Access Key was not set.")
 
+        try:
+            while True:
+                self._run_connection()
+                if self.driver.state == DriverState.FINISHED or \
+                        self.reconnect is None or self._stopped:
+                    break
+                delay = self.reconnect.disconnected()
+                if delay is None:
+                    break
+                log.info("Reconnecting to %s in %.1f seconds",
+                         self.brain_api_url, delay)
+                time.sleep(delay)
+                self.driver.restart()
+        except KeyboardInterrupt as e:
+            log.debug("Handling user Ctrl+C")
+        finally:
+            # insert None to make our recording method exit
+            self._maybe_record(None, None)
+
+    def _run_connection(self):
         log.info("About to connect to %s", self.brain_api_url)
 
         ws = websocket.WebSocketApp(
@@ -145,21 +202,18 @@ class _Runner(object):
         if proxy:
             log.info('Connecting via proxy: %s', proxy)
 
-        try:
-            ws.run_forever(**proxy)
-        except KeyboardInterrupt as e:
-            log.debug("Handling user Ctrl+C")
-        finally:
-            # insert None to make our recording method exit
-            self._maybe_record(None, None)
+        ws.run_forever(sockopt=self.transport.socket_options(), **proxy)
 
 
-def run(access_key, brain_api_url, driver, recording_file):
+def run(access_key, brain_api_url, driver, recording_file, reconnect=None,
+        transport=None):
     """ run the simulator (synchronously) until it disconnects. """
     run_sim, record = create_tasks(access_key,
                                    brain_api_url,
                                    driver,
-                                   recording_file)
+                                   recording_file,
+                                   reconnect,
+                                   transport)
 
     # A thread for recording traffic
     tpe = ThreadPoolExecutor(max_workers=1)
@@ -169,7 +223,9 @@ def run(access_key, brain_api_url, driver, recording_file):
     tpe.shutdown(wait=False)
 
 
-def create_tasks(access_key, brain_api_url, driver, recording_file):
+def create_tasks(access_key, brain_api_url, driver, recording_file,
+                 reconnect=None, transport=None):
     """ Create the task runner object """
-    server = _Runner(access_key, brain_api_url, driver, recording_file)
+    server = _Runner(access_key, brain_api_url, driver, recording_file,
+                     reconnect, transport)
     return server.run, server.record_to_file
@@ -44,5 +44,5 @@ setup(
         'tornado>=4.5.0',
         'websocket-client>=0.40.0',
     ],
-    packages=find_packages()
+    packages=find_packages(exclude=['benchmarks', 'benchmarks.*'])
     )